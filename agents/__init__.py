@@ -8,9 +8,26 @@ from .write_article_validator_agent import WriteArticleValidatorAgent
 from .sanitize_data_validator_agent import SanitizeDataValidatorAgent
 from .refiner_agent import RefinerAgent # New import
 from .validator_agent import ValidatorAgent  # New import
+from .phi_scrubber import PHIScrubber
+from .result import AgentResult
+from .payload_logging import PayloadLogPolicy
+from .clients import create_openai_clients
+from .backends import LatencyModel, MockBackend, OfflineBackend, OpenAIBackend
+from .micro_batching import MicroBatcher
+from .routing import ModelRoute, default_model_routes
+from utils.retry import CircuitBreaker, RateLimiter, RetryPolicy
+from utils.metrics import MetricsRegistry
+from .pipelines import PIPELINES, REFINE_SPECS, PipelineStep, RefineSpec, step_kwargs, reply_text, should_skip
+from .validation import ValidationResult, parse_score, parse_validation
+from .validator_base import ValidatorBase
+from .prompts import PROMPTS, PromptTemplate, get_prompt
 
 class AgentManager:
-    def __init__(self, max_retries=2, verbose=True):
+    def __init__(self, max_retries=2, verbose=True, cache=None, phi_scrubber=None, token_budgets=None,
+                 base_url=None, client_options=None, retry_policy=None, retry_policies=None,
+                 rate_limiter=None, circuit_breaker=None, metrics=None, tracer=None, log_policy=None, backend=None,
+                 model_routes=None, near_duplicates=None, single_flight=None, micro_batcher=None,
+                 run_store=None):
         self.agents = {
             "summarize": SummarizeTool(max_retries=max_retries, verbose=verbose),
             "write_article": WriteArticleTool(max_retries=max_retries, verbose=verbose),
@@ -21,9 +38,79 @@ class AgentManager:
             "refiner": RefinerAgent(max_retries=max_retries, verbose=verbose),      # New agent
             "validator": ValidatorAgent(max_retries=max_retries, verbose=verbose)   # New agent
         }
+        # One client pair shared by every agent: the OpenAI API over a pooled connection (client_options
+        # tune the HTTP pool and timeouts) unless another backend, e.g. a MockBackend, is plugged in
+        self.backend = backend or OpenAIBackend(base_url=base_url, **(client_options or {}))
+        self.client, self.async_client = self.backend.client, self.backend.async_client
+        # Optional shared utils.cache.ResponseCache; stats are kept per agent name
+        self.cache = cache
+        for agent in self.agents.values():
+            agent.client = self.client
+            agent.async_client = self.async_client
+            agent.cache = cache
+        # Optional utils.near_duplicate.NearDuplicateCache used by the summarize and sanitize tools
+        self.near_duplicates = near_duplicates
+        for agent in self.agents.values():
+            agent.near_duplicates = near_duplicates
+        # Optional utils.single_flight.SingleFlight: identical calls in flight at the same time share one
+        # upstream request (and one sampled reply, so only pass it where that is wanted)
+        self.single_flight = single_flight or None
+        for agent in self.agents.values():
+            agent.single_flight = self.single_flight
+        # Optional MicroBatcher packing concurrent short async inputs into one request per agent
+        self.micro_batcher = micro_batcher
+        for agent in self.agents.values():
+            agent.micro_batcher = micro_batcher
+        # Optional PHIScrubber that strips high-confidence PHI locally before SanitizeDataTool's LLM pass
+        self.agents["sanitize_data"].scrubber = phi_scrubber
+        # Oversized originals can be replaced by the summarizer's chunk digests ("digest" budget strategy)
+        for agent_name, agent in self.agents.items():
+            if agent_name != "summarize":
+                agent.digest_source = self.agents["summarize"]
+        # Backoff per agent (retry_policies override retry_policy by agent name); the optional rate limiter
+        # and circuit breaker are shared by all agents since they all talk to the same upstream
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        for agent_name, agent in self.agents.items():
+            agent.retry_policy = (retry_policies or {}).get(agent_name) or retry_policy or RetryPolicy()
+            agent.rate_limiter = self.rate_limiter
+            agent.circuit_breaker = self.circuit_breaker
+        # Latency, TTFT, retry, error and token metrics for every agent call
+        self.metrics = metrics or MetricsRegistry()
+        for agent in self.agents.values():
+            agent.metrics = self.metrics
+        # Optional utils.tracing.Tracer: spans per execute and per call_openai attempt
+        self.tracer = tracer
+        for agent in self.agents.values():
+            agent.tracer = tracer
+        # One payload logging policy for all agents; it redacts with the PHI scrubber's dictionaries when given
+        self.log_policy = log_policy or PayloadLogPolicy.from_env(scrubber=phi_scrubber)
+        for agent in self.agents.values():
+            agent.log_policy = self.log_policy
+        # Per-agent model routing, e.g. default_model_routes(): cheaper models for validators and short
+        # inputs, escalating to the large model on low or missing scores; unrouted agents keep gpt-4
+        for agent_name, route in (model_routes or {}).items():
+            self.get_agent(agent_name).model_route = route
+        # Optional utils.run_store.RunStore: Workflows record their runs in it and re-execute only the
+        # steps whose inputs changed since a stored run
+        self.run_store = run_store
+        # Per-agent prompt budgets, e.g. {"refiner": {"max_prompt_tokens": 3000, "strategy": "truncate"}}
+        for agent_name, budget in (token_budgets or {}).items():
+            agent = self.get_agent(agent_name)
+            agent.max_prompt_tokens = budget.get("max_prompt_tokens", agent.max_prompt_tokens)
+            agent.budget_strategy = budget.get("strategy", agent.budget_strategy)
 
     def get_agent(self, agent_name):
         agent = self.agents.get(agent_name)
         if not agent:
             raise ValueError(f"Agent '{agent_name}' not found.")
         return agent
+
+    def get_pipeline(self, pipeline_name):
+        steps = PIPELINES.get(pipeline_name)
+        if not steps:
+            raise ValueError(f"Pipeline '{pipeline_name}' not found.")
+        return steps
+
+    def usage(self):
+        return {agent_name: agent.usage.as_dict() for agent_name, agent in self.agents.items()}
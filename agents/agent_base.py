@@ -1,45 +1,651 @@
 # agents/agent_base.py
 
-import openai
 from abc import ABC, abstractmethod
 from loguru import logger
-import os
-from dotenv import load_dotenv
+import asyncio
+import inspect
+import time
 
-# Load environment variables
-load_dotenv()
+from utils.tokens import (
+    TokenBudgetExceeded,
+    UsageStats,
+    context_window,
+    count_message_tokens,
+    count_tokens,
+    current_usage,
+    message_text,
+    truncate_to_tokens,
+)
+from utils.cache import make_cache_key
+from utils.retry import (FATAL, RATE_LIMIT, TRANSIENT, CircuitOpenError, RetryPolicy, classify_error,
+                         upstream_answered)
+from utils.tracing import maybe_span
+from .chunking import split_into_chunks
+from .clients import get_default_clients
+from .payload_logging import LogPayload, PayloadLogPolicy
+from .result import AgentResult
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Models that accept response_format={"type": "json_object"}; the original gpt-4 rejects it
+JSON_MODE_MODELS = ("gpt-4o", "gpt-4-turbo", "gpt-4-1106", "gpt-4-0125", "gpt-4.1", "gpt-3.5-turbo")
+
+def request_options(model, response_format):
+    if response_format is None or (response_format.get("type") == "json_object" and not model.startswith(JSON_MODE_MODELS)):
+        return {}
+    return {"response_format": response_format}
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens the provider served from its prefix cache, or None if the response does not say."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
 
 class AgentBase(ABC):
+    # Argument of build_request that may be shrunk when the prompt is over budget, and how:
+    # "truncate" it, "chunk" it (one call per piece, replies joined), replace it with "digest"s
+    # from digest_source (falling back to truncation), or raise on "error".
+    budget_field = None
+    budget_strategy = "truncate"
+    # Arguments the "chunk" strategy splits (see chunk_inputs); None: budget_field alone
+    chunk_fields = None
+    # Argument looked up in the near-duplicate cache (see plan_near_duplicate); None: never deduplicated
+    near_duplicate_field = None
+
     def __init__(self, name, max_retries=2, verbose=True):
         self.name = name
         self.max_retries = max_retries
         self.verbose = verbose
+        self.model = "gpt-4"
+        # Optional agents.routing.ModelRoute, set by AgentManager: picks a cheaper model per call and
+        # escalates to a larger one on low or unclear scores. self.model stays the default and tokenizer.
+        self.model_route = None
+        self.cache = None  # optional utils.cache.ResponseCache, injected by AgentManager
+        self.near_duplicates = None  # optional utils.near_duplicate.NearDuplicateCache, injected by AgentManager
+        self.single_flight = None  # optional utils.single_flight.SingleFlight shared by AgentManager
+        self.micro_batcher = None  # optional agents.micro_batching.MicroBatcher for short async inputs
+        # OpenAI clients injected by AgentManager; standalone agents share the default pair
+        self.client = None
+        self.async_client = None
+        self.max_prompt_tokens = None  # None: the model's context window minus max_tokens
+        self.digest_source = None  # SummarizeTool used by the "digest" strategy
+        self.usage = UsageStats()
+        # Retry/backoff policy, plus the rate limiter and circuit breaker AgentManager shares between agents
+        self.retry_policy = RetryPolicy()
+        self.rate_limiter = None
+        self.circuit_breaker = None
+        # How much of each prompt/response body reaches the DEBUG log (truncated, sampled, PHI-redacted)
+        self.log_policy = PayloadLogPolicy.from_env()
+        # Optional utils.metrics.MetricsRegistry and utils.tracing.Tracer, shared by the AgentManager
+        self.metrics = None
+        self.tracer = None
+
+    def get_client(self):
+        return self.client or get_default_clients()[0]
+
+    def get_async_client(self):
+        return self.async_client or get_default_clients()[1]
 
     @abstractmethod
-    def execute(self, *args, **kwargs):
+    def build_request(self, *args, **kwargs):
+        """Return (messages, params) for this agent; params are passed to call_openai."""
         pass
 
-    def call_openai(self, messages, temperature=0.7, max_tokens=150):
-        retries = 0
-        while retries < self.max_retries:
-            try:
-                if self.verbose:
-                    logger.info(f"[{self.name}] Sending messages to OpenAI:")
-                    for msg in messages:
-                        logger.debug(f"  {msg['role']}: {msg['content']}")
-                response = openai.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-                reply = response.choices[0].message
-                if self.verbose:
-                    logger.info(f"[{self.name}] Received response: {reply}")
+    def _bind(self, args, kwargs):
+        bound = inspect.signature(self.build_request).bind(*args, **kwargs)
+        bound.apply_defaults()
+        # Another agent's result is handed over as its text only, never its repr
+        return {name: value.text if isinstance(value, AgentResult) else value for name, value in bound.arguments.items()}
+
+    def prompt_budget(self, params):
+        if self.max_prompt_tokens is not None:
+            return self.max_prompt_tokens
+        return context_window(self.model) - params.get("max_tokens", 150)
+
+    def _needs_digest(self, call_kwargs):
+        if self.budget_strategy != "digest" or self.digest_source is None or not call_kwargs.get(self.budget_field):
+            return False
+        messages, params = self.build_request(**call_kwargs)
+        return count_message_tokens(messages, self.model) > self.prompt_budget(params)
+
+    def _apply_digests(self, call_kwargs, digests):
+        call_kwargs[self.budget_field] = "\n\n".join(digests)
+
+    def plan_requests(self, call_kwargs):
+        """Return the (messages, params) pairs to send, applying the budget strategy to an oversized prompt."""
+        messages, params = self.build_request(**call_kwargs)
+        tokens = count_message_tokens(messages, self.model)
+        budget = self.prompt_budget(params)
+        if tokens <= budget:
+            return [(messages, params)]
+        value = call_kwargs.get(self.budget_field)
+        strategy = "chunk" if self.budget_strategy == "chunk" else "truncate"
+        # Tokens the shrunk fields may keep, leaving room for the truncation marker and tokenizer drift at piece boundaries
+        fields = (self.chunk_fields or (self.budget_field,)) if strategy == "chunk" else (self.budget_field,)
+        kept = sum(count_tokens(str(call_kwargs.get(field) or ""), self.model) for field in fields)
+        allowed = kept - (tokens - budget) - 16 if value else 0
+        if self.budget_strategy == "error" or allowed <= 0:
+            raise TokenBudgetExceeded(f"[{self.name}] Prompt is {tokens} tokens; the budget is {budget}.")
+        logger.warning(f"[{self.name}] Prompt is {tokens} tokens, over the {budget} token budget; applying '{strategy}' to {self.budget_field}")
+        if strategy == "chunk":
+            return [self.build_request(**pieces) for pieces in self.chunk_inputs(call_kwargs, allowed)]
+        truncated = truncate_to_tokens(value, allowed, self.model) + "\n[...truncated]"
+        return [self.build_request(**dict(call_kwargs, **{self.budget_field: truncated}))]
+
+    def chunk_inputs(self, call_kwargs, allowed):
+        """The call_kwargs of each request of the "chunk" strategy, `allowed` being the tokens left for chunk_fields."""
+        return [dict(call_kwargs, **{self.budget_field: piece}) for piece in split_into_chunks(call_kwargs[self.budget_field], allowed)]
+
+    def _join(self, replies, started):
+        return AgentResult.join(replies, latency=time.perf_counter() - started)
+
+    def plan_near_duplicate(self, call_kwargs, match):
+        """
+        How to answer an input that is a near-duplicate of `match` (a NearDuplicateMatch):
+        (requests, assemble), the (messages, params) pairs to send and a function turning their
+        reply texts into the result text. No requests means the prior result is reused as is;
+        None means the input is processed in full.
+        """
+        return None
+
+    def _near_duplicate_plan(self, call_kwargs):
+        if self.near_duplicates is None or self.near_duplicate_field is None or not call_kwargs.get(self.near_duplicate_field):
+            return None
+        match = self.near_duplicates.lookup(self.name, call_kwargs[self.near_duplicate_field])
+        plan = self.plan_near_duplicate(call_kwargs, match) if match is not None else None
+        if plan is not None and plan[0]:
+            # Sending the changes only pays off if it is smaller than sending the input in full
+            diff_tokens = sum(count_message_tokens(messages, self.model) for messages, _ in plan[0])
+            if diff_tokens >= count_message_tokens(self.build_request(**call_kwargs)[0], self.model):
+                plan = None
+        if plan is None:
+            self.near_duplicates.count(self.name, "misses")
+            return None
+        return match, plan
+
+    def _near_duplicate_result(self, call_kwargs, match, plan, replies, started):
+        requests, assemble = plan
+        mode = "diff" if requests else "reuse"
+        self.near_duplicates.count(self.name, "diffed" if requests else "reused")
+        if self.verbose:
+            logger.info(f"[{self.name}] Near-duplicate ({match.similarity:.2f}) of {match.doc_id}: "
+                        + (f"sent {len(requests)} changed passage(s)" if requests else "reused its result"))
+        result = AgentResult(
+            assemble([reply.text for reply in replies]),
+            model=replies[0].model if replies else None,
+            usage={key: sum(reply.usage[key] for reply in replies) for key in ("prompt_tokens", "completion_tokens")},
+            latency=time.perf_counter() - started,
+            finish_reason=replies[-1].finish_reason if replies else "stop",
+            cached=not replies,
+            near_duplicate={"mode": mode, "similarity": round(match.similarity, 3), "source": match.doc_id},
+        )
+        self._remember_near_duplicate(call_kwargs, result)
+        return result
+
+    def _remember_near_duplicate(self, call_kwargs, result):
+        if self.near_duplicates is not None and self.near_duplicate_field is not None and call_kwargs.get(self.near_duplicate_field):
+            self.near_duplicates.store(self.name, call_kwargs[self.near_duplicate_field], result.text)
+
+    def build_batch_item(self, *args, **kwargs):
+        """This input's section of a micro-batched prompt (see agents.micro_batching), or None to never batch it."""
+        return None
+
+    def build_batch_request(self, sections):
+        """(messages, params) asking for one reply per section, as {"items": [{"id": 1, ...}, ...]}."""
+        raise NotImplementedError(f"{self.name} does not support micro-batching.")
+
+    def split_batch_reply(self, text, count):
+        """Per-item reply texts from a batched reply; None for each item to send on its own."""
+        return [None] * count
+
+    async def _amicro_batch(self, call_kwargs, started):
+        if self.micro_batcher is None:
+            return None
+        section = self.build_batch_item(**call_kwargs)
+        if section is None:
+            return None
+        messages, params = self.build_request(**call_kwargs)
+        planned = self.micro_batcher.plan(self, section, messages, params)
+        if planned is None:
+            return None
+        _, reserved = self._check_budget(messages, params.get("max_tokens", 150))
+        try:
+            result = await self.micro_batcher.submit(self, planned)
+        except BaseException:
+            self._release_budget(reserved)
+            raise
+        if result is None:
+            self._release_budget(reserved)
+            return None
+        # The shared request ran outside any pipeline; charge this item's share to its own
+        pipeline_usage = current_usage.get()
+        if pipeline_usage is not None:
+            pipeline_usage.record(self.name, result.usage["prompt_tokens"], result.usage["completion_tokens"],
+                                  cached=result.cached, reserved=reserved)
+        escalated = self._escalation(result.model, result)
+        if escalated:
+            return await self.acall_openai(messages, model=escalated, **params)
+        result.latency = time.perf_counter() - started
+        return result
+
+    def _span(self, operation, **attributes):
+        return maybe_span(self.tracer, f"{self.name}.{operation}", **{"agent.name": self.name}, **attributes)
+
+    def execute(self, *args, **kwargs):
+        with self._span("execute"):
+            started = time.perf_counter()
+            call_kwargs = self._bind(args, kwargs)
+            near_duplicate = self._near_duplicate_plan(call_kwargs)
+            if near_duplicate is not None:
+                match, plan = near_duplicate
+                replies = [self.routed_call(messages, **params) for messages, params in plan[0]]
+                return self._near_duplicate_result(call_kwargs, match, plan, replies, started)
+            if self._needs_digest(call_kwargs):
+                self._apply_digests(call_kwargs, self.digest_source.chunk_digests(call_kwargs[self.budget_field]))
+            replies = [self.routed_call(messages, **params) for messages, params in self.plan_requests(call_kwargs)]
+            result = self._join(replies, started)
+            self._remember_near_duplicate(call_kwargs, result)
+            return result
+
+    async def aexecute(self, *args, **kwargs):
+        with self._span("execute"):
+            started = time.perf_counter()
+            call_kwargs = self._bind(args, kwargs)
+            near_duplicate = self._near_duplicate_plan(call_kwargs)
+            if near_duplicate is not None:
+                match, plan = near_duplicate
+                replies = await asyncio.gather(*(self.arouted_call(messages, **params) for messages, params in plan[0]))
+                return self._near_duplicate_result(call_kwargs, match, plan, list(replies), started)
+            if self._needs_digest(call_kwargs):
+                self._apply_digests(call_kwargs, await self.digest_source.achunk_digests(call_kwargs[self.budget_field]))
+            result = await self._amicro_batch(call_kwargs, started)
+            if result is not None:
+                self._remember_near_duplicate(call_kwargs, result)
+                return result
+            replies = await asyncio.gather(
+                *(self.arouted_call(messages, **params) for messages, params in self.plan_requests(call_kwargs))
+            )
+            result = self._join(replies, started)
+            self._remember_near_duplicate(call_kwargs, result)
+            return result
+
+    def stream_execute(self, *args, **kwargs):
+        call_kwargs = self._bind(args, kwargs)
+        if self._needs_digest(call_kwargs):
+            self._apply_digests(call_kwargs, self.digest_source.chunk_digests(call_kwargs[self.budget_field]))
+        return self._stream_all(self.plan_requests(call_kwargs))
+
+    def _stream_all(self, requests):
+        with self._span("stream_execute"):
+            started = time.perf_counter()
+            replies = []
+            for index, (messages, params) in enumerate(requests):
+                if index:
+                    yield "\n\n"
+                reply = yield from self.stream_openai(messages, **params)
+                replies.append(reply)
+            return self._join(replies, started)
+
+    def _choose_model(self, messages):
+        if self.model_route is None:
+            return self.model
+        return self.model_route.choose(count_message_tokens(messages, self.model))
+
+    def _escalation(self, model, reply):
+        escalated = self.model_route.escalate(model, reply) if self.model_route is not None else None
+        if escalated is not None:
+            if self.verbose:
+                logger.info(f"[{self.name}] Escalating from {model} to {escalated}: low or missing score")
+            if self.metrics is not None:
+                self.metrics.record_escalation(self.name)
+        return escalated
+
+    def routed_call(self, messages, **params):
+        """call_openai on the routed model, asking the escalation model again if the reply calls for it."""
+        model = self._choose_model(messages)
+        reply = self.call_openai(messages, model=model, **params)
+        escalated = self._escalation(model, reply)
+        return self.call_openai(messages, model=escalated, **params) if escalated else reply
+
+    async def arouted_call(self, messages, **params):
+        model = self._choose_model(messages)
+        reply = await self.acall_openai(messages, model=model, **params)
+        escalated = self._escalation(model, reply)
+        return await self.acall_openai(messages, model=escalated, **params) if escalated else reply
+
+    def _check_budget(self, messages, max_tokens):
+        # Estimated before sending and reserved in the pipeline budget until the call records its usage,
+        # so neither the call itself nor calls running alongside it can overrun the budget.
+        # Returns (estimated prompt tokens, reservation).
+        estimated = count_message_tokens(messages, self.model)
+        pipeline_usage = current_usage.get()
+        reserved = pipeline_usage.check(self.name, estimated + max_tokens) if pipeline_usage is not None else 0
+        return estimated, reserved
+
+    def _release_budget(self, reserved):
+        pipeline_usage = current_usage.get()
+        if reserved and pipeline_usage is not None:
+            pipeline_usage.release(reserved)
+
+    def _record_usage(self, estimated_prompt_tokens, reply, usage=None, cached=False, reserved=0):
+        prompt_tokens = usage.prompt_tokens if usage is not None else estimated_prompt_tokens
+        if usage is not None:
+            completion_tokens = usage.completion_tokens
+        else:
+            completion_tokens = count_tokens(reply.text, self.model)
+        self.usage.record(self.name, prompt_tokens, completion_tokens, cached=cached)
+        pipeline_usage = current_usage.get()
+        if pipeline_usage is not None:
+            pipeline_usage.record(self.name, prompt_tokens, completion_tokens, cached=cached, reserved=reserved)
+        if self.verbose and not cached:
+            prefix_cached = cached_prompt_tokens(usage)
+            logger.info(f"[{self.name}] Tokens: prompt={prompt_tokens} completion={completion_tokens}"
+                        + (f" cached_prompt={prefix_cached}" if prefix_cached is not None else ""))
+        return prompt_tokens, completion_tokens
+
+    def _record_metrics(self, started, attempt, tokens, model, first_token_at=None, cached_tokens=None):
+        if self.metrics is not None:
+            now = time.perf_counter()
+            ttft = first_token_at - started if first_token_at is not None else None
+            self.metrics.record_call(self.name, now - started, attempt, *tokens, ttft=ttft, model=model,
+                                     cached_tokens=cached_tokens)
+
+    def _log_request(self, messages, model=None):
+        if self.verbose:
+            logger.info("[{}] Sending {} messages to {}", self.name, len(messages), model or self.model)
+            if self.log_policy.sampled(message_text(messages[-1]["content"])):
+                # Bodies travel raw; the sink renders (truncates, PHI-scrubs) them off the caller's thread
+                logger.debug("[{}] Request:", self.name,
+                             payload=LogPayload(self.log_policy, [(f"{msg['role']}: ", msg["content"]) for msg in messages]))
+
+    def _log_response(self, reply, messages):
+        if self.verbose:
+            content = reply.text
+            logger.info("[{}] Received response ({} chars)", self.name, len(content))
+            if self.log_policy.sampled(message_text(messages[-1]["content"])):
+                logger.debug("[{}] Response:", self.name, payload=LogPayload(self.log_policy, [("", content)]))
+
+    def _cache_lookup(self, messages, temperature, max_tokens, model):
+        if self.cache is None:
+            return None, None
+        key, value = self.cache.lookup(self.name, model, messages, temperature, max_tokens)
+        if value is not None:
+            if self.verbose:
+                logger.info(f"[{self.name}] Cache hit")
+            if self.metrics is not None:
+                self.metrics.record_cache_hit(self.name)
+            # Entries hold the reply text and how it finished; older ones are OpenAI message dumps
+            return key, AgentResult(value.get("content"), model=model, finish_reason=value.get("finish_reason"), cached=True)
+        return key, None
+
+    def _cache_store(self, key, reply):
+        if self.cache is not None:
+            self.cache.store(key, {"content": reply.text, "finish_reason": reply.finish_reason})
+
+    def _max_attempts(self):
+        return self.retry_policy.max_retries or self.max_retries
+
+    def _before_attempt(self, tokens):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(tokens)
+
+    async def _abefore_attempt(self, tokens):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_call()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(tokens)
+
+    def _on_success(self):
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+
+    def _retry_delay(self, error, attempt, started):
+        """Return how long to wait before the next attempt, or raise if the call should not be retried."""
+        category = classify_error(error)
+        if self.metrics is not None:
+            self.metrics.record_error(self.name, category, error)
+        if self.circuit_breaker is not None and not isinstance(error, CircuitOpenError):
+            # Only transient failures say the upstream is unhealthy; a 4xx or 429 means it answered.
+            # Anything else (a budget error, a bug on our side) says nothing about it either way.
+            if category == TRANSIENT:
+                self.circuit_breaker.record_failure()
+            elif upstream_answered(error):
+                self.circuit_breaker.record_success()
+        if category == FATAL:
+            logger.error(f"[{self.name}] Non-retryable error during OpenAI call: {error}")
+            self._record_failure(started, attempt)
+            raise error
+        delay = self.retry_policy.delay(attempt, error)
+        if category == RATE_LIMIT and self.rate_limiter is not None and delay:
+            # Every agent sharing the limiter backs off, not just this one
+            self.rate_limiter.pause(delay)
+        if attempt >= self._max_attempts() or delay is None:
+            self._record_failure(started, attempt)
+            raise Exception(f"[{self.name}] Failed to get response from OpenAI after {attempt} attempts.") from error
+        logger.error(f"[{self.name}] Error during OpenAI call ({category}): {error}. Retry {attempt}/{self._max_attempts()} in {delay:.1f}s")
+        return delay
+
+    def _start_attempt(self, attempt, max_tokens, model):
+        if self.tracer is None:
+            return None
+        return self.tracer.start_span(f"{self.name}.call_openai", **{
+            "agent.name": self.name, "llm.model": model, "llm.max_tokens": max_tokens, "retry.attempt": attempt,
+        })
+
+    def _end_attempt(self, span, error=None, tokens=None):
+        if span is None:
+            return
+        if error is not None:
+            span.end(error=error, **{"error.category": classify_error(error)})
+        elif tokens is not None:
+            span.end(**{"llm.prompt_tokens": tokens[0], "llm.completion_tokens": tokens[1]})
+        else:
+            # Cancelled or closed before reporting back; a span already ended is left as it is
+            span.end(**{"attempt.abandoned": True})
+
+    def _result(self, text, model, started, finish_reason):
+        return AgentResult(text, model=model, latency=time.perf_counter() - started, finish_reason=finish_reason)
+
+    def _finish(self, reply, tokens, cached_tokens=None):
+        reply.usage = {"prompt_tokens": tokens[0], "completion_tokens": tokens[1]}
+        if cached_tokens is not None:
+            reply.usage["cached_prompt_tokens"] = cached_tokens
+        if reply.finish_reason == "length" and self.verbose:
+            logger.warning(f"[{self.name}] Reply was cut off at max_tokens")
+
+    def _record_failure(self, started, attempt):
+        if self.metrics is not None:
+            self.metrics.record_failure(self.name, time.perf_counter() - started, attempt)
+
+    def _flight_key(self, messages, temperature, max_tokens, model):
+        # The agent fixes response_format, so the agent name and the cache key identify a request
+        return self.name, make_cache_key(model, messages, temperature, max_tokens)
+
+    def _coalesced(self, reply, started):
+        # Shared from an identical call already in flight: no tokens of this caller's were spent
+        if self.verbose:
+            logger.info(f"[{self.name}] Joined an identical in-flight request")
+        if self.metrics is not None:
+            self.metrics.record_coalesced(self.name)
+        shared = AgentResult(reply.text, model=reply.model, latency=time.perf_counter() - started,
+                             finish_reason=reply.finish_reason, cached=reply.cached, coalesced=True)
+        self._record_usage(0, shared, cached=True)
+        return shared
+
+    def call_openai(self, messages, temperature=0.7, max_tokens=150, model=None, response_format=None):
+        model = model or self._choose_model(messages)
+        cache_key, cached = self._cache_lookup(messages, temperature, max_tokens, model)
+        if cached is not None:
+            self._record_usage(0, cached, cached=True)
+            return cached
+        if self.single_flight is None:
+            return self._request(messages, temperature, max_tokens, model, response_format, cache_key)
+        started = time.perf_counter()
+        reply, leader = self.single_flight.do(
+            self.name, self._flight_key(messages, temperature, max_tokens, model),
+            lambda: self._request(messages, temperature, max_tokens, model, response_format, cache_key),
+        )
+        return reply if leader else self._coalesced(reply, started)
+
+    def _request(self, messages, temperature, max_tokens, model, response_format, cache_key):
+        estimated_prompt_tokens, reserved = self._check_budget(messages, max_tokens)
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                span = self._start_attempt(attempt, max_tokens, model)
+                try:
+                    self._before_attempt(estimated_prompt_tokens + max_tokens)
+                    self._log_request(messages, model)
+                    response = self.get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **request_options(model, response_format),
+                    )
+                except Exception as e:
+                    self._end_attempt(span, error=e)
+                    time.sleep(self._retry_delay(e, attempt, started))
+                    continue
+                self._on_success()
+                reply = self._result(response.choices[0].message.content, model, started, response.choices[0].finish_reason)
+                self._log_response(reply, messages)
+                tokens = self._record_usage(estimated_prompt_tokens, reply, usage=response.usage, reserved=reserved)
+                reserved = 0
+                cached_tokens = cached_prompt_tokens(response.usage)
+                self._finish(reply, tokens, cached_tokens)
+                self._record_metrics(started, attempt, tokens, model, cached_tokens=cached_tokens)
+                self._end_attempt(span, tokens=tokens)
+                self._cache_store(cache_key, reply)
                 return reply
-            except Exception as e:
-                retries += 1
-                logger.error(f"[{self.name}] Error during OpenAI call: {e}. Retry {retries}/{self.max_retries}")
-        raise Exception(f"[{self.name}] Failed to get response from OpenAI after {self.max_retries} retries.")
+        finally:
+            # A call that gives up, or is cancelled, records no usage; give its reservation back
+            self._release_budget(reserved)
+
+    async def acall_openai(self, messages, temperature=0.7, max_tokens=150, model=None, response_format=None):
+        model = model or self._choose_model(messages)
+        cache_key, cached = self._cache_lookup(messages, temperature, max_tokens, model)
+        if cached is not None:
+            self._record_usage(0, cached, cached=True)
+            return cached
+        if self.single_flight is None:
+            return await self._arequest(messages, temperature, max_tokens, model, response_format, cache_key)
+        started = time.perf_counter()
+        reply, leader = await self.single_flight.ado(
+            self.name, self._flight_key(messages, temperature, max_tokens, model),
+            lambda: self._arequest(messages, temperature, max_tokens, model, response_format, cache_key),
+        )
+        return reply if leader else self._coalesced(reply, started)
+
+    async def _arequest(self, messages, temperature, max_tokens, model, response_format, cache_key):
+        estimated_prompt_tokens, reserved = self._check_budget(messages, max_tokens)
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                span = self._start_attempt(attempt, max_tokens, model)
+                try:
+                    await self._abefore_attempt(estimated_prompt_tokens + max_tokens)
+                    self._log_request(messages, model)
+                    response = await self.get_async_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **request_options(model, response_format),
+                    )
+                except Exception as e:
+                    self._end_attempt(span, error=e)
+                    await asyncio.sleep(self._retry_delay(e, attempt, started))
+                    continue
+                else:
+                    self._on_success()
+                    reply = self._result(response.choices[0].message.content, model, started, response.choices[0].finish_reason)
+                    self._log_response(reply, messages)
+                    tokens = self._record_usage(estimated_prompt_tokens, reply, usage=response.usage, reserved=reserved)
+                    reserved = 0
+                    cached_tokens = cached_prompt_tokens(response.usage)
+                    self._finish(reply, tokens, cached_tokens)
+                    self._record_metrics(started, attempt, tokens, model, cached_tokens=cached_tokens)
+                    self._end_attempt(span, tokens=tokens)
+                    self._cache_store(cache_key, reply)
+                    return reply
+                finally:
+                    # A cancelled task (a step a Workflow no longer needs) still ends its attempt span
+                    self._end_attempt(span)
+        finally:
+            # A call that gives up, or is cancelled, records no usage; give its reservation back
+            self._release_budget(reserved)
+
+    def stream_openai(self, messages, temperature=0.7, max_tokens=150, model=None, response_format=None):
+        """
+        Generator yielding content deltas as they arrive. Its return value (StopIteration.value)
+        is the assembled message, identical in content to what call_openai would have returned.
+        A failure before the first delta is retried; once text has been yielded it is raised.
+        Streams use the routed model but never escalate, since their text is already shown.
+        """
+        model = model or self._choose_model(messages)
+        cache_key, cached = self._cache_lookup(messages, temperature, max_tokens, model)
+        if cached is not None:
+            self._record_usage(0, cached, cached=True)
+            yield cached.text
+            return cached
+        estimated_prompt_tokens, reserved = self._check_budget(messages, max_tokens)
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                span = self._start_attempt(attempt, max_tokens, model)
+                parts = []
+                first_token_at = None
+                finish_reason = None
+                try:
+                    self._before_attempt(estimated_prompt_tokens + max_tokens)
+                    self._log_request(messages, model)
+                    stream = self.get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        **request_options(model, response_format),
+                    )
+                    for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(delta)
+                            yield delta
+                except Exception as e:
+                    self._end_attempt(span, error=e)
+                    if parts:
+                        if self.metrics is not None:
+                            self.metrics.record_error(self.name, classify_error(e), e)
+                        self._record_failure(started, attempt)
+                        raise
+                    time.sleep(self._retry_delay(e, attempt, started))
+                    continue
+                else:
+                    self._on_success()
+                    reply = self._result("".join(parts), model, started, finish_reason)
+                    self._log_response(reply, messages)
+                    tokens = self._record_usage(estimated_prompt_tokens, reply, reserved=reserved)
+                    reserved = 0
+                    self._finish(reply, tokens)
+                    self._record_metrics(started, attempt, tokens, model, first_token_at)
+                    self._end_attempt(span, tokens=tokens)
+                    self._cache_store(cache_key, reply)
+                    return reply
+                finally:
+                    # A consumer that stops reading (a cancelled Workflow step) closes this generator at a yield
+                    self._end_attempt(span)
+        finally:
+            # A call that gives up, or a stream its consumer stops reading, records no usage; give its reservation back
+            self._release_budget(reserved)
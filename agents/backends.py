@@ -0,0 +1,276 @@
+# agents/backends.py
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from utils.tokens import count_message_tokens, count_tokens, message_text
+from .clients import create_openai_clients
+
+# A backend supplies the (client, async_client) pair AgentBase talks to. Both expose
+# `chat.completions.create(model=..., messages=..., temperature=..., max_tokens=..., stream=False)`
+# with the OpenAI SDK's return types and exceptions, so retries, metrics and streaming work unchanged.
+
+class OpenAIBackend:
+    """The OpenAI API (or any compatible endpoint) over a pooled client pair."""
+
+    def __init__(self, base_url=None, **client_options):
+        self.client, self.async_client = create_openai_clients(base_url=base_url, **client_options)
+
+class LatencyModel:
+    """
+    Samples a latency in seconds: "fixed" (always `median`), "uniform" between `low` and `high`,
+    or "lognormal" around `median` with shape `sigma`, the long right tail real LLM APIs show.
+    """
+
+    def __init__(self, kind="lognormal", median=0.5, sigma=0.5, low=None, high=None):
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{kind}'.")
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.low = median / 2 if low is None else low
+        self.high = median * 2 if high is None else high
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.median
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high)
+        return self.median * math.exp(rng.gauss(0, self.sigma))
+
+VOCABULARY = (
+    "patient clinical assessment treatment history findings therapy outcome follow-up evidence "
+    "diagnosis management review study results risk dose response monitoring plan care"
+).split()
+
+BATCH_ITEM = re.compile(r'<item id="(\d+)">')
+
+def _verdict(rng):
+    issue = " ".join(rng.choice(VOCABULARY) for _ in range(8)).capitalize() + "."
+    return {"score": 4, "issues": [issue], "phi": []}
+
+def _prose(max_tokens, rng, reply_tokens):
+    words = [rng.choice(VOCABULARY) for _ in range(max(1, min(max_tokens, reply_tokens) - 8))]
+    return " ".join(words).capitalize() + ". Rating: 4/5"
+
+def default_reply(messages, max_tokens, rng, reply_tokens=120):
+    prompt = message_text(messages[-1]["content"])
+    ids = [int(id_) for id_ in BATCH_ITEM.findall(prompt)]
+    if ids:
+        # Micro-batched prompt: one JSON entry per item, sharing the token allowance
+        if '"score"' in prompt:
+            return json.dumps({"items": [dict(_verdict(rng), id=id_) for id_ in ids]})
+        share = max(1, max_tokens // len(ids))
+        return json.dumps({"items": [{"id": id_, "summary": _prose(share, rng, reply_tokens)} for id_ in ids]})
+    if '"score"' in prompt:
+        # Validators ask for a JSON verdict
+        return json.dumps(_verdict(rng))
+    # Filler prose of a realistic length; ends with a rating so free-text validation parses like the real thing
+    return _prose(max_tokens, rng, reply_tokens)
+
+# Prompt caching as OpenAI documents it: prompts of 1024+ tokens, matched in 128-token steps from the
+# start. Approximated in characters (about four per token) so the mock never tokenizes to decide.
+CACHE_MIN_CHARS = 4096
+CACHE_BLOCK_CHARS = 512
+
+def prompt_prefix_text(messages):
+    return "\n".join(f"{message['role']}:{message_text(message['content'])}" for message in messages)
+
+class _Completions:
+    def __init__(self, backend, is_async):
+        self._backend = backend
+        self._is_async = is_async
+
+    def create(self, model, messages, temperature=0.7, max_tokens=150, stream=False, **kwargs):
+        if self._is_async:
+            return self._backend._acreate(model, messages, max_tokens, stream)
+        return self._backend._create(model, messages, max_tokens, stream)
+
+class _Chat:
+    def __init__(self, completions):
+        self.completions = completions
+
+class _Client:
+    def __init__(self, backend, is_async):
+        self.chat = _Chat(_Completions(backend, is_async))
+
+class MockBackend:
+    """
+    Deterministic local stand-in for the OpenAI API, for load tests and benchmarks. Every request
+    gets its own RNG seeded from `seed`, the prompt and how often that prompt was sent before, so
+    latencies, injected failures and replies replay identically however requests interleave.
+
+    Time to first token follows `latency`, or `model_latency[model]` for models listed there (a
+    faster small model, say), and each generated token adds `seconds_per_token`.
+    `error_rate` injects 500s and `rate_limit_rate` injects 429s carrying a Retry-After of
+    `retry_after` seconds. `reply(messages, max_tokens, rng)` builds the reply text.
+
+    With `prompt_cache`, prompt prefixes already sent to a model are reported back as
+    `usage.prompt_tokens_details.cached_tokens` and cut time to first token by up to
+    `cached_speedup` (the cached share of the prompt times that factor).
+    """
+
+    def __init__(self, latency=None, seconds_per_token=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, reply=default_reply, seed=0, model_latency=None,
+                 prompt_cache=False, cached_speedup=0.5, max_cached_prefixes=100000):
+        self.latency = latency or LatencyModel()
+        self.model_latency = model_latency or {}
+        self.seconds_per_token = seconds_per_token
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.reply = reply
+        self.seed = seed
+        self.prompt_cache = prompt_cache
+        self.cached_speedup = cached_speedup
+        self.max_cached_prefixes = max_cached_prefixes
+        self._prefixes = OrderedDict()  # (model, prefix hash) -> None, least recently used first
+        self.stats = Counter()
+        self._seen = Counter()
+        self._lock = threading.Lock()
+        self.client = _Client(self, is_async=False)
+        self.async_client = _Client(self, is_async=True)
+
+    def _plan(self, model, messages, max_tokens):
+        """Decide everything about one request up front: (failure or None, ttft, reply text, usage)."""
+        digest = hashlib.sha256(repr(messages).encode("utf-8")).hexdigest()
+        with self._lock:
+            occurrence = self._seen[digest]
+            self._seen[digest] += 1
+            self.stats["requests"] += 1
+            self.stats[f"requests:{model}"] += 1
+        rng = random.Random(f"{self.seed}:{digest}:{occurrence}")
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            return self._error(429, {"retry-after": str(self.retry_after)}), 0.01, None, None
+        ttft = self.model_latency.get(model, self.latency).sample(rng)
+        if roll < self.rate_limit_rate + self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            return self._error(500, {}), ttft, None, None
+        text = self.reply(messages, max_tokens, rng)
+        usage = {
+            "prompt_tokens": count_message_tokens(messages, model),
+            "completion_tokens": count_tokens(text, model),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if self.prompt_cache:
+            cached_share = self._cached_share(model, messages)
+            usage["prompt_tokens_details"] = {"cached_tokens": int(usage["prompt_tokens"] * cached_share)}
+            ttft *= 1 - self.cached_speedup * cached_share
+        return None, ttft, text, usage
+
+    def _cached_share(self, model, messages):
+        """Share of the prompt covered by the longest block-aligned prefix sent before, then remember its prefixes."""
+        prompt = prompt_prefix_text(messages)
+        if len(prompt) < CACHE_MIN_CHARS:
+            return 0.0
+        digest = hashlib.sha256(model.encode("utf-8"))
+        cached_chars = 0
+        with self._lock:
+            for end in range(CACHE_BLOCK_CHARS, len(prompt) + 1, CACHE_BLOCK_CHARS):
+                digest.update(prompt[end - CACHE_BLOCK_CHARS:end].encode("utf-8"))
+                key = digest.copy().hexdigest()
+                if key in self._prefixes:
+                    # Each hash covers the whole prompt up to `end`, so hits are always a leading run
+                    self._prefixes.move_to_end(key)
+                    cached_chars = end
+                else:
+                    self._prefixes[key] = None
+            while len(self._prefixes) > self.max_cached_prefixes:
+                self._prefixes.popitem(last=False)
+            if cached_chars < CACHE_MIN_CHARS:
+                cached_chars = 0
+            self.stats["prefix_cache_hits" if cached_chars else "prefix_cache_misses"] += 1
+        return cached_chars / len(prompt)
+
+    def _error(self, status, headers):
+        response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://mock/v1/chat/completions"))
+        if status == 429:
+            return openai.RateLimitError("Mock rate limit exceeded", response=response, body=None)
+        return openai.InternalServerError("Mock server error", response=response, body=None)
+
+    def _completion(self, model, text, usage):
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _chunks(self, model, text):
+        words = text.split(" ")
+        for index, word in enumerate(words):
+            yield ChatCompletionChunk.model_validate({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": word if index == 0 else " " + word},
+                             "finish_reason": None if index < len(words) - 1 else "stop"}],
+            })
+
+    def _create(self, model, messages, max_tokens, stream):
+        error, ttft, text, usage = self._plan(model, messages, max_tokens)
+        time.sleep(ttft)
+        if error is not None:
+            raise error
+        if stream:
+            return self._stream(model, text)
+        time.sleep(usage["completion_tokens"] * self.seconds_per_token)
+        return self._completion(model, text, usage)
+
+    def _stream(self, model, text):
+        with self._lock:
+            self.stats["streamed"] += 1
+        for chunk in self._chunks(model, text):
+            yield chunk
+            time.sleep(count_tokens(chunk.choices[0].delta.content) * self.seconds_per_token)
+
+    async def _acreate(self, model, messages, max_tokens, stream):
+        error, ttft, text, usage = self._plan(model, messages, max_tokens)
+        await asyncio.sleep(ttft)
+        if error is not None:
+            raise error
+        if stream:
+            return self._astream(model, text)
+        await asyncio.sleep(usage["completion_tokens"] * self.seconds_per_token)
+        return self._completion(model, text, usage)
+
+    async def _astream(self, model, text):
+        with self._lock:
+            self.stats["streamed"] += 1
+        for chunk in self._chunks(model, text):
+            yield chunk
+            await asyncio.sleep(count_tokens(chunk.choices[0].delta.content) * self.seconds_per_token)
+
+class OfflineBackend:
+    """
+    For work that only builds requests, such as exporting and ingesting batch-API files: no client
+    is created, so no API key is needed, and any call made by mistake fails instead of going out.
+    """
+
+    def __init__(self):
+        self.client = _Client(self, is_async=False)
+        self.async_client = _Client(self, is_async=True)
+
+    def _create(self, model, messages, max_tokens, stream):
+        raise RuntimeError("OfflineBackend makes no API calls; this work runs through a provider batch job.")
+
+    async def _acreate(self, model, messages, max_tokens, stream):
+        self._create(model, messages, max_tokens, stream)
@@ -0,0 +1,91 @@
+# agents/chunking.py
+
+import difflib
+import re
+
+from utils.tokens import count_tokens
+
+# A section starts at a markdown heading, an ALL-CAPS line, or a short "Title:" line on its own
+SECTION_BREAK = re.compile(
+    r"\n(?=[ \t]*(?:#{1,6}[ \t]|[A-Z][A-Z0-9 /&(),-]{2,}:?[ \t]*\n|[A-Z][A-Za-z0-9 /&(),-]{0,60}:[ \t]*\n))"
+)
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+# (pattern, joiner) from coarsest to finest boundary
+LEVELS = [(PARAGRAPH_BREAK, "\n\n"), (SENTENCE_BREAK, " ")]
+
+def split_sections(text):
+    return [section.strip() for section in SECTION_BREAK.split(text) if section.strip()]
+
+def _pack(pieces, joiner, max_tokens, count):
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = count(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+def _split(text, max_tokens, count, level=0):
+    if count(text) <= max_tokens:
+        return [text]
+    if level == len(LEVELS):
+        # No natural boundary left; cut on whitespace at an estimated character budget
+        width = max(1, len(text) * max_tokens // count(text))
+        words = text.split()
+        return _pack(words, " ", max_tokens, count) if len(words) > 1 else [text[i:i + width] for i in range(0, len(text), width)]
+    pattern, joiner = LEVELS[level]
+    pieces = []
+    for piece in pattern.split(text):
+        if piece.strip():
+            pieces.extend(_split(piece.strip(), max_tokens, count, level + 1))
+    return _pack(pieces, joiner, max_tokens, count)
+
+def split_into_chunks(text, max_tokens=1500, count=count_tokens):
+    """
+    Split a long document into chunks of at most `max_tokens` tokens along section boundaries,
+    then paragraphs, then sentences. Sections are never merged with each other, so editing one
+    section leaves the other chunks byte-identical (and their cached summaries reusable).
+    """
+    chunks = []
+    for section in split_sections(text):
+        chunks.extend(_split(section, max_tokens, count))
+    return chunks
+
+def align_lines(left, right):
+    """
+    For each line boundary 0..len(left) of `left`, the matching boundary in `right`: unchanged lines
+    map one to one, and a changed run of lines maps proportionally onto what replaced it.
+    """
+    boundaries = [0] * (len(left) + 1)
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, left, right, autojunk=False).get_opcodes():
+        for i in range(i1, i2 + 1):
+            boundaries[i] = j1 + (i - i1) * (j2 - j1) // (i2 - i1) if i2 > i1 else j2
+    boundaries[0], boundaries[-1] = 0, len(right)
+    return boundaries
+
+def split_aligned(left, right, max_tokens, count=count_tokens):
+    """
+    Split two versions of one text (e.g. a note and its sanitized form) into chunk pairs along the
+    same line boundaries, each pair at most `max_tokens` tokens together where lines allow it.
+    """
+    left_lines, right_lines = left.split("\n"), right.split("\n")
+    boundaries = align_lines(left_lines, right_lines)
+    pairs = []
+    start = 0
+    tokens = 0
+    for index in range(len(left_lines)):
+        line_tokens = count(left_lines[index]) + count("\n".join(right_lines[boundaries[index]:boundaries[index + 1]]))
+        if index > start and tokens + line_tokens > max_tokens:
+            pairs.append((start, index))
+            start, tokens = index, 0
+        tokens += line_tokens
+    pairs.append((start, len(left_lines)))
+    return [("\n".join(left_lines[i1:i2]), "\n".join(right_lines[boundaries[i1]:boundaries[i2]])) for i1, i2 in pairs]
@@ -0,0 +1,52 @@
+# agents/clients.py
+
+import os
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def create_openai_clients(base_url=None, api_key=None, max_connections=100, max_keepalive_connections=20,
+                          keepalive_expiry=30.0, timeout=None, connect_timeout=5.0):
+    """
+    Build a long-lived (sync, async) OpenAI client pair over pooled keep-alive HTTP connections.
+    `base_url` defaults to OPENAI_BASE_URL (so a local stub server can stand in for the API) and
+    `timeout` to TIMEOUT_SECONDS or 60s. SDK-level retries are disabled; AgentBase owns retrying.
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    if timeout is None:
+        timeout = float(os.getenv("TIMEOUT_SECONDS", 60))
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    request_timeout = openai.Timeout(timeout, connect=connect_timeout)
+    client = openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        timeout=request_timeout,
+        http_client=openai.DefaultHttpxClient(limits=limits, timeout=request_timeout),
+    )
+    async_client = openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=0,
+        timeout=request_timeout,
+        http_client=openai.DefaultAsyncHttpxClient(limits=limits, timeout=request_timeout),
+    )
+    return client, async_client
+
+# Shared pair for agents constructed outside an AgentManager, created on first use
+_default_clients = None
+
+def get_default_clients():
+    global _default_clients
+    if _default_clients is None:
+        _default_clients = create_openai_clients()
+    return _default_clients
@@ -0,0 +1,154 @@
+# agents/micro_batching.py
+
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from collections import defaultdict
+
+from loguru import logger
+
+from utils.tokens import count_message_tokens
+from .result import AgentResult
+from .validation import _json_objects
+
+# An input that contains the item tags itself could close its section early and pose as another item
+ITEM_TAG = re.compile(r"</?\s*item\b", re.IGNORECASE)
+
+def format_batch_items(sections):
+    """Delimit each item's section so the reply can refer to it by id."""
+    return "\n\n".join(f'<item id="{index}">\n{section}\n</item>' for index, section in enumerate(sections, start=1))
+
+def batch_reply_items(text, count):
+    """The per-item objects of a batched reply ({"items": [{"id": 1, ...}, ...]}), None for each item missing from it."""
+    items = [None] * count
+    for value in _json_objects(text or ""):
+        entries = value.get("items")
+        if not isinstance(entries, list):
+            continue
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("id", position + 1)) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < count and items[index] is None:
+                items[index] = {key: value for key, value in entry.items() if key != "id"}
+    return items
+
+class _Pending:
+    def __init__(self, model):
+        self.model = model
+        self.items = []  # (section, prompt tokens, reply tokens, future)
+        self.prompt_tokens = 0
+        self.reply_tokens = 0
+        self.timer = None
+
+class MicroBatcher:
+    """
+    Packs concurrent short inputs to one agent into a single request. An input is eligible when
+    the agent can batch it (`build_batch_item`) and its own prompt is at most `max_item_tokens`.
+    Queued inputs are sent together when `max_items` are waiting, when the next one would take
+    the prompt past `max_batch_tokens` or the reply past `max_reply_tokens`, or at the latest
+    `max_wait` seconds after the first one was queued, which bounds the latency batching adds.
+
+    The agent splits the reply back per item (`split_batch_reply`); items it cannot parse, and
+    every item of a failed batch request, come back as None and are sent on their own. So is an
+    input containing an <item> or </item> tag, which could otherwise spill into another item.
+    Only async calls are batched; they must come from one event loop per agent at a time.
+    """
+
+    def __init__(self, max_items=8, max_batch_tokens=3000, max_reply_tokens=4000, max_item_tokens=600, max_wait=0.05):
+        self.max_items = max_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_reply_tokens = max_reply_tokens
+        self.max_item_tokens = max_item_tokens
+        self.max_wait = max_wait
+        self._pending = {}
+        self.stats = defaultdict(lambda: {"batches": 0, "items": 0, "fallbacks": 0})
+        self._lock = threading.Lock()
+
+    def plan(self, agent, section, messages, params):
+        """(section, model, prompt tokens, reply tokens) for an input this batcher takes, else None."""
+        if ITEM_TAG.search(section):
+            return None
+        tokens = count_message_tokens(messages, agent.model)
+        if tokens > self.max_item_tokens:
+            return None
+        # Batched with inputs routed to the same model, so packing never moves a short input to a larger one
+        return section, agent._choose_model(messages), tokens, params.get("max_tokens", 150)
+
+    async def submit(self, agent, planned):
+        """Queue one planned input; returns its AgentResult, or None to have the caller send it alone."""
+        section, model, tokens, reply_tokens = planned
+        key = (agent.name, model)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending is not None and (pending.prompt_tokens + tokens > self.max_batch_tokens
+                                    or pending.reply_tokens + reply_tokens > self.max_reply_tokens):
+            self._flush(agent, key)
+            pending = None
+        if pending is None:
+            pending = self._pending[key] = _Pending(model)
+            pending.timer = loop.call_later(self.max_wait, self._flush, agent, key)
+        pending.items.append((section, tokens, reply_tokens, future))
+        pending.prompt_tokens += tokens
+        pending.reply_tokens += reply_tokens
+        if len(pending.items) >= self.max_items:
+            self._flush(agent, key)
+        return await future
+
+    def _flush(self, agent, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        pending.timer.cancel()
+        items = [item for item in pending.items if not item[3].done()]  # drop cancelled callers
+        if len(items) == 1:
+            # Nothing to share the request with: the caller sends its own, unbatched prompt
+            items[0][3].set_result(None)
+        elif items:
+            # A fresh context: the request is nobody's in particular, each caller is charged its share
+            asyncio.get_running_loop().create_task(self._send(agent, pending.model, items), context=contextvars.Context())
+
+    async def _send(self, agent, model, items):
+        started = time.perf_counter()
+        texts, reply = [None] * len(items), None
+        messages, params = agent.build_batch_request([section for section, _, _, _ in items])
+        params = dict(params, max_tokens=sum(reply_tokens for _, _, reply_tokens, _ in items))
+        try:
+            reply = await agent.acall_openai(messages, model=model, **params)
+            texts = agent.split_batch_reply(reply.text, len(items))
+        except Exception as e:
+            logger.warning(f"[{agent.name}] Batched request for {len(items)} items failed ({type(e).__name__}); sending them one by one")
+        fallbacks = sum(1 for text in texts if text is None)
+        with self._lock:
+            stats = self.stats[agent.name]
+            stats["batches"] += 1 if reply is not None else 0
+            stats["items"] += len(items) - fallbacks
+            stats["fallbacks"] += fallbacks
+        if reply is not None and fallbacks and agent.verbose:
+            logger.info(f"[{agent.name}] {fallbacks} of {len(items)} batched items could not be parsed; sending them one by one")
+        # Each item's share of the request's tokens, split by its share of the prompt
+        total = sum(tokens for _, tokens, _, _ in items)
+        for (_, tokens, _, future), text in zip(items, texts):
+            if future.done():
+                continue
+            if text is None or reply is None:
+                future.set_result(None)
+                continue
+            share = tokens / total
+            future.set_result(AgentResult(
+                text, model=reply.model, latency=time.perf_counter() - started, finish_reason=reply.finish_reason,
+                cached=reply.cached, usage={key: round(reply.usage[key] * share) for key in ("prompt_tokens", "completion_tokens")},
+            ))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                agent_name: dict(counts, mean_batch_size=round(counts["items"] / counts["batches"], 2) if counts["batches"] else None)
+                for agent_name, counts in self.stats.items()
+            }
@@ -0,0 +1,64 @@
+# agents/payload_logging.py
+
+import os
+import zlib
+
+from utils.tokens import message_text
+from .phi_scrubber import PHIScrubber
+
+class PayloadLogPolicy:
+    """
+    Decides whether and how prompt/response bodies reach the DEBUG log: only a sampled share of
+    calls logs bodies, each body is cut to `max_chars`, and PHI is scrubbed from what remains
+    before it is written. Sampling is keyed on the prompt, so a call's request and response are
+    logged together or not at all.
+    """
+
+    def __init__(self, max_chars=300, sample_rate=0.1, redact=True, scrubber=None):
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+        self.scrubber = (scrubber or PHIScrubber()) if redact else None
+
+    @classmethod
+    def from_env(cls, scrubber=None):
+        """LOG_BODY_CHARS (0 = unlimited), LOG_BODY_SAMPLE_RATE (0-1, default 0.1) and LOG_REDACT_PHI (default on)."""
+        return cls(
+            max_chars=int(os.getenv("LOG_BODY_CHARS") or 300),
+            sample_rate=float(os.getenv("LOG_BODY_SAMPLE_RATE") or 0.1),
+            redact=os.getenv("LOG_REDACT_PHI", "1").lower() not in ("0", "false", "no"),
+            scrubber=scrubber,
+        )
+
+    def sampled(self, key):
+        if self.sample_rate >= 1:
+            return True
+        if self.sample_rate <= 0:
+            return False
+        return zlib.crc32(key.encode("utf-8")) / 2**32 < self.sample_rate
+
+    def render(self, text):
+        text = text or ""
+        length = len(text)
+        cut = self.max_chars and length > self.max_chars
+        if cut:
+            # Scrub a little past the cut so a pattern straddling it is still recognized, then cut
+            text = text[:self.max_chars + 64]
+        if self.scrubber is not None:
+            text = self.scrubber.scrub(text).text
+        if cut:
+            text = text[:self.max_chars] + f"... [{length - self.max_chars} chars truncated]"
+        return text
+
+class LogPayload:
+    """
+    Raw bodies attached to a DEBUG record (as `extra["payload"]`) instead of formatted into it, so
+    the caller only pays for the record. The sink that writes the record renders them: the
+    background file sink does the truncation and PHI scrubbing on its writer thread.
+    """
+
+    def __init__(self, policy, parts):
+        self.policy = policy
+        self.parts = parts  # [(label, message content or text)]
+
+    def render(self):
+        return "\n".join(f"  {label}{self.policy.render(message_text(content))}" for label, content in self.parts)
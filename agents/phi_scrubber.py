@@ -0,0 +1,145 @@
+# agents/phi_scrubber.py
+
+import re
+from collections import Counter, namedtuple
+
+# Spans are (start, end, label) offsets into the original text
+ScrubResult = namedtuple("ScrubResult", ["text", "spans"])
+
+# High-confidence PHI patterns. They are joined into a single alternation so the text is scanned once;
+# order matters where patterns could overlap at the same position (SSN before PHONE, DATE before PHONE).
+PHI_PATTERNS = [
+    ("SSN", r"\b\d{3}-\d{2}-\d{4}\b"),
+    ("MRN", r"(?i:\b(?:MRN|medical record(?: number| no\.?)?|med rec)\s*[:#]?\s*[A-Z]{0,3}\d{5,10}\b)"),
+    ("EMAIL", r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"),
+    ("DATE", r"\b(?:\d{1,2}[/-]\d{1,2}[/-](?:\d{4}|\d{2})|\d{4}-\d{2}-\d{2}"
+             r"|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.? \d{1,2}(?:st|nd|rd|th)?,? \d{4})\b"),
+    ("PHONE", r"(?<!\d)(?:\+?1[-.\s]?)?(?:\(\d{3}\)\s?|\d{3}[-.\s])\d{3}[-.\s]\d{4}(?!\d)"),
+]
+
+PHI_REGEX = re.compile("|".join(f"(?P<{label}>{pattern})" for label, pattern in PHI_PATTERNS))
+# Every pattern above needs a digit or an "@", so text without either can skip the full scan
+PHI_TRIGGER = re.compile(r"[\d@]")
+
+def fold_case(text):
+    """
+    text.lower() without changing the length: "İ", whose lower case is two characters, folds to "i",
+    so offsets into the folded text are offsets into `text`.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char.lower()[0] for char in text)
+
+class AhoCorasick:
+    """Case-insensitive multi-term matcher that finds every dictionary term in a single pass."""
+
+    def __init__(self, terms):
+        # terms: mapping of term -> label
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for term, label in terms.items():
+            term = fold_case(term.strip())
+            if term:
+                self._add(term, label)
+        self._build()
+
+    def _add(self, term, label):
+        node = 0
+        for char in term:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            node = nxt
+        self.out[node] = self.out[node] + ((len(term), label),)
+
+    def _build(self):
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                # Fold the suffix outputs in so matching never has to walk fail links for output
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text):
+        """Yield (start, end, label) for whole-word matches in `text`."""
+        goto, fail, out = self.goto, self.fail, self.out
+        lowered = fold_case(text)
+        length = len(lowered)
+        node = 0
+        for index, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                end = index + 1
+                if end < length and lowered[end].isalnum():
+                    continue
+                for term_length, label in out[node]:
+                    start = end - term_length
+                    if start == 0 or not lowered[start - 1].isalnum():
+                        yield start, end, label
+
+class PHIScrubber:
+    """
+    Deterministic local PHI scrubber: replaces high-confidence patterns (SSN, MRN, email, dates,
+    phone numbers) and dictionary terms (known patient names, facilities) with typed placeholders
+    such as [SSN] or [NAME]. Runs at regex speed, so it can front SanitizeDataTool or replace it
+    entirely for bulk corpora.
+    """
+
+    def __init__(self, names=(), facilities=(), patterns=True):
+        terms = {name: "NAME" for name in names}
+        terms.update({facility: "FACILITY" for facility in facilities})
+        self.dictionary = AhoCorasick(terms) if terms else None
+        self.patterns = patterns
+
+    @classmethod
+    def from_files(cls, names_path=None, facilities_path=None, patterns=True):
+        """Build a scrubber from plain-text dictionaries with one term per line."""
+        def load(path):
+            if not path:
+                return []
+            with open(path, encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip()]
+        return cls(names=load(names_path), facilities=load(facilities_path), patterns=patterns)
+
+    def find(self, text):
+        spans = []
+        if self.patterns and PHI_TRIGGER.search(text):
+            spans.extend((m.start(), m.end(), m.lastgroup) for m in PHI_REGEX.finditer(text))
+        if self.dictionary is not None:
+            spans.extend(self.dictionary.finditer(text))
+        # Keep the longest span at each position and drop anything overlapping an earlier pick
+        spans.sort(key=lambda span: (span[0], span[0] - span[1]))
+        selected = []
+        last_end = 0
+        for start, end, label in spans:
+            if start >= last_end:
+                selected.append((start, end, label))
+                last_end = end
+        return selected
+
+    def scrub(self, text):
+        spans = self.find(text)
+        parts = []
+        position = 0
+        for start, end, label in spans:
+            parts.append(text[position:start])
+            parts.append(f"[{label}]")
+            position = end
+        parts.append(text[position:])
+        return ScrubResult("".join(parts), spans)
+
+def count_labels(spans):
+    return dict(Counter(label for _, _, label in spans))
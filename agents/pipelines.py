@@ -0,0 +1,64 @@
+# agents/pipelines.py
+
+from collections import namedtuple
+
+from .validation import parse_score
+
+# One agent call in a named pipeline: the agent's result is stored under `output`,
+# and `inputs` maps the agent's keyword arguments to keys of the item being processed
+# (either fields of the original input or outputs of earlier steps). Steps only depend on
+# the steps whose outputs they read, so independent steps can run concurrently.
+# When `skip_if(context)` is true the step is skipped (or cancelled if already running)
+# and its output is copied from the `fallback` key instead.
+PipelineStep = namedtuple("PipelineStep", ["output", "agent", "inputs", "skip_if", "fallback"], defaults=(None, None))
+
+def draft_is_excellent(context):
+    return parse_score(context.get("draft_validation")) == 5
+
+def refinement_skipped(context):
+    # The draft validation only stands in when the article to validate is the draft itself; a refinement
+    # that finished before the draft scored 5/5 still gets its own validation
+    return draft_is_excellent(context) and context.get("refined_article") == context.get("draft")
+
+PIPELINES = {
+    "summarize": [
+        PipelineStep("summary", "summarize", {"text": "text"}),
+        PipelineStep("validation", "summarize_validator", {"original_text": "text", "summary": "summary"}),
+    ],
+    "sanitize": [
+        PipelineStep("sanitized_data", "sanitize_data", {"medical_data": "text"}),
+        PipelineStep("validation", "sanitize_data_validator", {"original_data": "text", "sanitized_data": "sanitized_data"}),
+    ],
+    # The draft is validated while the refiner works on it; a 5/5 draft cancels refinement
+    # and its validation stands in for the final one.
+    "article": [
+        PipelineStep("draft", "write_article", {"topic": "topic", "outline": "outline"}),
+        PipelineStep("draft_validation", "write_article_validator", {"topic": "topic", "article": "draft"}),
+        PipelineStep("refined_article", "refiner", {"draft": "draft"},
+                     skip_if=draft_is_excellent, fallback="draft"),
+        PipelineStep("validation", "validator", {"topic": "topic", "article": "refined_article"},
+                     skip_if=refinement_skipped, fallback="draft_validation"),
+    ],
+}
+
+# Validator-driven refine loop for a pipeline (see pipeline.RefineLoop): while the `validation`
+# output scores below the threshold, RefinerAgent revises `output` from the validator's issues
+# (plus the `reference` input, if named) and the `validation` step is run again on the revision.
+# With `redact_phi`, PHI the validator reports is first replaced locally, without an LLM call.
+RefineSpec = namedtuple("RefineSpec", ["output", "validation", "kind", "reference", "redact_phi"], defaults=(None, False))
+
+REFINE_SPECS = {
+    "summarize": RefineSpec("summary", "validation", "summary of a medical text", reference="text"),
+    "sanitize": RefineSpec("sanitized_data", "validation", "sanitized medical record", redact_phi=True),
+    "article": RefineSpec("refined_article", "validation", "research article"),
+}
+
+def step_kwargs(step, context):
+    return {arg: context.get(key) for arg, key in step.inputs.items()}
+
+def reply_text(reply):
+    # Agents return an AgentResult; only its text is handed to the next step
+    return getattr(reply, "text", reply)
+
+def should_skip(step, context):
+    return step.skip_if is not None and step.skip_if(context)
@@ -0,0 +1,150 @@
+# agents/prompts.py
+
+from .validation import JSON_INSTRUCTIONS, PHI_JSON_INSTRUCTIONS
+
+class PromptTemplate:
+    """
+    A chat prompt split into a fixed prefix and a variable payload. The system message and the
+    instructions opening the user message are compiled once at import, so every call starts with
+    byte-identical text that provider-side prompt caching can reuse. The payload follows as
+    labelled sections in a fixed order, most stable first (the source text before the summary
+    being checked), so repeated calls on the same source share an even longer prefix.
+    """
+
+    def __init__(self, name, system, instructions, sections, suffix):
+        self.name = name
+        # Shared by every message list this template builds; never mutated
+        self.system_message = {"role": "system", "content": system}
+        self.prefix = instructions + "\n\n"
+        self.sections = sections  # [(field, header)], e.g. ("article", "Article:\n")
+        self.suffix = suffix
+
+    def build(self, **fields):
+        parts = [self.prefix]
+        for field, header in self.sections:
+            value = fields.get(field)
+            if value:
+                parts += (header, value, "\n\n")
+        parts.append(self.suffix)
+        return [self.system_message, {"role": "user", "content": "".join(parts)}]
+
+PROMPTS = {}
+
+def register(template):
+    PROMPTS[template.name] = template
+    return template
+
+def get_prompt(name):
+    template = PROMPTS.get(name)
+    if template is None:
+        raise ValueError(f"Prompt template '{name}' not found.")
+    return template
+
+SUMMARIZER = "You are an AI assistant that summarizes medical texts."
+SANITIZER = "You are an AI assistant that sanitizes medical data by removing Protected Health Information (PHI)."
+
+register(PromptTemplate(
+    "summarize", SUMMARIZER,
+    "Please provide a concise summary of the following medical text.",
+    [("text", "Text:\n")], "Summary:",
+))
+register(PromptTemplate(
+    "summarize.chunk", SUMMARIZER,
+    "Please provide a concise summary of the following section of a longer medical text. "
+    "Keep every diagnosis, medication, dose, result and follow-up instruction.",
+    [("chunk", "Section:\n")], "Summary:",
+))
+register(PromptTemplate(
+    "summarize.reduce", SUMMARIZER,
+    "The following are summaries of consecutive parts of one medical document. "
+    "Combine them into a single concise summary of the whole document.",
+    [("sections", "")], "Summary:",
+))
+register(PromptTemplate(
+    "summarize.update", SUMMARIZER,
+    "A medical text was summarized below. The text has since been edited as listed. "
+    "Update the summary to match the edited text, changing only what the edits affect.",
+    [("summary", "Summary:\n"), ("removed", "Removed from the text:\n"), ("added", "Added to the text:\n")],
+    "Updated Summary:",
+))
+register(PromptTemplate(
+    "summarize.batch", SUMMARIZER,
+    "Please provide a concise summary of each of the following medical texts. Each text is enclosed in "
+    "<item id=\"N\"> tags; summarize each one on its own, never mixing in details from another.\n"
+    "Respond with a JSON object only, with one entry per item in order:\n"
+    '{"items": [{"id": <item id>, "summary": "<summary of that text>"}]}',
+    [("items", "")], "JSON:",
+))
+register(PromptTemplate(
+    "write_article", "You are an expert academic writer.",
+    "Write a research article on the following topic, following the outline if one is given.",
+    [("topic", "Topic: "), ("outline", "Outline:\n")], "Article:\n",
+))
+register(PromptTemplate(
+    "sanitize_data", SANITIZER,
+    "Remove all PHI from the following data.",
+    [("medical_data", "Data:\n")], "Sanitized Data:",
+))
+register(PromptTemplate(
+    "sanitize_data.prescrubbed", SANITIZER,
+    "Remove all PHI from the following data. Bracketed placeholders such as [SSN] or [NAME] "
+    "have already been redacted; keep them as they are.",
+    [("medical_data", "Data:\n")], "Sanitized Data:",
+))
+register(PromptTemplate(
+    "summarize_validator", "You are an AI assistant that validates summaries of medical texts.",
+    "Given the original text and its summary, assess whether the summary accurately and concisely captures the key points of the original text.\n"
+    "Rate the summary on a scale of 1 to 5, where 5 indicates excellent quality, and list any omissions or inaccuracies.\n"
+    + JSON_INSTRUCTIONS,
+    [("original_text", "Original Text:\n"), ("summary", "Summary:\n")], "Validation:",
+))
+register(PromptTemplate(
+    "summarize_validator.digests", "You are an AI assistant that validates summaries of medical texts.",
+    "Given section-by-section digests of a long original text and a summary of the whole text, assess whether the summary accurately and concisely captures the key points of all sections.\n"
+    "Rate the summary on a scale of 1 to 5, where 5 indicates excellent quality, and list any omissions or inaccuracies.\n"
+    + JSON_INSTRUCTIONS,
+    [("digests", "Original Text Digests:\n"), ("summary", "Summary:\n")], "Validation:",
+))
+register(PromptTemplate(
+    "summarize_validator.batch", "You are an AI assistant that validates summaries of medical texts.",
+    "Each item below, enclosed in <item id=\"N\"> tags, holds an original text and its summary. For each item on its own, "
+    "assess whether the summary accurately and concisely captures the key points of the original text.\n"
+    "Rate each summary on a scale of 1 to 5, where 5 indicates excellent quality, and list any omissions or inaccuracies.\n"
+    "Respond with a JSON object only, with one entry per item in order:\n"
+    '{"items": [{"id": <item id>, "score": <1-5>, "issues": ["<one specific problem per entry>"]}]}',
+    [("items", "")], "JSON:",
+))
+register(PromptTemplate(
+    "write_article_validator", "You are an AI assistant that validates research articles.",
+    "Given the topic and the article, assess whether the article comprehensively covers the topic, follows a logical structure, and maintains academic standards.\n"
+    "Rate the article on a scale of 1 to 5, where 5 indicates excellent quality, and list what would improve it.\n"
+    + JSON_INSTRUCTIONS,
+    [("topic", "Topic: "), ("article", "Article:\n")], "Validation:",
+))
+register(PromptTemplate(
+    "validator", "You are an AI assistant that validates research articles for accuracy, completeness, and adherence to academic standards.",
+    "Given the topic and the research article below, assess whether the article comprehensively covers the topic, follows a logical structure, and maintains academic standards.\n"
+    "Rate the article on a scale of 1 to 5, where 5 indicates excellent quality, and list what would improve it.\n"
+    + JSON_INSTRUCTIONS,
+    [("topic", "Topic: "), ("article", "Article:\n")], "Validation:",
+))
+register(PromptTemplate(
+    "sanitize_data_validator", "You are an AI assistant that validates the sanitization of medical data by checking for the removal of Protected Health Information (PHI).",
+    "Given the original data and the sanitized data, verify that all PHI has been removed.\n"
+    "List any remaining PHI in the sanitized data and rate the sanitization process on a scale of 1 to 5, where 5 indicates complete sanitization.\n"
+    + PHI_JSON_INSTRUCTIONS,
+    [("original_data", "Original Data:\n"), ("sanitized_data", "Sanitized Data:\n")], "Validation:",
+))
+register(PromptTemplate(
+    "refiner", "You are an expert editor who refines and enhances research articles for clarity, coherence, and academic quality.",
+    "Please refine the following research article draft to improve its language, coherence, and overall quality.",
+    [("draft", "Draft:\n")], "Refined Article:",
+))
+register(PromptTemplate(
+    "refiner.revision", "You are an expert editor who revises texts to address review feedback.",
+    "Revise the text below to fix the issues a reviewer found, changing nothing else. If no issues are "
+    "listed, improve its accuracy and clarity. Use the source text, if one is given, only to check facts. "
+    "Reply with the revised text only, with no commentary.",
+    [("kind", "Kind of text: "), ("reference", "Source text:\n"), ("issues", "Issues:\n"), ("draft", "Text:\n")],
+    "Revised text:",
+))
@@ -1,39 +1,35 @@
 # agents/refiner_agent.py
 
 from .agent_base import AgentBase
+from .prompts import get_prompt
+
+REFINE = get_prompt("refiner")
+REVISE = get_prompt("refiner.revision")
 
 class RefinerAgent(AgentBase):
+    budget_field = "draft"
+    budget_strategy = "chunk"
+
     def __init__(self, max_retries=2, verbose=True):
         super().__init__(name="RefinerAgent", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, draft):
-        messages = [
-            {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "You are an expert editor who refines and enhances research articles for clarity, coherence, and academic quality."
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Please refine the following research article draft to improve its language, coherence, and overall quality:\n\n"
-                            f"{draft}\n\nRefined Article:"
-                        )
-                    }
-                ]
-            }
-        ]
-        refined_article = self.call_openai(
-            messages=messages,
-            temperature=0.5,
-            max_tokens=2048,
-            #response_format={"type": "text"}
+    def build_request(self, draft, issues=None, reference=None, kind="research article"):
+        if issues is not None or reference is not None or kind != "research article":
+            return self.build_revision_request(draft, issues or [], reference, kind)
+        params = {
+            "temperature": 0.5,
+            "max_tokens": 2048,
+            #"response_format": {"type": "text"}
+        }
+        return REFINE.build(draft=draft), params
+
+    def build_revision_request(self, draft, issues, reference, kind):
+        # Refine-loop pass: only the validator's issue list is fed back, not the earlier conversation.
+        # The kind of text goes in the payload so every refine loop shares one cached prefix.
+        messages = REVISE.build(
+            kind=kind,
+            reference=reference,
+            issues="".join(f"- {issue}\n" for issue in issues).rstrip("\n"),
+            draft=draft,
         )
-        return refined_article
+        return messages, {"temperature": 0.5, "max_tokens": 2048}
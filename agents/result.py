@@ -0,0 +1,57 @@
+# agents/result.py
+
+class AgentResult:
+    """
+    What every agent call returns: the reply `text` plus how it was produced: `model`, `usage`
+    ({"prompt_tokens", "completion_tokens"}), `latency` in seconds (retries included),
+    `finish_reason` ("stop", "length", ...), whether it came from the response `cached`, and
+    whether it was `coalesced`: shared from an identical call that was already in flight.
+    `near_duplicate` is set when the result was derived from an earlier, near-identical input:
+    {"mode": "reuse" or "diff", "similarity", "source"} for auditing.
+    str(result) is the text, so handing a result to the next agent sends only the text.
+    """
+
+    def __init__(self, text, model=None, usage=None, latency=None, finish_reason=None, cached=False,
+                 near_duplicate=None, coalesced=False):
+        self.text = text or ""
+        self.model = model
+        self.usage = usage or {"prompt_tokens": 0, "completion_tokens": 0}
+        self.latency = latency
+        self.finish_reason = finish_reason
+        self.cached = cached
+        self.near_duplicate = near_duplicate
+        self.coalesced = coalesced
+
+    @property
+    def content(self):
+        # Same attribute name as the OpenAI message object agents used to return
+        return self.text
+
+    @classmethod
+    def join(cls, results, latency=None):
+        """One result for a request that was split into several calls (chunked prompts); `latency` is their wall-clock time."""
+        if len(results) == 1:
+            return results[0]
+        return cls(
+            "\n\n".join(result.text for result in results),
+            model=results[0].model,
+            usage={key: sum(result.usage[key] for result in results) for key in ("prompt_tokens", "completion_tokens")},
+            latency=latency,
+            finish_reason=results[-1].finish_reason,
+            cached=all(result.cached for result in results),
+            coalesced=all(result.coalesced for result in results),
+        )
+
+    def as_dict(self):
+        return {
+            "text": self.text, "model": self.model, "usage": self.usage, "latency": self.latency,
+            "finish_reason": self.finish_reason, "cached": self.cached, "coalesced": self.coalesced,
+            "near_duplicate": self.near_duplicate,
+        }
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return (f"AgentResult(model={self.model!r}, chars={len(self.text)}, finish_reason={self.finish_reason!r}, "
+                f"usage={self.usage}, cached={self.cached})")
@@ -0,0 +1,47 @@
+# agents/routing.py
+
+from .validation import parse_score
+
+class ModelRoute:
+    """
+    How one agent picks its model. Prompts of up to `max_input_tokens` (None: any size) go to
+    `model`; larger ones go straight to `escalation_model`. With `escalate_below` set, a reply
+    from `model` whose 1-5 score is missing or below it is asked again of `escalation_model`,
+    so cheap validators only defer to the large model when they flag a problem or are unsure.
+    """
+
+    def __init__(self, model, escalation_model=None, max_input_tokens=None, escalate_below=None):
+        if escalate_below is not None and escalation_model is None:
+            raise ValueError("escalate_below needs an escalation_model to escalate to.")
+        self.model = model
+        self.escalation_model = escalation_model
+        self.max_input_tokens = max_input_tokens
+        self.escalate_below = escalate_below
+
+    def choose(self, prompt_tokens):
+        if self.max_input_tokens is not None and prompt_tokens > self.max_input_tokens and self.escalation_model:
+            return self.escalation_model
+        return self.model
+
+    def escalate(self, model, reply):
+        """Return the model to ask again, or None if `reply` from `model` stands."""
+        if self.escalate_below is None or model == self.escalation_model:
+            return None
+        score = parse_score(getattr(reply, "text", None))
+        if score is None or score < self.escalate_below:
+            return self.escalation_model
+        return None
+
+def default_model_routes(fast_model="gpt-4o-mini", strong_model="gpt-4", short_input_tokens=1500):
+    """
+    Validators run on `fast_model` and escalate scores under 4 (or no score) to `strong_model`;
+    the summarizer uses `fast_model` for short notes. Generation agents keep the strong model.
+    """
+    validator = ModelRoute(fast_model, strong_model, escalate_below=4)
+    return {
+        "summarize": ModelRoute(fast_model, strong_model, max_input_tokens=short_input_tokens),
+        "summarize_validator": validator,
+        "write_article_validator": validator,
+        "sanitize_data_validator": validator,
+        "validator": validator,
+    }
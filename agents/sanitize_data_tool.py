@@ -1,21 +1,52 @@
 # agents/sanitize_data_agent.py
 
+import difflib
+
 from .agent_base import AgentBase
+from .prompts import get_prompt
+
+SANITIZE = get_prompt("sanitize_data")
+SANITIZE_PRESCRUBBED = get_prompt("sanitize_data.prescrubbed")
 
 class SanitizeDataTool(AgentBase):
+    budget_field = "medical_data"
+    budget_strategy = "chunk"
+    near_duplicate_field = "medical_data"
+
     def __init__(self, max_retries=3, verbose=True):
         super().__init__(name="SanitizeDataTool", max_retries=max_retries, verbose=verbose)
+        self.scrubber = None  # optional PHIScrubber run locally before the LLM pass
+
+    def build_request(self, medical_data):
+        template = SANITIZE
+        if self.scrubber is not None:
+            medical_data = self.scrubber.scrub(medical_data).text
+            template = SANITIZE_PRESCRUBBED
+        return template.build(medical_data=medical_data), {"max_tokens": 500}
+
+    def plan_near_duplicate(self, call_kwargs, match):
+        # Never reuse the sanitization of a changed note outright: the change may be new PHI. Unchanged lines take
+        # their sanitized form from the earlier note and only changed lines are sent, which needs the
+        # earlier note and its sanitized form to line up one to one.
+        old, sanitized = match.text.splitlines(), match.result.splitlines()
+        if len(old) != len(sanitized):
+            return None
+        new = call_kwargs["medical_data"].splitlines()
+        pieces, requests = [], []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag == "equal":
+                pieces.append(sanitized[i1:i2])
+            elif j2 > j1:
+                pieces.append(len(requests))
+                requests.append(self.build_request("\n".join(new[j1:j2])))
+
+        if requests and not any(isinstance(piece, list) for piece in pieces):
+            return None  # nothing in common line by line
+
+        def assemble(texts):
+            lines = []
+            for piece in pieces:
+                lines += piece if isinstance(piece, list) else [texts[piece].strip()]
+            return "\n".join(lines)
 
-    def execute(self, medical_data):
-        messages = [
-            {"role": "system", "content": "You are an AI assistant that sanitizes medical data by removing Protected Health Information (PHI)."},
-            {
-                "role": "user",
-                "content": (
-                    "Remove all PHI from the following data:\n\n"
-                    f"{medical_data}\n\nSanitized Data:"
-                )
-            }
-        ]
-        sanitized_data = self.call_openai(messages, max_tokens=500)
-        return sanitized_data
+        return requests, assemble
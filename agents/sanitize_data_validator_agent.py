@@ -1,23 +1,37 @@
 # agents/sanitize_data_validator_agent.py
 
-from .agent_base import AgentBase
+from .chunking import split_aligned
+from .prompts import get_prompt
+from .validator_base import ValidatorBase
+from utils.tokens import count_tokens
+
+VALIDATE_SANITIZATION = get_prompt("sanitize_data_validator")
+
+class SanitizeDataValidatorAgent(ValidatorBase):
+    budget_field = "original_data"
+    budget_strategy = "chunk"
+    chunk_fields = ("original_data", "sanitized_data")
 
-class SanitizeDataValidatorAgent(AgentBase):
     def __init__(self, max_retries=2, verbose=True):
         super().__init__(name="SanitizeDataValidatorAgent", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, original_data, sanitized_data):
-        system_message = "You are an AI assistant that validates the sanitization of medical data by checking for the removal of Protected Health Information (PHI)."
-        user_content = (
-            "Given the original data and the sanitized data, verify that all PHI has been removed.\n"
-            "List any remaining PHI in the sanitized data and rate the sanitization process on a scale of 1 to 5, where 5 indicates complete sanitization.\n\n"
-            f"Original Data:\n{original_data}\n\n"
-            f"Sanitized Data:\n{sanitized_data}\n\n"
-            "Validation:"
-        )
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_content}
-        ]
-        validation = self.call_openai(messages, max_tokens=512)
-        return validation
+    def build_request(self, original_data, sanitized_data):
+        messages = VALIDATE_SANITIZATION.build(original_data=original_data, sanitized_data=sanitized_data)
+        return messages, self.validation_params(max_tokens=300)
+
+    def chunk_inputs(self, call_kwargs, allowed):
+        # Each request must compare a piece of the original with the same piece of the sanitized text,
+        # so both are split along the same line boundaries
+        pieces = split_aligned(call_kwargs["original_data"], str(call_kwargs["sanitized_data"] or ""), allowed,
+                               lambda text: count_tokens(text, self.model))
+        return [dict(call_kwargs, original_data=original, sanitized_data=sanitized) for original, sanitized in pieces]
+
+    def parse_result(self, reply, call_kwargs):
+        result = super().parse_result(reply, call_kwargs)
+        # Locate each reported PHI string in the sanitized text so callers can highlight or re-scrub it
+        sanitized = getattr(call_kwargs.get("sanitized_data"), "content", call_kwargs.get("sanitized_data")) or ""
+        for span in result.phi:
+            start = sanitized.find(span["text"])
+            if start != -1:
+                span["start"], span["end"] = start, start + len(span["text"])
+        return result
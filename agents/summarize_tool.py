@@ -1,21 +1,228 @@
 # agents/summarize_agent.py
 
+import asyncio
+import contextvars
+import difflib
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from .agent_base import AgentBase
+from .result import AgentResult
+from .chunking import SENTENCE_BREAK, split_into_chunks
+from .micro_batching import batch_reply_items, format_batch_items
+from .prompts import get_prompt
+from utils.tokens import TokenBudgetExceeded, count_message_tokens, count_tokens
+
+SUMMARIZE = get_prompt("summarize")
+SUMMARIZE_CHUNK = get_prompt("summarize.chunk")
+SUMMARIZE_REDUCE = get_prompt("summarize.reduce")
+SUMMARIZE_UPDATE = get_prompt("summarize.update")
+SUMMARIZE_BATCH = get_prompt("summarize.batch")
 
 class SummarizeTool(AgentBase):
+    budget_field = "text"
+    near_duplicate_field = "text"
+
+    # Texts longer than this are summarized map-reduce style instead of in one prompt
+    long_document_tokens = 3000
+    chunk_tokens = 1500
+    max_parallel_chunks = 8
+
     def __init__(self, max_retries=3, verbose=True):
         super().__init__(name="SummarizeTool", max_retries=max_retries, verbose=verbose)
+        # Recent chunk digests by document hash, so the validator can reuse them without new calls
+        self._digests = OrderedDict()
 
-    def execute(self, text):
-        messages = [
-            {"role": "system", "content": "You are an AI assistant that summarizes medical texts."},
-            {
-                "role": "user",
-                "content": (
-                    "Please provide a concise summary of the following medical text:\n\n"
-                    f"{text}\n\nSummary:"
-                )
-            }
+    def build_request(self, text):
+        return SUMMARIZE.build(text=text), {"max_tokens": 300}
+
+    def build_chunk_request(self, chunk):
+        # No chunk position in the prompt: an unchanged section must produce an identical (cacheable) request
+        return SUMMARIZE_CHUNK.build(chunk=chunk), {"max_tokens": 300}
+
+    def build_update_request(self, summary, removed, added):
+        # Near-duplicate of an already summarized note: send only the prior summary and what changed
+        messages = SUMMARIZE_UPDATE.build(
+            summary=summary,
+            removed="\n".join(f"- {passage}" for passage in removed),
+            added="\n".join(f"+ {passage}" for passage in added),
+        )
+        return messages, {"max_tokens": 300}
+
+    def build_batch_item(self, text):
+        return text
+
+    def build_batch_request(self, sections):
+        return SUMMARIZE_BATCH.build(items=format_batch_items(sections)), {"response_format": {"type": "json_object"}}
+
+    def split_batch_reply(self, text, count):
+        return [
+            item["summary"].strip() if item and isinstance(item.get("summary"), str) and item["summary"].strip() else None
+            for item in batch_reply_items(text, count)
         ]
-        summary = self.call_openai(messages, max_tokens=300)
-        return summary
+
+    def plan_near_duplicate(self, call_kwargs, match):
+        # The MinHash estimate can read 1.0 for a changed dose or value, so the prior summary is only
+        # reused when no sentence changed; anything else is sent as an update of that summary
+        old = [part for part in SENTENCE_BREAK.split(match.text) if part.strip()]
+        new = [part for part in SENTENCE_BREAK.split(call_kwargs["text"]) if part.strip()]
+        removed, added = [], []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag != "equal":
+                removed += old[i1:i2]
+                added += new[j1:j2]
+        if not removed and not added:
+            return [], lambda texts: match.result
+        if self.is_long(call_kwargs["text"]):
+            # A changed long document is summarized per section again; the response cache reuses unchanged ones
+            return None
+        return [self.build_update_request(match.result, removed, added)], lambda texts: texts[0]
+
+    def build_reduce_request(self, digests):
+        sections = "\n\n".join(f"[Part {index}]\n{digest}" for index, digest in enumerate(digests, start=1))
+        return SUMMARIZE_REDUCE.build(sections=sections), {"max_tokens": 300}
+
+    def is_long(self, text):
+        return count_tokens(text, self.model) > self.long_document_tokens
+
+    def _remember(self, text, digests):
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._digests[key] = digests
+        self._digests.move_to_end(key)
+        while len(self._digests) > 128:
+            self._digests.popitem(last=False)
+
+    def _recall(self, text):
+        return self._digests.get(hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    def _fit(self, requests):
+        # The per-call prompt budget applies to every map and reduce call as it does to a single prompt
+        for messages, params in requests:
+            tokens = count_message_tokens(messages, self.model)
+            if tokens > self.prompt_budget(params):
+                raise TokenBudgetExceeded(f"[{self.name}] Prompt is {tokens} tokens; the budget is {self.prompt_budget(params)}.")
+        return requests
+
+    def _section_tokens(self, build_request, empty):
+        # Room left for the text of one map or reduce prompt: chunk_tokens, capped by the prompt budget
+        messages, params = build_request(empty)
+        return min(self.chunk_tokens, self.prompt_budget(params) - count_message_tokens(messages, self.model))
+
+    def _call_all(self, requests):
+        with ThreadPoolExecutor(max_workers=self.max_parallel_chunks) as pool:
+            # Each call runs in a copy of the caller's context so pipeline token accounting follows it
+            futures = [
+                pool.submit(contextvars.copy_context().run, self.call_openai, messages, **params)
+                for messages, params in self._fit(requests)
+            ]
+            return [future.result() for future in futures]
+
+    async def _acall_all(self, requests):
+        semaphore = asyncio.Semaphore(self.max_parallel_chunks)
+
+        async def call(request):
+            async with semaphore:
+                return await self.acall_openai(request[0], **request[1])
+
+        return list(await asyncio.gather(*(call(request) for request in self._fit(requests))))
+
+    def _reduce_groups(self, digests):
+        # Group digests so every intermediate reduce prompt stays within one chunk budget;
+        # groups hold at least two digests so each round is guaranteed to shrink the list
+        budget = self._section_tokens(self.build_reduce_request, [])
+        groups, current, current_tokens = [], [], 0
+        for digest in digests:
+            tokens = count_tokens(digest, self.model)
+            if len(current) >= 2 and current_tokens + tokens > budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(digest)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _chunk_requests(self, text):
+        budget = self._section_tokens(self.build_chunk_request, "")
+        if budget <= 0:
+            raise TokenBudgetExceeded(f"[{self.name}] The prompt budget leaves no room for a document chunk.")
+        return [self.build_chunk_request(chunk) for chunk in split_into_chunks(text, budget)]
+
+    def _map(self, text):
+        """(digests, replies): replies is empty when the digests were remembered from an earlier call."""
+        digests = self._recall(text)
+        if digests is not None:
+            return digests, []
+        replies = self._call_all(self._chunk_requests(text))
+        digests = [reply.text for reply in replies]
+        self._remember(text, digests)
+        return digests, replies
+
+    async def _amap(self, text):
+        digests = self._recall(text)
+        if digests is not None:
+            return digests, []
+        replies = await self._acall_all(self._chunk_requests(text))
+        digests = [reply.text for reply in replies]
+        self._remember(text, digests)
+        return digests, replies
+
+    def chunk_digests(self, text):
+        return self._map(text)[0]
+
+    async def achunk_digests(self, text):
+        return (await self._amap(text))[0]
+
+    def _map_reduce_result(self, call_kwargs, replies, started):
+        # The final reduce call's text, charged with every map and reduce call that led to it
+        final = replies[-1]
+        result = AgentResult(
+            final.text,
+            model=final.model,
+            usage={key: sum(reply.usage[key] for reply in replies) for key in ("prompt_tokens", "completion_tokens")},
+            latency=time.perf_counter() - started,
+            finish_reason=final.finish_reason,
+            cached=all(reply.cached for reply in replies),
+        )
+        self._remember_near_duplicate(call_kwargs, result)
+        return result
+
+    def execute(self, text):
+        if not self.is_long(text):
+            return super().execute(text)
+        with self._span("execute", mode="map_reduce"):
+            started = time.perf_counter()
+            call_kwargs = {"text": text}
+            near_duplicate = self._near_duplicate_plan(call_kwargs)
+            if near_duplicate is not None:
+                return self._near_duplicate_result(call_kwargs, *near_duplicate, [], started)
+            digests, replies = self._map(text)
+            groups = self._reduce_groups(digests)
+            while len(groups) > 1:
+                reduced = self._call_all([self.build_reduce_request(group) for group in groups])
+                replies += reduced
+                groups = self._reduce_groups([reply.text for reply in reduced])
+            [(messages, params)] = self._fit([self.build_reduce_request(groups[0])])
+            replies.append(self.call_openai(messages, **params))
+            return self._map_reduce_result(call_kwargs, replies, started)
+
+    async def aexecute(self, text):
+        if not self.is_long(text):
+            return await super().aexecute(text)
+        with self._span("execute", mode="map_reduce"):
+            started = time.perf_counter()
+            call_kwargs = {"text": text}
+            near_duplicate = self._near_duplicate_plan(call_kwargs)
+            if near_duplicate is not None:
+                return self._near_duplicate_result(call_kwargs, *near_duplicate, [], started)
+            digests, replies = await self._amap(text)
+            groups = self._reduce_groups(digests)
+            while len(groups) > 1:
+                reduced = await self._acall_all([self.build_reduce_request(group) for group in groups])
+                replies += reduced
+                groups = self._reduce_groups([reply.text for reply in reduced])
+            [(messages, params)] = self._fit([self.build_reduce_request(groups[0])])
+            replies.append(await self.acall_openai(messages, **params))
+            return self._map_reduce_result(call_kwargs, replies, started)
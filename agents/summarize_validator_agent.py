@@ -1,23 +1,42 @@
 # agents/summarize_validator_agent.py
 
-from .agent_base import AgentBase
+from .micro_batching import format_batch_items
+from .prompts import get_prompt
+from .validator_base import ValidatorBase
+
+VALIDATE_SUMMARY = get_prompt("summarize_validator")
+VALIDATE_SUMMARY_DIGESTS = get_prompt("summarize_validator.digests")
+VALIDATE_SUMMARY_BATCH = get_prompt("summarize_validator.batch")
+
+class SummarizeValidatorAgent(ValidatorBase):
+    budget_field = "original_text"
+    budget_strategy = "digest"
 
-class SummarizeValidatorAgent(AgentBase):
     def __init__(self, max_retries=2, verbose=True):
         super().__init__(name="SummarizeValidatorAgent", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, original_text, summary):
-        system_message = "You are an AI assistant that validates summaries of medical texts."
-        user_content = (
-            "Given the original text and its summary, assess whether the summary accurately and concisely captures the key points of the original text.\n"
-            "Provide a brief analysis and rate the summary on a scale of 1 to 5, where 5 indicates excellent quality.\n\n"
-            f"Original Text:\n{original_text}\n\n"
-            f"Summary:\n{summary}\n\n"
-            "Validation:"
-        )
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_content}
-        ]
-        validation = self.call_openai(messages, max_tokens=512)
-        return validation
+    def build_request(self, original_text, summary, digests=None):
+        if digests:
+            # Long-document mode: the original is represented by its section digests
+            sections = "\n\n".join(f"[Part {index}]\n{digest}" for index, digest in enumerate(digests, start=1))
+            messages = VALIDATE_SUMMARY_DIGESTS.build(digests=sections, summary=summary)
+        else:
+            messages = VALIDATE_SUMMARY.build(original_text=original_text, summary=summary)
+        return messages, self.validation_params(max_tokens=200)
+
+    def build_batch_item(self, original_text, summary, digests=None):
+        if digests:
+            return None
+        return f"Original Text:\n{original_text}\n\nSummary:\n{summary}"
+
+    def build_batch_request(self, sections):
+        return VALIDATE_SUMMARY_BATCH.build(items=format_batch_items(sections)), self.validation_params(max_tokens=200)
+
+    def _needs_digest(self, call_kwargs):
+        # Long originals are always validated against the summarizer's chunk digests, matching its map-reduce mode
+        if call_kwargs.get("digests") or self.digest_source is None:
+            return False
+        return self.digest_source.is_long(call_kwargs["original_text"]) or super()._needs_digest(call_kwargs)
+
+    def _apply_digests(self, call_kwargs, digests):
+        call_kwargs["digests"] = digests
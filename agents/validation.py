@@ -0,0 +1,117 @@
+# agents/validation.py
+
+import json
+import re
+
+# "4/5", "4 / 5", "4 out of 5", "Rating: 4", "Score - 4.5"
+SCORE_PATTERNS = [
+    re.compile(r"\b([1-5](?:\.\d+)?)\s*(?:/|out of)\s*5\b", re.IGNORECASE),
+    re.compile(r"\b(?:rating|score|rated|rate)\b[^0-9\n]{0,20}([1-5](?:\.\d+)?)\b", re.IGNORECASE),
+]
+BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+?)\s*$", re.MULTILINE)
+
+# Appended to every validator prompt; JSON mode (where the model has it) guarantees the object parses
+JSON_INSTRUCTIONS = (
+    'Respond with a JSON object only, no other text: {"score": <integer 1-5>, '
+    '"issues": [<one short sentence per problem found, empty if none>]}'
+)
+PHI_JSON_INSTRUCTIONS = (
+    'Respond with a JSON object only, no other text: {"score": <integer 1-5>, '
+    '"issues": [<one short sentence per problem found, empty if none>], '
+    '"phi": [{"text": <PHI exactly as it appears in the sanitized data>, "type": <e.g. NAME, DATE, PHONE>}]}'
+)
+
+class ValidationResult:
+    """A validator's verdict: 1-5 `score` (None if it gave none), `issues`, and `phi` still present
+    in sanitized data as {"text", "type"} dicts, with "start"/"end" offsets once located."""
+
+    def __init__(self, score=None, issues=None, phi=None, analysis=""):
+        self.score = score
+        self.issues = issues or []
+        self.phi = phi or []
+        self.analysis = analysis
+
+    def as_dict(self):
+        return {"score": self.score, "issues": self.issues, "phi": self.phi, "analysis": self.analysis}
+
+    def format(self):
+        lines = [f"Score: {self.score:g}/5" if self.score is not None else "Score: not given"]
+        if self.issues:
+            lines += ["", "Issues:"] + [f"- {issue}" for issue in self.issues]
+        if self.phi:
+            lines += ["", "Remaining PHI:"] + [f"- {span['text']} ({span.get('type') or 'PHI'})" for span in self.phi]
+        if self.analysis:
+            lines += ["", self.analysis]
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"ValidationResult(score={self.score}, issues={len(self.issues)}, phi={len(self.phi)})"
+
+def _coerce_score(value):
+    # Models write 4, 4.0, "4" or "4/5"; anything outside 1-5 counts as no score
+    if isinstance(value, str):
+        match = re.search(r"\d+(?:\.\d+)?", value)
+        value = match.group(0) if match else None
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    return score if 1 <= score <= 5 else None
+
+def _json_objects(text):
+    """Every top-level JSON object in `text`: tolerates code fences, prose around it, and several
+    objects in a row (a chunked validation joins one reply per chunk)."""
+    decoder = json.JSONDecoder()
+    objects = []
+    index = text.find("{")
+    while index != -1:
+        try:
+            value, end = decoder.raw_decode(text, index)
+        except ValueError:
+            index = text.find("{", index + 1)
+            continue
+        if isinstance(value, dict):
+            objects.append(value)
+        index = text.find("{", end)
+    return objects
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _phi_span(value):
+    if isinstance(value, dict):
+        text = value.get("text") or value.get("value") or ""
+        return {"text": str(text), "type": value.get("type")} if text else None
+    return {"text": str(value), "type": None} if value else None
+
+def parse_validation(text):
+    """Parse a validator reply into a ValidationResult, from JSON where present, else from free text."""
+    if not text:
+        return ValidationResult()
+    objects = [obj for obj in _json_objects(text) if "score" in obj or "issues" in obj]
+    if objects:
+        # Several objects (one per chunk): the weakest chunk sets the score, issues and PHI add up
+        scores = [score for score in (_coerce_score(obj.get("score")) for obj in objects) if score is not None]
+        issues = [str(issue) for obj in objects for issue in _as_list(obj.get("issues")) if issue]
+        phi = [span for obj in objects for span in map(_phi_span, _as_list(obj.get("phi"))) if span]
+        analysis = " ".join(str(obj["analysis"]) for obj in objects if obj.get("analysis"))
+        return ValidationResult(min(scores) if scores else None, issues, phi, analysis)
+    return ValidationResult(parse_score(text), BULLET.findall(text), analysis=text.strip())
+
+def parse_score(text):
+    """Pull the 1-5 rating out of a validator's answer, JSON or free text; None if there is none."""
+    if not text:
+        return None
+    if "{" in text:
+        scores = [score for score in (_coerce_score(obj.get("score")) for obj in _json_objects(text) if "score" in obj)
+                  if score is not None]
+        if scores:
+            return min(scores)
+    for pattern in SCORE_PATTERNS:
+        matches = pattern.findall(text)
+        if matches:
+            # Validators state their final rating last
+            return float(matches[-1])
+    return None
@@ -1,45 +1,17 @@
 # agents/validator_agent.py
 
-from .agent_base import AgentBase
+from .prompts import get_prompt
+from .validator_base import ValidatorBase
+
+VALIDATE = get_prompt("validator")
+
+class ValidatorAgent(ValidatorBase):
+    budget_field = "article"
 
-class ValidatorAgent(AgentBase):
     def __init__(self, max_retries=2, verbose=True):
         super().__init__(name="ValidatorAgent", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, topic, article):
-        messages = [
-            {
-                "role": "system",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "You are an AI assistant that validates research articles for accuracy, completeness, and adherence to academic standards."
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Given the topic and the research article below, assess whether the article comprehensively covers the topic, follows a logical structure, and maintains academic standards.\n"
-                            "Provide a brief analysis and rate the article on a scale of 1 to 5, where 5 indicates excellent quality.\n\n"
-                            f"Topic: {topic}\n\n"
-                            f"Article:\n{article}\n\n"
-                            "Validation:"
-                        )
-                    }
-                ]
-            }
-        ]
-        validation = self.call_openai(
-            messages=messages,
-            temperature=0.3,         # Lower temperature for more deterministic output
-            max_tokens=500,
-            # top_p=1,
-            # frequency_penalty=0,
-            # presence_penalty=0,
-            # response_format={"type": "text"}
-        )
-        return validation
+    def build_request(self, topic, article):
+        # Lower temperature for more deterministic output; a JSON verdict needs far fewer tokens than prose
+        return VALIDATE.build(topic=topic, article=article), self.validation_params(max_tokens=200, temperature=0.3)
+
@@ -0,0 +1,34 @@
+# agents/validator_base.py
+
+import json
+
+from .agent_base import AgentBase
+from .micro_batching import batch_reply_items
+from .validation import parse_validation
+
+class ValidatorBase(AgentBase):
+    """
+    Validators answer with a JSON verdict ({"score", "issues"} and, for sanitization, "phi").
+    execute() still returns the raw reply for pipelines; validate() returns a ValidationResult.
+    """
+
+    def validation_params(self, max_tokens, temperature=0.3):
+        # Dropped by AgentBase for models without JSON mode; the tolerant parser covers their replies
+        return {"temperature": temperature, "max_tokens": max_tokens, "response_format": {"type": "json_object"}}
+
+    def parse_result(self, reply, call_kwargs):
+        return parse_validation(getattr(reply, "text", reply))
+
+    def validate(self, *args, **kwargs):
+        return self.parse_result(self.execute(*args, **kwargs), self._bind(args, kwargs))
+
+    async def avalidate(self, *args, **kwargs):
+        return self.parse_result(await self.aexecute(*args, **kwargs), self._bind(args, kwargs))
+
+    def split_batch_reply(self, text, count):
+        # Each item's verdict becomes the JSON the validator would have replied for it alone
+        texts = []
+        for item in batch_reply_items(text, count):
+            verdict = json.dumps(item, ensure_ascii=False) if item else None
+            texts.append(verdict if verdict and parse_validation(verdict).score is not None else None)
+        return texts
@@ -1,20 +1,15 @@
 # agents/write_article_agent.py
 
 from .agent_base import AgentBase
+from .prompts import get_prompt
+
+WRITE_ARTICLE = get_prompt("write_article")
 
 class WriteArticleTool(AgentBase):
+    budget_field = "outline"
+
     def __init__(self, max_retries=3, verbose=True):
         super().__init__(name="WriteArticleTool", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, topic, outline=None):
-        system_message = "You are an expert academic writer."
-        user_content = f"Write a research article on the following topic:\nTopic: {topic}\n\n"
-        if outline:
-            user_content += f"Outline:\n{outline}\n\n"
-        user_content += "Article:\n"
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_content}
-        ]
-        article = self.call_openai(messages, max_tokens=1000)
-        return article
+    def build_request(self, topic, outline=None):
+        return WRITE_ARTICLE.build(topic=topic, outline=outline), {"max_tokens": 1000}
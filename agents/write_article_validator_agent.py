@@ -1,23 +1,16 @@
 # agents/write_article_validator_agent.py
 
-from .agent_base import AgentBase
+from .prompts import get_prompt
+from .validator_base import ValidatorBase
+
+VALIDATE_ARTICLE = get_prompt("write_article_validator")
+
+class WriteArticleValidatorAgent(ValidatorBase):
+    budget_field = "article"
 
-class WriteArticleValidatorAgent(AgentBase):
     def __init__(self, max_retries=2, verbose=True):
         super().__init__(name="WriteArticleValidatorAgent", max_retries=max_retries, verbose=verbose)
 
-    def execute(self, topic, article):
-        system_message = "You are an AI assistant that validates research articles."
-        user_content = (
-            "Given the topic and the article, assess whether the article comprehensively covers the topic, follows a logical structure, and maintains academic standards.\n"
-            "Provide a brief analysis and rate the article on a scale of 1 to 5, where 5 indicates excellent quality.\n\n"
-            f"Topic: {topic}\n\n"
-            f"Article:\n{article}\n\n"
-            "Validation:"
-        )
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_content}
-        ]
-        validation = self.call_openai(messages, max_tokens=512)
-        return validation
+    def build_request(self, topic, article):
+        return VALIDATE_ARTICLE.build(topic=topic, article=article), self.validation_params(max_tokens=200)
+
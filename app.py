@@ -1,41 +1,104 @@
 # app.py
 
 import streamlit as st
-from agents import AgentManager
+import pandas as pd
+from agents import AgentManager, MockBackend, PHIScrubber, default_model_routes, parse_score, parse_validation
+from pipeline import Workflow
 from utils.logger import logger
+from utils.at_rest import AtRestPolicy, cipher_from_env
+from utils.cache import ResponseCache
+from utils.near_duplicate import NearDuplicateCache
+from utils.run_store import RunStore, step_fingerprint
+from utils.tracing import JSONLSpanSink, Tracer, maybe_span
 import os
 from dotenv import load_dotenv
-import json
 import re
 
 # Load environment variables from .env if present
 load_dotenv()
 
-def extract_content(response):
-    """
-    Extract clean content from agent response, handling various formats
-    """
-    if isinstance(response, str):
-        # Try to parse as JSON if it looks like JSON
-        if response.strip().startswith('{') and response.strip().endswith('}'):
-            try:
-                parsed = json.loads(response)
-                if 'content' in parsed:
-                    return parsed['content']
-                else:
-                    return response
-            except json.JSONDecodeError:
-                return response
-        else:
-            return response
-    elif isinstance(response, dict):
-        # If it's already a dict, extract content
-        if 'content' in response:
-            return response['content']
-        else:
-            return str(response)
-    else:
-        return str(response)
+@st.cache_resource
+def get_response_cache():
+    # Opt-in: set ENABLE_RESPONSE_CACHE=1 (and optionally RESPONSE_CACHE_PATH for the disk tier,
+    # whose replies STORE_ENCRYPTION_KEY encrypts). Cached as a resource so the LRU tier survives Streamlit reruns.
+    if os.getenv("ENABLE_RESPONSE_CACHE", "").lower() not in ("1", "true", "yes"):
+        return None
+    return ResponseCache(disk_path=os.getenv("RESPONSE_CACHE_PATH"), at_rest=AtRestPolicy(cipher=cipher_from_env()))
+
+@st.cache_resource
+def get_tracer():
+    # Opt-in: set TRACE_PATH to append one trace per pipeline run to that JSONL file
+    # (inspect it with `python -m utils.tracing TRACE_PATH --last`)
+    trace_path = os.getenv("TRACE_PATH")
+    return Tracer(JSONLSpanSink(trace_path)) if trace_path else None
+
+@st.cache_resource
+def get_run_store():
+    # Opt-in: set RUN_STORE_PATH (e.g. run_store.db) to record article runs in that SQLite file,
+    # so a rerun only re-executes the steps whose inputs changed. Topics are kept PHI-scrubbed and
+    # STORE_ENCRYPTION_KEY encrypts the stored outputs.
+    path = os.getenv("RUN_STORE_PATH")
+    return RunStore(path, at_rest=AtRestPolicy(scrubber=PHIScrubber(), cipher=cipher_from_env())) if path else None
+
+@st.cache_resource
+def get_agent_manager():
+    # Built once per server process: agents and their pooled HTTP client survive reruns and sessions
+    # LLM_BACKEND=mock swaps the OpenAI API for the deterministic local mock (demos, UI work offline)
+    backend = MockBackend() if os.getenv("LLM_BACKEND", "").lower() == "mock" else None
+    # FAST_MODEL routes validators and short notes to a cheaper model, escalating to gpt-4 when unsure
+    fast_model = os.getenv("FAST_MODEL")
+    model_routes = default_model_routes(fast_model=fast_model) if fast_model else None
+    # NEAR_DUPLICATE_THRESHOLD (e.g. 0.8) reuses or diffs against earlier near-identical notes
+    threshold = os.getenv("NEAR_DUPLICATE_THRESHOLD")
+    near_duplicates = NearDuplicateCache(threshold=float(threshold)) if threshold else None
+    return AgentManager(max_retries=2, verbose=True, cache=get_response_cache(), tracer=get_tracer(), backend=backend,
+                        model_routes=model_routes, near_duplicates=near_duplicates, run_store=get_run_store())
+
+def live_panel(func):
+    # Refresh on a timer where this Streamlit version supports fragments; otherwise render once per run
+    fragment = getattr(st, "fragment", None)
+    return fragment(run_every=5)(func) if fragment else func
+
+@live_panel
+def metrics_panel():
+    metrics = get_agent_manager().metrics
+    snapshot = metrics.snapshot()
+    st.markdown("### 📈 Agent Metrics")
+    if not snapshot:
+        st.caption("No agent calls yet.")
+        return
+    rows = []
+    for agent_name, agent_metrics in snapshot.items():
+        latency = agent_metrics["latency_seconds"]
+        ttft = agent_metrics["ttft_seconds"]
+        requests = agent_metrics["requests"]
+        rows.append({
+            "agent": agent_name,
+            "calls": requests.get("ok", 0),
+            "cached": requests.get("cached", 0),
+            "coalesced": requests.get("coalesced", 0),
+            "failed": requests.get("error", 0),
+            "retries": agent_metrics["retries"],
+            "models": ", ".join(f"{model} ×{count}" for model, count in agent_metrics["models"].items()),
+            "escalated": agent_metrics["escalations"],
+            "p50 s": latency["p50"],
+            "p95 s": latency["p95"],
+            "TTFT p50 s": ttft["p50"],
+            "prompt tok": agent_metrics["prompt_tokens"],
+            "completion tok": agent_metrics["completion_tokens"],
+            "prefix hit rate": agent_metrics["prefix_cache"]["hit_rate"],
+            "cached prompt tok": agent_metrics["prefix_cache"]["cached_tokens"],
+        })
+    st.dataframe(pd.DataFrame(rows).set_index("agent"), use_container_width=True)
+    errors = {f"{agent_name} {kind}": count for agent_name, agent_metrics in snapshot.items()
+              for kind, count in agent_metrics["errors"].items()}
+    if errors:
+        st.caption("Errors: " + ", ".join(f"{kind} ×{count}" for kind, count in errors.items()))
+    col_prom, col_json = st.columns(2)
+    with col_prom:
+        st.download_button("Prometheus", metrics.to_prometheus(), file_name="agent_metrics.prom")
+    with col_json:
+        st.download_button("JSON", metrics.to_json(), file_name="agent_metrics.json")
 
 def main():
     st.set_page_config(
@@ -217,7 +280,7 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
-    agent_manager = AgentManager(max_retries=2, verbose=True)
+    agent_manager = get_agent_manager()
 
     if "📄 Summarize Medical Text" in task:
         summarize_section(agent_manager)
@@ -226,6 +289,11 @@ def main():
     elif "🔒 Sanitize Medical Data (PHI)" in task:
         sanitize_data_section(agent_manager)
 
+    # Rendered after the task so the panel includes the calls this run just made
+    with st.sidebar:
+        st.markdown("---")
+        metrics_panel()
+
 def summarize_section(agent_manager):
     st.markdown("""
     <div class="task-card">
@@ -271,66 +339,64 @@ def summarize_section(agent_manager):
             main_agent = agent_manager.get_agent("summarize")
             validator_agent = agent_manager.get_agent("summarize_validator")
             
-            # Progress tracking
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            # One trace per pipeline run (when TRACE_PATH is set); agent spans nest under it
+            with maybe_span(agent_manager.tracer, "pipeline.summarize", **{"pipeline.name": "summarize"}):
+                # Progress tracking
+                progress_bar = st.progress(0)
+                status_text = st.empty()
             
-            with st.spinner("🔍 Analyzing and summarizing your text..."):
-                progress_bar.progress(30)
-                status_text.text("Processing with AI summarization agent...")
-                try:
-                    summary = main_agent.execute(text)
-                    progress_bar.progress(70)
+                with st.spinner("🔍 Analyzing and summarizing your text..."):
+                    progress_bar.progress(30)
+                    status_text.text("Processing with AI summarization agent...")
+                    try:
+                        summary = main_agent.execute(text)
+                        progress_bar.progress(70)
                     
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #667eea; margin-top: 0;">📋 Generated Summary</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+                        st.markdown("""
+                        <div class="result-section">
+                            <h3 style="color: #667eea; margin-top: 0;">📋 Generated Summary</h3>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    # Extract content if it's in JSON format
-                    display_content = extract_content(summary)
-                    st.text_area(
-                        "Summary Result:",
-                        value=display_content,
-                        height=300,
-                        help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
-                        key="summary_result"
-                    )
+                        st.text_area(
+                            "Summary Result:",
+                            value=summary.text,
+                            height=300,
+                            help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
+                            key="summary_result"
+                        )
                     
-                except Exception as e:
-                    st.error(f"❌ Error during summarization: {e}")
-                    logger.error(f"SummarizeAgent Error: {e}")
-                    return
+                    except Exception as e:
+                        st.error(f"❌ Error during summarization: {e}")
+                        logger.error(f"SummarizeAgent Error: {e}")
+                        return
 
-            with st.spinner("✅ Validating summary quality..."):
-                progress_bar.progress(90)
-                status_text.text("Running validation checks...")
-                try:
-                    validation = validator_agent.execute(original_text=text, summary=summary)
-                    progress_bar.progress(100)
-                    status_text.text("✅ Process completed successfully!")
+                with st.spinner("✅ Validating summary quality..."):
+                    progress_bar.progress(90)
+                    status_text.text("Running validation checks...")
+                    try:
+                        validation = validator_agent.validate(original_text=text, summary=summary)
+                        progress_bar.progress(100)
+                        status_text.text("✅ Process completed successfully!")
                     
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #11998e; margin-top: 0;">🔍 Quality Validation</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+                        st.markdown("""
+                        <div class="result-section">
+                            <h3 style="color: #11998e; margin-top: 0;">🔍 Quality Validation</h3>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    # Extract content if it's in JSON format
-                    display_validation = extract_content(validation)
-                    st.text_area(
-                        "Validation Result:",
-                        value=display_validation,
-                        height=200,
-                        help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
-                        key="summary_validation"
-                    )
+                        st.text_area(
+                            "Validation Result:",
+                            value=validation.format(),
+                            height=200,
+                            help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
+                            key="summary_validation"
+                        )
                     
-                    st.balloons()
-                except Exception as e:
-                    st.error(f"❌ Validation Error: {e}")
-                    logger.error(f"SummarizeValidatorAgent Error: {e}")
+                        st.balloons()
+                    except Exception as e:
+                        st.error(f"❌ Validation Error: {e}")
+                        logger.error(f"SummarizeValidatorAgent Error: {e}")
         else:
             st.markdown("""
             <div class="warning-box">
@@ -370,6 +436,10 @@ def write_and_refine_article_section(agent_manager):
             <span style="margin-right: 10px;">✏️</span>
             <span>Draft Creation</span>
         </div>
+        <div class="step-indicator">
+            <span style="margin-right: 10px;">🔍</span>
+            <span>Draft Check (in parallel)</span>
+        </div>
         <div class="step-indicator">
             <span style="margin-right: 10px;">🔧</span>
             <span>Content Refinement</span>
@@ -383,100 +453,114 @@ def write_and_refine_article_section(agent_manager):
     col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 1])
     with col_btn2:
         write_btn = st.button("📝 Create Article", use_container_width=True)
-    
-    if write_btn:
+    revalidate_btn = False
+    if agent_manager.run_store is not None:
+        with col_btn3:
+            revalidate_btn = st.button("🔁 Re-validate", use_container_width=True,
+                                       help="Validate the stored article for this topic and outline again without rewriting it.")
+
+    if revalidate_btn and topic and not has_stored_draft(agent_manager, topic, outline):
+        st.markdown("""
+        <div class="warning-box">
+            <strong>⚠️ Nothing to Re-validate</strong><br>
+            No article has been created for this topic and outline yet. Create it first.
+        </div>
+        """, unsafe_allow_html=True)
+    elif write_btn or revalidate_btn:
         if topic:
-            writer_agent = agent_manager.get_agent("write_article")
-            refiner_agent = agent_manager.get_agent("refiner")
-            validator_agent = agent_manager.get_agent("validator")
-            
             progress_bar = st.progress(0)
             status_text = st.empty()
-            
-            with st.spinner("✏️ Creating initial draft..."):
-                progress_bar.progress(25)
-                status_text.text("AI writer is crafting your article...")
-                try:
-                    draft = writer_agent.execute(topic, outline)
-                    progress_bar.progress(50)
-                    
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #667eea; margin-top: 0;">📝 Initial Draft</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Extract content if it's in JSON format
-                    display_draft = extract_content(draft)
-                    st.text_area(
+            status_text.text("AI writer is crafting your article...")
+
+            st.markdown("""
+            <div class="result-section">
+                <h3 style="color: #667eea; margin-top: 0;">📝 Initial Draft</h3>
+            </div>
+            """, unsafe_allow_html=True)
+            draft_placeholder = st.empty()
+            draft_score_placeholder = st.empty()
+
+            st.markdown("""
+            <div class="result-section">
+                <h3 style="color: #f093fb; margin-top: 0;">🔧 Refined Article</h3>
+            </div>
+            """, unsafe_allow_html=True)
+            refined_placeholder = st.empty()
+
+            st.markdown("""
+            <div class="result-section">
+                <h3 style="color: #11998e; margin-top: 0;">✅ Quality Assessment</h3>
+            </div>
+            """, unsafe_allow_html=True)
+            validation_placeholder = st.empty()
+
+            # The draft is validated while the refiner works on it; a 5/5 draft skips refinement
+            streamed = {"draft": "", "refined_article": ""}
+            streamed_placeholders = {"draft": draft_placeholder, "refined_article": refined_placeholder}
+            finished = set()
+
+            def on_event(kind, output, payload):
+                if kind == "delta":
+                    streamed[output] += payload
+                    streamed_placeholders[output].markdown(streamed[output] + "▌")
+                    return
+                if kind == "started":
+                    status_text.text({
+                        "draft": "AI writer is crafting your article...",
+                        "draft_validation": "Checking the draft while it is being refined...",
+                        "refined_article": "Enhancing article quality and structure...",
+                        "validation": "Performing final quality assessment...",
+                    }[output])
+                    return
+                finished.add(output)
+                progress_bar.progress(25 * len(finished))
+                if output == "draft":
+                    draft_placeholder.text_area(
                         "Article Draft:",
-                        value=display_draft,
+                        value=payload,
                         height=400,
                         help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
                         key="article_draft"
                     )
-                    
-                except Exception as e:
-                    st.error(f"❌ Writing Error: {e}")
-                    logger.error(f"WriteArticleAgent Error: {e}")
-                    return
-
-            with st.spinner("🔧 Refining and improving content..."):
-                progress_bar.progress(75)
-                status_text.text("Enhancing article quality and structure...")
-                try:
-                    refined_article = refiner_agent.execute(draft)
-                    progress_bar.progress(90)
-                    
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #f093fb; margin-top: 0;">🔧 Refined Article</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Extract content if it's in JSON format
-                    display_refined = extract_content(refined_article)
-                    st.text_area(
-                        "Refined Article:",
-                        value=display_refined,
-                        height=500,
-                        help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
-                        key="refined_article"
-                    )
-                    
-                except Exception as e:
-                    st.error(f"❌ Refinement Error: {e}")
-                    logger.error(f"RefinerAgent Error: {e}")
-                    return
-
-            with st.spinner("✅ Final validation and quality check..."):
-                progress_bar.progress(95)
-                status_text.text("Performing final quality assessment...")
-                try:
-                    validation = validator_agent.execute(topic=topic, article=refined_article)
-                    progress_bar.progress(100)
-                    status_text.text("🎉 Article creation completed successfully!")
-                    
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #11998e; margin-top: 0;">✅ Quality Assessment</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Extract content if it's in JSON format
-                    display_article_validation = extract_content(validation)
-                    st.text_area(
+                elif output == "draft_validation":
+                    score = parse_score(payload)
+                    if score is not None:
+                        draft_score_placeholder.caption(f"Draft scored {score:g}/5")
+                elif output == "refined_article":
+                    if kind == "skipped":
+                        refined_placeholder.info("🎯 The draft already scored 5/5 — refinement was skipped.")
+                    else:
+                        refined_placeholder.text_area(
+                            "Refined Article:",
+                            value=payload,
+                            height=500,
+                            help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
+                            key="refined_article"
+                        )
+                elif output == "validation":
+                    validation_placeholder.text_area(
                         "Validation Result:",
-                        value=display_article_validation,
+                        value=parse_validation(payload).format(),
                         height=200,
                         help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
                         key="article_validation"
                     )
-                    
-                    st.balloons()
-                except Exception as e:
-                    st.error(f"❌ Validation Error: {e}")
-                    logger.error(f"ValidatorAgent Error: {e}")
+
+            try:
+                with st.spinner("✏️ Writing, refining and validating your article..."):
+                    workflow = Workflow.from_pipeline(agent_manager, "article")
+                    # Re-validating runs only the validators; the stored draft and refined article are reused
+                    result = workflow.run(agent_manager, {"topic": topic, "outline": outline},
+                                          on_event=on_event, stream=("draft", "refined_article"),
+                                          rerun=("draft_validation", "validation") if revalidate_btn else ())
+                progress_bar.progress(100)
+                status_text.text("🎉 Article creation completed successfully!")
+                if result.reused:
+                    st.caption(f"♻️ Unchanged inputs, reused from earlier runs: {', '.join(result.reused)}")
+                st.balloons()
+            except Exception as e:
+                st.error(f"❌ Article Workflow Error: {e}")
+                logger.error(f"Article workflow Error: {e}")
         else:
             st.markdown("""
             <div class="warning-box">
@@ -485,6 +569,44 @@ def write_and_refine_article_section(agent_manager):
             </div>
             """, unsafe_allow_html=True)
 
+    if agent_manager.run_store is not None:
+        run_history_panel(agent_manager.run_store)
+
+def has_stored_draft(agent_manager, topic, outline):
+    agent = agent_manager.get_agent("write_article")
+    fingerprint = step_fingerprint(agent, {"topic": topic, "outline": outline})
+    return agent_manager.run_store.find_step("write_article", fingerprint) is not None
+
+def run_history_panel(run_store):
+    with st.expander("🗂️ Run history"):
+        runs = run_store.runs(pipeline="article")
+        if not runs:
+            st.caption("No article runs recorded yet.")
+            return
+        st.dataframe(pd.DataFrame([{
+            "run": run["id"],
+            "started": pd.to_datetime(run["started_at"], unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+            "status": run["status"],
+            "topic": run["inputs"].get("topic"),
+            "ran": run["ran"],
+            "reused": run["reused"],
+            "skipped": run["skipped"],
+        } for run in runs]).set_index("run"), use_container_width=True)
+        run_id = st.selectbox("Steps of run", [run["id"] for run in runs])
+        steps = run_store.steps(run_id)
+        st.dataframe(pd.DataFrame([{
+            "step": step["output"],
+            "agent": step["agent"],
+            "status": step["status"] + (f" (run {step['source_run']})" if step["source_run"] else ""),
+            "model": step["model"],
+            "latency s": round(step["latency"], 2) if step["latency"] is not None else None,
+            "prompt tok": step["prompt_tokens"],
+            "completion tok": step["completion_tokens"],
+        } for step in steps]).set_index("step"), use_container_width=True)
+        for step in steps:
+            if step["text"]:
+                st.text_area(step["output"], value=step["text"], height=150, key=f"run_{run_id}_{step['output']}")
+
 def sanitize_data_section(agent_manager):
     st.markdown("""
     <div class="task-card">
@@ -529,65 +651,66 @@ def sanitize_data_section(agent_manager):
             main_agent = agent_manager.get_agent("sanitize_data")
             validator_agent = agent_manager.get_agent("sanitize_data_validator")
             
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            # One trace per pipeline run (when TRACE_PATH is set); agent spans nest under it
+            with maybe_span(agent_manager.tracer, "pipeline.sanitize", **{"pipeline.name": "sanitize"}):
+                progress_bar = st.progress(0)
+                status_text = st.empty()
             
-            with st.spinner("🔍 Scanning and sanitizing PHI..."):
-                progress_bar.progress(40)
-                status_text.text("Identifying and removing sensitive information...")
-                try:
-                    sanitized_data = main_agent.execute(medical_data)
-                    progress_bar.progress(70)
+                with st.spinner("🔍 Scanning and sanitizing PHI..."):
+                    progress_bar.progress(40)
+                    status_text.text("Identifying and removing sensitive information...")
+                    try:
+                        sanitized_data = main_agent.execute(medical_data)
+                        progress_bar.progress(70)
                     
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #667eea; margin-top: 0;">🛡️ Sanitized Data</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+                        st.markdown("""
+                        <div class="result-section">
+                            <h3 style="color: #667eea; margin-top: 0;">🛡️ Sanitized Data</h3>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    # Extract content if it's in JSON format
-                    display_sanitized = extract_content(sanitized_data)
-                    st.text_area(
-                        "Sanitized Data Result:",
-                        value=display_sanitized,
-                        height=300,
-                        help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
-                        key="sanitized_data"
-                    )
+                        st.text_area(
+                            "Sanitized Data Result:",
+                            value=sanitized_data.text,
+                            height=300,
+                            help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
+                            key="sanitized_data"
+                        )
                     
-                except Exception as e:
-                    st.error(f"❌ Sanitization Error: {e}")
-                    logger.error(f"SanitizeDataAgent Error: {e}")
-                    return
+                    except Exception as e:
+                        st.error(f"❌ Sanitization Error: {e}")
+                        logger.error(f"SanitizeDataAgent Error: {e}")
+                        return
 
-            with st.spinner("🔍 Validating sanitization completeness..."):
-                progress_bar.progress(90)
-                status_text.text("Verifying all PHI has been properly sanitized...")
-                try:
-                    validation = validator_agent.execute(original_data=medical_data, sanitized_data=sanitized_data)
-                    progress_bar.progress(100)
-                    status_text.text("✅ Data sanitization completed successfully!")
+                with st.spinner("🔍 Validating sanitization completeness..."):
+                    progress_bar.progress(90)
+                    status_text.text("Verifying all PHI has been properly sanitized...")
+                    try:
+                        validation = validator_agent.validate(original_data=medical_data, sanitized_data=sanitized_data)
+                        progress_bar.progress(100)
+                        status_text.text("✅ Data sanitization completed successfully!")
                     
-                    st.markdown("""
-                    <div class="result-section">
-                        <h3 style="color: #11998e; margin-top: 0;">🔍 Sanitization Validation</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+                        st.markdown("""
+                        <div class="result-section">
+                            <h3 style="color: #11998e; margin-top: 0;">🔍 Sanitization Validation</h3>
+                        </div>
+                        """, unsafe_allow_html=True)
                     
-                    # Extract content if it's in JSON format
-                    display_sanitize_validation = extract_content(validation)
-                    st.text_area(
-                        "Validation Result:",
-                        value=display_sanitize_validation,
-                        height=200,
-                        help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
-                        key="sanitize_validation"
-                    )
+                        if validation.phi:
+                            st.warning(f"⚠️ {len(validation.phi)} PHI item(s) still present: "
+                                       + ", ".join(span["text"] for span in validation.phi))
+                        st.text_area(
+                            "Validation Result:",
+                            value=validation.format(),
+                            height=200,
+                            help="You can copy this content by selecting all text (Ctrl+A) and copying (Ctrl+C)",
+                            key="sanitize_validation"
+                        )
                     
-                    st.balloons()
-                except Exception as e:
-                    st.error(f"❌ Validation Error: {e}")
-                    logger.error(f"SanitizeDataValidatorAgent Error: {e}")
+                        st.balloons()
+                    except Exception as e:
+                        st.error(f"❌ Validation Error: {e}")
+                        logger.error(f"SanitizeDataValidatorAgent Error: {e}")
         else:
             st.markdown("""
             <div class="warning-box">
@@ -0,0 +1,56 @@
+# benchmarks/bench_async_summarize.py
+#
+# Compares N sequential SummarizeTool.execute calls with N concurrent aexecute calls
+# against a local stub server. Run from the repository root:
+#
+#     python -m benchmarks.bench_async_summarize --requests 20 --latency 0.5
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async SummarizeTool benchmark")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub server latency per call in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+
+    # Imported after the environment points at the stub so every client picks it up
+    from agents import SummarizeTool
+
+    tool = SummarizeTool(verbose=False)
+    texts = [f"Patient note {i}: stable vitals, follow up in two weeks." for i in range(args.requests)]
+
+    tool.execute(texts[0])  # warm-up
+    start = time.perf_counter()
+    tool.execute(texts[0])
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        tool.execute(text)
+    sequential = time.perf_counter() - start
+
+    async def run_concurrent():
+        # Warm the shared async client first so pool setup is not billed to the batch
+        await tool.aexecute(texts[0])
+        start = time.perf_counter()
+        await asyncio.gather(*(tool.aexecute(text) for text in texts))
+        return time.perf_counter() - start
+
+    concurrent = asyncio.run(run_concurrent())
+
+    server.shutdown()
+    print(f"single call:             {single:.2f}s")
+    print(f"{args.requests} sequential (sync):  {sequential:.2f}s")
+    print(f"{args.requests} concurrent (async): {concurrent:.2f}s  ({sequential / concurrent:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
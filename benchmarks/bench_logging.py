@@ -0,0 +1,96 @@
+# benchmarks/bench_logging.py
+#
+# Caller-side cost of verbose request/response logging per agent call, comparing the previous
+# scheme (eager f-strings, full bodies, synchronous DEBUG file sink) with the background file
+# sink, which truncates and PHI-redacts sampled payloads on its writer thread. The calls run in a
+# tight loop, so the writer competes with the caller for the GIL; between real LLM requests it
+# would render while the caller waits. Run from the repository root:
+#
+#     python -m benchmarks.bench_logging --calls 2000
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from loguru import logger
+
+from agents import AgentResult, RefinerAgent
+from agents.payload_logging import PayloadLogPolicy
+from utils.logger import BackgroundFileSink, console_format
+from utils.tokens import message_text
+from benchmarks.bench_phi_scrubber import CLINICAL
+
+def make_article(rng, words=1500):
+    # Roughly a 2,000-token article with some PHI sprinkled in
+    sentences = []
+    while sum(len(sentence.split()) for sentence in sentences) < words:
+        sentences.append(rng.choice(CLINICAL))
+        if rng.random() < 0.05:
+            sentences.append(f"Call ({rng.randint(200, 999)}) 555-{rng.randint(1000, 9999)} or write to pat{rng.randint(1, 99)}@example.com.")
+    return " ".join(sentences)
+
+def configure(log_dir, background, file_level="DEBUG"):
+    # Mirrors utils/logger.py, with stdout swapped for /dev/null
+    logger.remove()
+    logger.add(open(os.devnull, "w"), level="INFO", format=console_format)
+    path = os.path.join(log_dir, "bench.log")
+    if background:
+        logger.add(BackgroundFileSink(path), level=file_level, format="{time} {level} {message}", colorize=False)
+    else:
+        logger.add(path, rotation="1 MB", retention="10 days", level=file_level, format="{time} {level} {message}")
+
+def legacy_log(name, messages, reply):
+    # What AgentBase did before: every body formatted eagerly and written synchronously
+    logger.info(f"[{name}] Sending messages to OpenAI:")
+    for msg in messages:
+        logger.debug(f"  {msg['role']}: {msg['content']}")
+    logger.info(f"[{name}] Received response: {reply}")
+
+def run(label, calls, log_call):
+    start = time.perf_counter()
+    for messages, reply in calls:
+        log_call(messages, reply)
+    elapsed = time.perf_counter() - start
+    print(f"{label:40s} {elapsed / len(calls) * 1e6:8.1f} us/call on the caller")
+
+def main():
+    parser = argparse.ArgumentParser(description="Verbose logging overhead per agent call")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    calls = []
+    for _ in range(args.calls):
+        article = make_article(rng)
+        messages = RefinerAgent().build_request(article)[0]
+        calls.append((messages, AgentResult(make_article(rng))))
+    print(f"{args.calls} calls, ~{sum(len(message_text(m[-1]['content'])) for m, _ in calls) // args.calls} prompt chars per call")
+
+    agent = RefinerAgent(verbose=True)
+    with tempfile.TemporaryDirectory() as log_dir:
+        configure(log_dir, background=False)
+        run("before: eager, full bodies, sync sink", calls, lambda messages, reply: legacy_log(agent.name, messages, reply))
+
+        def current(messages, reply):
+            agent._log_request(messages)
+            agent._log_response(reply, messages)
+
+        cases = [
+            ("after: defaults (LOG_BODY_* unset)", PayloadLogPolicy(), "DEBUG"),
+            ("after: 300 chars, redacted, all calls", PayloadLogPolicy(max_chars=300, sample_rate=1.0), "DEBUG"),
+            ("after: 2000 chars, redacted, all calls", PayloadLogPolicy(max_chars=2000, sample_rate=1.0), "DEBUG"),
+            ("after: 300 chars, redacted, 10% sample", PayloadLogPolicy(max_chars=300, sample_rate=0.1), "DEBUG"),
+            ("after: LOG_FILE_LEVEL=INFO", PayloadLogPolicy(max_chars=300, sample_rate=1.0), "INFO"),
+        ]
+        for label, policy, file_level in cases:
+            # A fresh sink per case, so one case's writer backlog is never billed to the next
+            configure(log_dir, background=True, file_level=file_level)
+            agent.log_policy = policy
+            run(label, calls, current)
+        logger.remove()
+
+if __name__ == "__main__":
+    main()
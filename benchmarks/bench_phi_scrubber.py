@@ -0,0 +1,66 @@
+# benchmarks/bench_phi_scrubber.py
+#
+# Throughput of the local PHI scrubber on a synthetic clinical-note corpus. Run from the repository root:
+#
+#     python -m benchmarks.bench_phi_scrubber --megabytes 20 --dictionary-size 5000
+
+import argparse
+import random
+import time
+
+from agents.phi_scrubber import PHIScrubber
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "Michael", "Linda", "David", "Susan", "Maria", "Ahmed", "Wei", "Priya"]
+LAST_NAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Patel", "Okafor", "Kowalski", "Rossi", "Haddad", "Tanaka"]
+CLINICAL = [
+    "Patient presents with intermittent chest pain radiating to the left arm.",
+    "Blood pressure 142/91, heart rate 88, afebrile.",
+    "Continue metformin 500 mg twice daily and lisinopril 10 mg daily.",
+    "No acute distress. Lungs clear to auscultation bilaterally.",
+    "Follow up with cardiology in two weeks for stress testing.",
+    "HbA1c 7.8 percent, up from 7.1 at last visit.",
+]
+
+def make_dictionary(rng, size):
+    names = {f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES}
+    while len(names) < size:
+        names.add(f"{rng.choice(FIRST_NAMES)} {''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8)).title()}")
+    facilities = [f"{last} Memorial Hospital" for last in LAST_NAMES] + [f"{last} Family Clinic" for last in LAST_NAMES]
+    return sorted(names), facilities
+
+def make_note(rng, names, facilities):
+    lines = [
+        f"Patient: {rng.choice(names)}  MRN: {rng.randint(10**6, 10**8)}  SSN: {rng.randint(100, 899)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}",
+        f"Seen at {rng.choice(facilities)} on {rng.randint(1, 12)}/{rng.randint(1, 28)}/20{rng.randint(10, 25)}.",
+        f"Contact: ({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}, patient{rng.randint(1, 9999)}@example.com",
+    ]
+    lines.extend(rng.choice(CLINICAL) for _ in range(8))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="PHI scrubber throughput benchmark")
+    parser.add_argument("--megabytes", type=float, default=10)
+    parser.add_argument("--dictionary-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names, facilities = make_dictionary(rng, args.dictionary_size)
+    notes = []
+    size = 0
+    while size < args.megabytes * 1e6:
+        notes.append(make_note(rng, names, facilities))
+        size += len(notes[-1])
+    print(f"corpus: {len(notes)} notes, {size / 1e6:.1f} MB, dictionary: {len(names)} names + {len(facilities)} facilities")
+
+    for label, scrubber in (
+        ("patterns only", PHIScrubber()),
+        ("patterns + dictionary", PHIScrubber(names=names, facilities=facilities)),
+    ):
+        start = time.perf_counter()
+        spans = sum(len(scrubber.scrub(note).spans) for note in notes)
+        elapsed = time.perf_counter() - start
+        print(f"{label:24s} {size / 1e6 / elapsed:6.1f} MB/s  {len(notes) / elapsed:8.0f} notes/s  {spans} spans")
+
+if __name__ == "__main__":
+    main()
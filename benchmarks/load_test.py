@@ -0,0 +1,185 @@
+# benchmarks/load_test.py
+#
+# Open-loop load test: starts pipeline runs at a fixed arrival rate, whether or not earlier ones
+# have finished, and reports throughput, latency percentiles and error rates. Runs against the
+# deterministic MockBackend by default, or any OpenAI-compatible endpoint with --base-url.
+# Thresholds turn it into a regression gate (non-zero exit when one is missed):
+#
+#     python -m benchmarks.load_test --pipeline summarize --rps 20 --duration 30 --max-p95 2.5 --max-error-rate 0.01
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from agents import AgentManager, LatencyModel, MicroBatcher, MockBackend, default_model_routes
+from benchmarks.bench_phi_scrubber import make_dictionary, make_note
+from pipeline import Workflow
+from utils.retry import RetryPolicy
+
+def make_items(pipeline_name, count, seed):
+    rng = random.Random(seed)
+    names, facilities = make_dictionary(rng, 200)
+    for index in range(count):
+        if pipeline_name == "article":
+            yield {"id": str(index), "topic": f"Outcomes of intervention {index} in chronic disease management", "outline": ""}
+        else:
+            yield {"id": str(index), "text": make_note(rng, names, facilities)}
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def drive(agent_manager, pipeline_name, rps, duration, max_in_flight, seed, poisson=False):
+    workflow = Workflow.from_pipeline(agent_manager, pipeline_name)
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    latencies = []
+    errors = Counter()
+    dropped = 0
+
+    async def one(item):
+        try:
+            started = time.perf_counter()
+            await workflow.arun(agent_manager, item)
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors[type(e).__name__] += 1
+        finally:
+            semaphore.release()
+
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    for item in make_items(pipeline_name, int(rps * duration), seed):
+        next_arrival += rng.expovariate(rps) if poisson else 1.0 / rps
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if semaphore.locked():
+            # Open loop: arrivals never wait for capacity; anything over the cap counts as dropped
+            dropped += 1
+            continue
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(one(item)))
+    offered_seconds = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    completed = len(latencies)
+    attempted = completed + sum(errors.values()) + dropped
+    return {
+        "pipeline": pipeline_name,
+        "target_rps": rps,
+        "offered_rps": round(attempted / offered_seconds, 2) if offered_seconds else None,
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "completed": completed,
+        "failed": sum(errors.values()),
+        "dropped": dropped,
+        "error_rate": round((attempted - completed) / attempted, 4) if attempted else 0.0,
+        "errors": dict(errors),
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+    }
+
+def check_gates(report, args):
+    failures = []
+    p95 = report["latency_seconds"]["p95"]
+    if args.max_p95 is not None and (p95 is None or p95 > args.max_p95):
+        failures.append(f"p95 latency {p95} s exceeds {args.max_p95} s")
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']} exceeds {args.max_error_rate}")
+    if args.min_throughput is not None and (report["throughput_rps"] or 0) < args.min_throughput:
+        failures.append(f"throughput {report['throughput_rps']} rps is below {args.min_throughput} rps")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive an agent pipeline at a target request rate")
+    parser.add_argument("--pipeline", default="summarize", choices=["summarize", "sanitize", "article"])
+    parser.add_argument("--rps", type=float, default=10.0, help="Pipeline runs started per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to keep starting runs")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of a fixed interval")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", help="Use this OpenAI-compatible endpoint instead of the mock backend")
+    parser.add_argument("--micro-batch", type=int, metavar="K", help="Pack up to K short inputs into one request")
+    parser.add_argument("--micro-batch-wait", type=float, default=0.05, help="Flush-latency bound of --micro-batch (seconds)")
+    parser.add_argument("--fast-model", help="Route validators and short notes to this model (default_model_routes)")
+    mock = parser.add_argument_group("mock backend")
+    mock.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    mock.add_argument("--latency-median", type=float, default=0.5)
+    mock.add_argument("--latency-sigma", type=float, default=0.5)
+    mock.add_argument("--seconds-per-token", type=float, default=0.0)
+    mock.add_argument("--fast-latency-median", type=float, default=0.2, help="Median latency of --fast-model")
+    mock.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    mock.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    mock.add_argument("--retry-after", type=float, default=1.0)
+    mock.add_argument("--prompt-cache", action="store_true", help="Simulate provider prompt-prefix caching")
+    mock.add_argument("--cached-speedup", type=float, default=0.5, help="TTFT saved on a fully cached prompt")
+    gates = parser.add_argument_group("regression gates")
+    gates.add_argument("--max-p95", type=float, help="Fail if p95 pipeline latency (s) is above this")
+    gates.add_argument("--max-error-rate", type=float, help="Fail if the share of failed/dropped runs is above this")
+    gates.add_argument("--min-throughput", type=float, help="Fail if completed runs per second are below this")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    backend = None
+    if not args.base_url:
+        backend = MockBackend(
+            latency=LatencyModel(args.latency, median=args.latency_median, sigma=args.latency_sigma),
+            seconds_per_token=args.seconds_per_token, error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed,
+            prompt_cache=args.prompt_cache, cached_speedup=args.cached_speedup,
+            model_latency={args.fast_model: LatencyModel(args.latency, median=args.fast_latency_median, sigma=args.latency_sigma)}
+            if args.fast_model else None,
+        )
+    micro_batcher = MicroBatcher(max_items=args.micro_batch, max_wait=args.micro_batch_wait) if args.micro_batch else None
+    agent_manager = AgentManager(max_retries=3, verbose=False, backend=backend, base_url=args.base_url,
+                                 client_options={"max_connections": args.max_in_flight},
+                                 retry_policy=RetryPolicy(base_delay=0.25, max_delay=5.0),
+                                 model_routes=default_model_routes(fast_model=args.fast_model) if args.fast_model else None,
+                                 micro_batcher=micro_batcher)
+    report = asyncio.run(drive(agent_manager, args.pipeline, args.rps, args.duration, args.max_in_flight,
+                               args.seed, poisson=args.poisson))
+    report["agents"] = {
+        name: {"p95_seconds": metrics["latency_seconds"]["p95"], "retries": metrics["retries"], "errors": metrics["errors"],
+               "models": metrics["models"], "escalations": metrics["escalations"],
+               "prefix_cache_hit_rate": metrics["prefix_cache"]["hit_rate"]}
+        for name, metrics in agent_manager.metrics.snapshot().items()
+    }
+    if backend is not None:
+        report["backend"] = dict(backend.stats)
+    if micro_batcher is not None:
+        report["micro_batching"] = micro_batcher.snapshot()
+
+    latency = report["latency_seconds"]
+    fmt = lambda value: f"{value:.3f}" if value is not None else "n/a"
+    print(f"pipeline={report['pipeline']} target={args.rps} rps offered={report['offered_rps']} rps "
+          f"throughput={report['throughput_rps']} rps")
+    print(f"completed={report['completed']} failed={report['failed']} dropped={report['dropped']} "
+          f"error_rate={report['error_rate']:.2%} {report['errors'] or ''}")
+    print(f"latency p50={fmt(latency['p50'])}s p95={fmt(latency['p95'])}s p99={fmt(latency['p99'])}s max={fmt(latency['max'])}s")
+    for name, stats in report["agents"].items():
+        print(f"  {name:28s} p95={fmt(stats['p95_seconds'])}s retries={stats['retries']} models={stats['models']} "
+              f"escalations={stats['escalations']} prefix_hits={fmt(stats['prefix_cache_hit_rate'])} "
+              f"errors={stats['errors'] or ''}")
+    for name, stats in report.get("micro_batching", {}).items():
+        print(f"  {name:28s} batches={stats['batches']} mean_size={stats['mean_batch_size']} fallbacks={stats['fallbacks']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_gates(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
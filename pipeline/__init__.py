@@ -0,0 +1,8 @@
+# pipeline/__init__.py
+
+from .batch import read_inputs, load_completed_ids, run_item, run_batch
+from .dag import Workflow, WorkflowResult
+from .refine import RefineLoop, RefineResult
+from .staged import StagedPipeline
+from .scrub import run_scrub
+from .offline import OfflineBatchJob, simulate_batch
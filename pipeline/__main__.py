@@ -0,0 +1,182 @@
+# pipeline/__main__.py
+#
+# Headless entry point for pushing a corpus through a named pipeline:
+#
+#     python -m pipeline batch --pipeline sanitize --input notes.jsonl --output sanitized.jsonl --concurrency 16
+#
+# or, for nightly corpora, through a provider batch API one stage at a time:
+#
+#     python -m pipeline export --pipeline sanitize --input notes.jsonl --job jobs/nightly
+#     python -m pipeline ingest --job jobs/nightly --results batch_output.jsonl
+
+import argparse
+import asyncio
+import os
+
+from agents import AgentManager, LatencyModel, MicroBatcher, MockBackend, OfflineBackend, PIPELINES, PHIScrubber, default_model_routes
+from utils.at_rest import AtRestPolicy, cipher_from_env
+from utils.cache import ResponseCache
+from utils.near_duplicate import NearDuplicateCache
+from utils.retry import CircuitBreaker, RateLimiter
+from utils.run_store import RunStore
+from utils.single_flight import SingleFlight
+from utils.tracing import JSONLSpanSink, Tracer
+from utils.logger import logger
+from .batch import run_batch
+from .offline import OfflineBatchJob, simulate_batch
+from .scrub import run_scrub
+
+def run_job(parser, args):
+    scrubber = PHIScrubber.from_files(args.names, args.facilities) if args.scrub else None
+    # Export and ingest only build prompts and parse result files, so no API client (or key) is needed
+    agent_manager = AgentManager(verbose=False, phi_scrubber=scrubber, backend=OfflineBackend(),
+                                 model_routes=default_model_routes(fast_model=args.fast_model) if args.fast_model else None)
+    if args.command == "export" and not os.path.exists(os.path.join(args.job, "job.json")):
+        if not args.pipeline or not args.input:
+            parser.error("a new job needs --pipeline and --input")
+        job = OfflineBatchJob.create(agent_manager, args.pipeline, args.input, args.job)
+    else:
+        job = OfflineBatchJob.load(agent_manager, args.job)
+        if args.command == "ingest":
+            try:
+                job.ingest(args.results)
+            except ValueError as e:
+                parser.error(str(e))
+    path, count = job.export() if not job.done else (None, 0)
+    if path is not None:
+        logger.info(f"Submit {path} ({count} requests) to the batch API, then ingest its result file with --job {args.job}")
+        return
+    output = getattr(args, "output", None) or os.path.join(args.job, "output.jsonl")
+    job.write_output(output)
+    logger.info(f"Job finished; records written to {output}")
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m pipeline", description="Run agent pipelines without the Streamlit UI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Run a JSONL/CSV file of inputs through a pipeline")
+    batch.add_argument("--pipeline", required=True, choices=sorted(PIPELINES))
+    batch.add_argument("--input", required=True, help="JSONL or CSV file; items need `text` (or `topic`/`outline` for article)")
+    batch.add_argument("--output", required=True, help="JSONL file results are appended to; reused to resume")
+    batch.add_argument("--concurrency", type=int, default=8)
+    batch.add_argument("--max-retries", type=int, default=2)
+    batch.add_argument("--staged", action="store_true", help="Overlap steps across items with one worker pool per step")
+    batch.add_argument("--stage-workers", metavar="AGENT=N,...", default="",
+                       help="Per-step pool sizes for --staged, e.g. refiner=8,validator=4")
+    batch.add_argument("--cache", metavar="PATH", help="Enable the response cache with a SQLite tier at PATH")
+    batch.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. a local stub server")
+    batch.add_argument("--mock", action="store_true", help="Use the deterministic local MockBackend instead of an API")
+    batch.add_argument("--fast-model", help="Route validators and short notes to this model, escalating to gpt-4 on low scores")
+    batch.add_argument("--refine", action="store_true", help="Revise each output until its validator score reaches --refine-threshold")
+    batch.add_argument("--refine-threshold", type=float, default=4.0)
+    batch.add_argument("--max-refine-iterations", type=int, default=2)
+    batch.add_argument("--refine-token-budget", type=int, help="Max tokens the revisions of one item may spend")
+    batch.add_argument("--near-duplicates", type=float, metavar="THRESHOLD",
+                       help="Reuse or diff against earlier near-identical notes (MinHash similarity, e.g. 0.8)")
+    batch.add_argument("--micro-batch", type=int, metavar="K",
+                       help="Pack up to K short notes into one summarize/validator request")
+    batch.add_argument("--micro-batch-wait", type=float, default=0.05,
+                       help="Longest a note waits for others to share a --micro-batch request (seconds)")
+    batch.add_argument("--micro-batch-tokens", type=int, default=3000, help="Prompt token budget of one --micro-batch request")
+    batch.add_argument("--coalesce", action="store_true",
+                       help="Identical calls in flight at the same time share one request and its reply")
+    batch.add_argument("--rpm", type=int, help="Client-side limit on requests per minute across all agents")
+    batch.add_argument("--tpm", type=int, help="Client-side limit on tokens per minute across all agents")
+    batch.add_argument("--circuit-breaker", type=int, metavar="FAILURES",
+                       help="Fail calls fast for 30 s after this many consecutive upstream failures")
+    batch.add_argument("--token-budget", type=int, help="Max prompt + completion tokens per item across all steps")
+    batch.add_argument("--scrub", action="store_true", help="Pre-scrub PHI locally before SanitizeDataTool")
+    batch.add_argument("--trace", metavar="PATH", help="Append trace spans to the JSONL file at PATH")
+    batch.add_argument("--run-store", metavar="PATH",
+                       help="Record runs in the SQLite run store at PATH and re-execute only steps whose inputs changed")
+    batch.add_argument("--metrics", metavar="PATH",
+                       help="Write per-agent call metrics to PATH (Prometheus text for .prom, JSON otherwise)")
+
+    scrub = subparsers.add_parser("scrub", help="Sanitize a JSONL/CSV file locally with the PHI scrubber, no LLM calls")
+    scrub.add_argument("--input", required=True)
+    scrub.add_argument("--output", required=True)
+
+    export = subparsers.add_parser("export", help="Write the next stage of an offline job as a provider batch-API JSONL file")
+    export.add_argument("--job", required=True, metavar="DIR", help="Job directory; created from --pipeline and --input on first use")
+    export.add_argument("--pipeline", choices=sorted(PIPELINES))
+    export.add_argument("--input", help="JSONL or CSV file of inputs, as for batch")
+
+    ingest = subparsers.add_parser("ingest", help="Apply a provider batch result file to an offline job and export its next stage")
+    ingest.add_argument("--job", required=True, metavar="DIR")
+    ingest.add_argument("--results", required=True, help="The batch API's output file for the last exported stage")
+    ingest.add_argument("--output", help="Where to write the records once the job is done (default: DIR/output.jsonl)")
+
+    for command in (export, ingest):
+        command.add_argument("--fast-model", help="Route validators and short notes to this model")
+        command.add_argument("--scrub", action="store_true", help="Pre-scrub PHI locally before SanitizeDataTool")
+
+    simulate = subparsers.add_parser("simulate-batch", help="Answer a batch input file locally with the mock backend")
+    simulate.add_argument("--requests", required=True, help="Batch input file written by export")
+    simulate.add_argument("--results", required=True, help="Result file to write, in the batch API's output format")
+    simulate.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+
+    for command in (batch, scrub, export, ingest):
+        command.add_argument("--names", metavar="PATH", help="Known patient names, one per line")
+        command.add_argument("--facilities", metavar="PATH", help="Known facility names, one per line")
+
+    args = parser.parse_args()
+    if args.command == "scrub":
+        run_scrub(PHIScrubber.from_files(args.names, args.facilities), args.input, args.output)
+        return
+    if args.command == "simulate-batch":
+        backend = MockBackend(latency=LatencyModel("fixed", median=0.0), error_rate=args.error_rate)
+        counts = simulate_batch(args.requests, args.results, backend)
+        logger.info(f"Simulated batch: {counts['ok']} ok, {counts['error']} failed; results written to {args.results}")
+        return
+    if args.command in ("export", "ingest"):
+        run_job(parser, args)
+        return
+
+    scrubber = PHIScrubber.from_files(args.names, args.facilities) if args.scrub else None
+    try:
+        # STORE_ENCRYPTION_KEY (a Fernet key) encrypts the replies and step outputs written to the cache's
+        # SQLite tier and the run store; run inputs are kept PHI-scrubbed
+        at_rest = AtRestPolicy(scrubber=PHIScrubber(), cipher=cipher_from_env())
+    except ValueError as error:
+        parser.error(str(error))
+    cache = ResponseCache(disk_path=args.cache, at_rest=at_rest) if args.cache else None
+    near_duplicates = NearDuplicateCache(threshold=args.near_duplicates) if args.near_duplicates else None
+    micro_batcher = None
+    if args.micro_batch and args.micro_batch > 1:
+        micro_batcher = MicroBatcher(max_items=args.micro_batch, max_wait=args.micro_batch_wait,
+                                     max_batch_tokens=args.micro_batch_tokens)
+    tracer = Tracer(JSONLSpanSink(args.trace)) if args.trace else None
+    rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm) if args.rpm or args.tpm else None
+    circuit_breaker = CircuitBreaker(failure_threshold=args.circuit_breaker) if args.circuit_breaker else None
+    agent_manager = AgentManager(max_retries=args.max_retries, verbose=False, cache=cache, phi_scrubber=scrubber,
+                                 base_url=args.base_url, client_options={"max_connections": max(args.concurrency * 2, 20)},
+                                 rate_limiter=rate_limiter, circuit_breaker=circuit_breaker, tracer=tracer, backend=MockBackend() if args.mock else None,
+                                 model_routes=default_model_routes(fast_model=args.fast_model) if args.fast_model else None,
+                                 near_duplicates=near_duplicates, micro_batcher=micro_batcher,
+                                 single_flight=SingleFlight() if args.coalesce else None,
+                                 run_store=RunStore(args.run_store, at_rest=at_rest) if args.run_store else None)
+    if args.command == "batch":
+        stage_workers = {}
+        for pair in filter(None, args.stage_workers.split(",")):
+            agent_name, workers = pair.split("=")
+            stage_workers[agent_name.strip()] = int(workers)
+        refine = None
+        if args.refine:
+            refine = {"threshold": args.refine_threshold, "max_iterations": args.max_refine_iterations,
+                      "max_tokens": args.refine_token_budget}
+        asyncio.run(run_batch(agent_manager, args.pipeline, args.input, args.output, concurrency=args.concurrency,
+                              staged=args.staged, stage_workers=stage_workers, token_budget=args.token_budget,
+                              refine=refine))
+        logger.info(f"Token usage by agent: {agent_manager.usage()}")
+        if cache is not None:
+            logger.info(f"Cache stats: {cache.snapshot()}")
+        if near_duplicates is not None:
+            logger.info(f"Near-duplicate stats: {near_duplicates.snapshot()}")
+        if micro_batcher is not None:
+            logger.info(f"Micro-batching stats: {micro_batcher.snapshot()}")
+        if args.metrics:
+            agent_manager.metrics.write(args.metrics)
+            logger.info(f"Metrics written to {args.metrics}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# pipeline/batch.py
+
+import asyncio
+import csv
+import json
+import os
+import time
+
+from utils.logger import logger
+from utils.tokens import track_usage
+from .dag import Workflow
+from .refine import RefineLoop
+from .staged import StagedPipeline
+
+def read_inputs(path):
+    """Yield input items from a JSONL or CSV file, giving each one an `id` if it has none."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for index, row in enumerate(rows):
+            item = dict(row)
+            item["id"] = str(item.get("id") or index)
+            yield item
+
+def load_completed_ids(output_path):
+    """Return ids of items that already finished successfully in a previous run."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a half-written last line behind
+                continue
+            if record.get("status") == "ok":
+                completed.add(str(record["id"]))
+    return completed
+
+async def run_item(agent_manager, pipeline_name, item, refine_loop=None):
+    if refine_loop is not None:
+        return await refine_loop.arun(agent_manager, item)
+    return await Workflow.from_pipeline(agent_manager, pipeline_name).arun(agent_manager, item)
+
+def open_output(output_path):
+    needs_newline = False
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(output_path, "a", encoding="utf-8")
+    if needs_newline:
+        out.write("\n")
+    return out
+
+async def run_batch(agent_manager, pipeline_name, input_path, output_path, concurrency=8,
+                    staged=False, stage_workers=None, token_budget=None, refine=None):
+    """
+    Run every input item through a named pipeline with at most `concurrency` items in flight
+    (independent steps of one item run concurrently as a Workflow), appending one JSON line per item to `output_path`. Items already recorded as successful
+    in the output are skipped, so an interrupted run can simply be started again.
+
+    With `staged=True` the steps run as a StagedPipeline instead, each with its own worker pool
+    (`concurrency` workers unless overridden per agent in `stage_workers`).
+
+    `token_budget` caps the prompt + completion tokens a single item may spend across all steps;
+    each record carries the item's token usage either way.
+
+    `refine` (RefineLoop options: threshold, max_iterations, max_tokens) revises each item's output
+    until its validator is satisfied; records then report the iterations, scores and tokens spent.
+
+    With a `run_store` on the agent manager, steps whose inputs match a stored run are not
+    executed again; records list them under "reused".
+    """
+    agent_manager.get_pipeline(pipeline_name)  # fail fast on an unknown pipeline
+    if refine is not None and staged:
+        raise ValueError("Refine loops are not supported with staged=True.")
+    if getattr(agent_manager, "run_store", None) is not None and staged:
+        raise ValueError("The run store is not supported with staged=True.")
+    refine_loop = RefineLoop.from_pipeline(agent_manager, pipeline_name, **refine) if refine is not None else None
+    completed = load_completed_ids(output_path)
+    pending = (item for item in read_inputs(input_path) if item["id"] not in completed)
+    stats = {"ok": 0, "error": 0, "skipped": len(completed), "refine_iterations": 0}
+    started = time.perf_counter()
+
+    with open_output(output_path) as out:
+        async def write_record(record):
+            stats[record["status"]] += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            done = stats["ok"] + stats["error"]
+            if done % 100 == 0:
+                logger.info(f"[pipeline:{pipeline_name}] {done} items processed")
+
+        async def worker():
+            # Workers pull from a shared generator so only `concurrency` items are ever materialized
+            for item in pending:
+                record = {"id": item["id"], "pipeline": pipeline_name}
+                with track_usage(max_total_tokens=token_budget) as usage:
+                    try:
+                        result = await run_item(agent_manager, pipeline_name, item, refine_loop)
+                        record["outputs"] = result.outputs
+                        if result.skipped:
+                            record["skipped"] = result.skipped
+                        if result.near_duplicates:
+                            record["near_duplicates"] = result.near_duplicates
+                        if result.reused:
+                            record["reused"] = result.reused
+                        if refine_loop is not None:
+                            record["refine"] = {"iterations": result.iterations, "scores": result.scores,
+                                                "tokens": result.tokens, "stopped": result.stopped}
+                            stats["refine_iterations"] += result.iterations
+                        record["status"] = "ok"
+                    except Exception as e:
+                        logger.error(f"[pipeline:{pipeline_name}] Item {item['id']} failed: {e}")
+                        record["status"] = "error"
+                        record["error"] = str(e)
+                record["usage"] = usage.as_dict()
+                await write_record(record)
+
+        if staged:
+            executor = StagedPipeline(agent_manager, pipeline_name, default_workers=concurrency,
+                                      stage_workers=stage_workers, queue_size=2 * concurrency,
+                                      token_budget=token_budget)
+            stats["stages"] = await executor.run(pending, write_record)
+        else:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    stats["elapsed"] = time.perf_counter() - started
+    logger.info(
+        f"[pipeline:{pipeline_name}] Finished: {stats['ok']} ok, {stats['error']} failed, "
+        f"{stats['skipped']} skipped in {stats['elapsed']:.1f}s"
+        + (f", {stats['refine_iterations']} refine iterations" if refine_loop is not None else "")
+    )
+    for stage in stats.get("stages", []):
+        logger.info(f"[pipeline:{pipeline_name}] {stage}")
+    return stats
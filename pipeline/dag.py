@@ -0,0 +1,303 @@
+# pipeline/dag.py
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from agents import step_kwargs, reply_text, should_skip
+from utils.run_store import step_fingerprint
+from utils.tracing import maybe_span
+
+# `outputs` holds every step's result (skipped steps hold their fallback), `skipped` lists skipped step outputs,
+# `near_duplicates` maps outputs derived from a near-duplicate input to the AgentResult's audit marker,
+# `reused` lists outputs taken from the run store instead of re-executed, and `run_id` is the run's id in the store
+WorkflowResult = namedtuple("WorkflowResult", ["outputs", "skipped", "near_duplicates", "reused", "run_id"],
+                            defaults=((), None))
+
+class _StoredRun:
+    """One Workflow run as recorded in a utils.run_store.RunStore."""
+
+    def __init__(self, store, pipeline, inputs, rerun):
+        self.store = store
+        self.rerun = set(rerun)
+        self.run_id = store.start_run(pipeline, inputs)
+        self.fingerprints = {}
+        self.started = {}
+        self.reused = []
+
+    def lookup(self, step, agent, kwargs):
+        """The stored output for this step's inputs, recorded as reused; None if the step has to run."""
+        fingerprint = self.fingerprints[step.output] = step_fingerprint(agent, kwargs)
+        self.started[step.output] = (time.time(), time.perf_counter())
+        if step.output in self.rerun:
+            return None
+        stored = self.store.find_step(step.agent, fingerprint)
+        if stored is None:
+            return None
+        self.store.record_step(self.run_id, step.output, step.agent, fingerprint, "reused", text=stored["text"],
+                               model=stored["model"], started_at=self.started[step.output][0], latency=0.0,
+                               source_run=stored["source_run"])
+        self.reused.append(step.output)
+        return stored["text"]
+
+    def completed(self, step, value, reply):
+        started_at, started = self.started[step.output]
+        self.store.record_step(self.run_id, step.output, step.agent, self.fingerprints[step.output], "ran", text=value,
+                               model=getattr(reply, "model", None), usage=getattr(reply, "usage", None),
+                               started_at=started_at, latency=time.perf_counter() - started)
+
+    def skipped(self, step, value):
+        self.store.record_step(self.run_id, step.output, step.agent, self.fingerprints.get(step.output), "skipped", text=value)
+
+    def finish(self, error=None):
+        self.store.finish_run(self.run_id, "error" if error is not None else "ok",
+                              error=f"{type(error).__name__}: {error}" if error is not None else None)
+
+class Workflow:
+    """
+    Runs a pipeline's steps as a DAG: a step depends only on the earlier steps whose outputs it
+    reads, and every step whose dependencies are done starts immediately, so independent steps
+    run concurrently. A step's `skip_if` is checked when it becomes ready and again whenever
+    another step finishes, which lets a step start speculatively and be cancelled once its
+    result is known to be unnecessary.
+
+    `on_event(kind, output, payload)` is called with kind "started", "delta" (streamed text),
+    "completed" or "skipped"; in `run` it is always called on the calling thread.
+
+    When the agent manager has a `run_store`, every run and step is recorded in it and a step
+    whose inputs hash to a stored output completes with that output without calling its agent
+    (a "completed" event with no "started" before it). Steps named in `rerun` always execute.
+    """
+
+    def __init__(self, steps, name="workflow"):
+        self.name = name
+        self.steps = list(steps)
+        outputs = {step.output for step in self.steps}
+        self.dependencies = {
+            step.output: {key for key in step.inputs.values() if key in outputs and key != step.output}
+            for step in self.steps
+        }
+        self._check_acyclic()
+
+    @classmethod
+    def from_pipeline(cls, agent_manager, pipeline_name):
+        return cls(agent_manager.get_pipeline(pipeline_name), name=pipeline_name)
+
+    def _check_acyclic(self):
+        self.levels()
+
+    def levels(self):
+        """The steps grouped in dependency order: each group reads only inputs and outputs of earlier groups."""
+        done = set()
+        remaining = list(self.steps)
+        levels = []
+        while remaining:
+            ready = [step for step in remaining if self.dependencies[step.output] <= done]
+            if not ready:
+                raise ValueError(f"Workflow steps have a dependency cycle: {[step.output for step in remaining]}")
+            for step in ready:
+                remaining.remove(step)
+            done.update(step.output for step in ready)
+            levels.append(ready)
+        return levels
+
+    def _ready(self, pending, done):
+        return [step for step in pending if self.dependencies[step.output] <= done]
+
+    def _skip(self, step, context, done, skipped, on_event, run=None):
+        context[step.output] = context.get(step.fallback) if step.fallback else None
+        done.add(step.output)
+        skipped.append(step.output)
+        if run is not None:
+            run.skipped(step, context[step.output])
+        if on_event:
+            on_event("skipped", step.output, context[step.output])
+
+    def _complete(self, step, value, context, done, on_event, run=None, reply=None):
+        if run is not None:
+            run.completed(step, value, reply)
+        context[step.output] = value
+        done.add(step.output)
+        if on_event:
+            on_event("completed", step.output, value)
+
+    def _result(self, context, skipped, near_duplicates, run):
+        return WorkflowResult({step.output: context.get(step.output) for step in self.steps}, skipped, near_duplicates,
+                              run.reused if run is not None else [], run.run_id if run is not None else None)
+
+    @staticmethod
+    def _note(step, reply, near_duplicates):
+        if getattr(reply, "near_duplicate", None):
+            near_duplicates[step.output] = reply.near_duplicate
+        return reply_text(reply)
+
+    @contextmanager
+    def _root_span(self, agent_manager, inputs):
+        # One trace per pipeline run; agent spans opened inside it become its children
+        attributes = {"pipeline.name": self.name}
+        if inputs.get("id") is not None:
+            attributes["item.id"] = inputs["id"]
+        with maybe_span(getattr(agent_manager, "tracer", None), f"pipeline.{self.name}", **attributes) as span:
+            yield span
+
+    @contextmanager
+    def _stored_run(self, agent_manager, inputs, rerun):
+        store = getattr(agent_manager, "run_store", None)
+        if store is None:
+            yield None
+            return
+        run = _StoredRun(store, self.name, inputs, rerun)
+        try:
+            yield run
+        except BaseException as e:
+            run.finish(e)
+            raise
+        run.finish()
+
+    async def arun(self, agent_manager, inputs, on_event=None, rerun=()):
+        with self._root_span(agent_manager, inputs) as span, self._stored_run(agent_manager, inputs, rerun) as run:
+            result = await self._arun(agent_manager, inputs, on_event, run)
+            if span is not None and result.skipped:
+                span.set(**{"pipeline.skipped": ",".join(result.skipped)})
+            return result
+
+    def run(self, agent_manager, inputs, on_event=None, stream=(), rerun=()):
+        """
+        Synchronous counterpart of `arun` that runs each step in a worker thread. Steps named in
+        `stream` use the agent's streaming call and report their text through "delta" events.
+        """
+        with self._root_span(agent_manager, inputs) as span, self._stored_run(agent_manager, inputs, rerun) as run:
+            result = self._run(agent_manager, inputs, on_event, stream, run)
+            if span is not None and result.skipped:
+                span.set(**{"pipeline.skipped": ",".join(result.skipped)})
+            return result
+
+    async def _arun(self, agent_manager, inputs, on_event, run):
+        context = dict(inputs)
+        pending = list(self.steps)
+        running = {}  # task -> step
+        done = set()
+        skipped = []
+        near_duplicates = {}
+        try:
+            while pending or running:
+                for task, step in list(running.items()):
+                    if should_skip(step, context):
+                        task.cancel()
+                        del running[task]
+                        self._skip(step, context, done, skipped, on_event, run)
+                reused = False
+                for step in self._ready(pending, done):
+                    pending.remove(step)
+                    if should_skip(step, context):
+                        self._skip(step, context, done, skipped, on_event, run)
+                        continue
+                    agent = agent_manager.get_agent(step.agent)
+                    kwargs = step_kwargs(step, context)
+                    stored = run.lookup(step, agent, kwargs) if run is not None else None
+                    if stored is not None:
+                        self._complete(step, stored, context, done, on_event)
+                        reused = True
+                        continue
+                    running[asyncio.ensure_future(agent.aexecute(**kwargs))] = step
+                    if on_event:
+                        on_event("started", step.output, None)
+                if not running or reused:
+                    # Skips and reused outputs above may have unblocked more steps
+                    continue
+                finished, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    step = running.pop(task)
+                    reply = task.result()
+                    self._complete(step, self._note(step, reply, near_duplicates), context, done, on_event,
+                                   run, reply)
+        finally:
+            for task in running:
+                task.cancel()
+        return self._result(context, skipped, near_duplicates, run)
+
+    def _run(self, agent_manager, inputs, on_event, stream, run):
+        context = dict(inputs)
+        pending = list(self.steps)
+        running = {}  # output -> (step, cancel flag)
+        done = set()
+        skipped = []
+        near_duplicates = {}
+        events = queue.Queue()
+
+        def work(step, agent, kwargs, cancel):
+            try:
+                if step.output in stream:
+                    parts = []
+                    chunks = agent.stream_execute(**kwargs)
+                    while True:
+                        try:
+                            delta = next(chunks)
+                        except StopIteration as stop:
+                            reply = stop.value  # the joined AgentResult, for the run store
+                            break
+                        if cancel.is_set():
+                            chunks.close()
+                            return
+                        parts.append(delta)
+                        events.put(("delta", step.output, delta))
+                    value = "".join(parts)
+                else:
+                    reply = agent.execute(**kwargs)
+                    value = self._note(step, reply, near_duplicates)
+                events.put(("completed", step.output, (value, reply)))
+            except Exception as e:
+                events.put(("error", step.output, e))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, len(self.steps)))
+        try:
+            while pending or running:
+                for output, (step, cancel) in list(running.items()):
+                    if should_skip(step, context):
+                        cancel.set()
+                        del running[output]
+                        self._skip(step, context, done, skipped, on_event, run)
+                reused = False
+                for step in self._ready(pending, done):
+                    pending.remove(step)
+                    if should_skip(step, context):
+                        self._skip(step, context, done, skipped, on_event, run)
+                        continue
+                    agent = agent_manager.get_agent(step.agent)
+                    kwargs = step_kwargs(step, context)
+                    stored = run.lookup(step, agent, kwargs) if run is not None else None
+                    if stored is not None:
+                        self._complete(step, stored, context, done, on_event)
+                        reused = True
+                        continue
+                    cancel = threading.Event()
+                    running[step.output] = (step, cancel)
+                    # Each step runs in a copy of the caller's context so pipeline token accounting follows it
+                    pool.submit(contextvars.copy_context().run, work, step, agent, kwargs, cancel)
+                    if on_event:
+                        on_event("started", step.output, None)
+                if not running or reused:
+                    continue
+                kind, output, payload = events.get()
+                if output not in running:
+                    # Late event from a step that was cancelled in the meantime
+                    continue
+                if kind == "error":
+                    raise payload
+                if kind == "delta":
+                    if on_event:
+                        on_event("delta", output, payload)
+                    continue
+                step, _ = running.pop(output)
+                value, reply = payload
+                self._complete(step, value, context, done, on_event, run, reply)
+        finally:
+            for _, cancel in running.values():
+                cancel.set()
+            pool.shutdown(wait=False)
+        return self._result(context, skipped, near_duplicates, run)
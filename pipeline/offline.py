@@ -0,0 +1,252 @@
+# pipeline/offline.py
+
+import json
+import os
+
+import openai
+
+from agents import AgentResult, LatencyModel, MockBackend, should_skip, step_kwargs
+from agents.agent_base import request_options
+from utils.logger import logger
+from utils.tokens import UsageStats
+from .batch import read_inputs
+from .dag import Workflow
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+def custom_id(item_id, output, piece):
+    return f"{item_id}:{output}:{piece}"
+
+def parse_custom_id(value):
+    # Item ids may contain colons; step outputs and piece numbers never do
+    item_id, output, piece = value.rsplit(":", 2)
+    return item_id, output, int(piece)
+
+class OfflineBatchJob:
+    """
+    Runs a named pipeline through a provider batch API instead of live calls, for corpora
+    where throughput and cost matter more than latency. The steps are grouped into stages by
+    dependency, so a validator runs one stage after the step it checks. `export()` writes the
+    current stage's requests as a batch-API JSONL file. Each line has a `custom_id` of
+    "<item id>:<step output>:<piece>". `ingest(path)` reads the provider's result file, stores
+    every item's outputs and advances to the next stage. The job lives in `job_dir`/job.json,
+    so exporting and ingesting can happen in separate processes, hours apart.
+
+    Prompts are built as in live runs: templates, token budgets and the routed model. Work
+    that needs further calls within one step does not happen offline. Validator escalations
+    are not re-asked, and oversized inputs are truncated or chunked instead of digested. A
+    step's `skip_if` is checked when the step is exported and again when its stage is
+    ingested, as in a live run. Items whose request failed are recorded as errors and drop out.
+    """
+
+    def __init__(self, agent_manager, job_dir, state):
+        self.agent_manager = agent_manager
+        self.job_dir = job_dir
+        self.state = state
+        self.stages = Workflow.from_pipeline(agent_manager, state["pipeline"]).levels()
+
+    @staticmethod
+    def _state_path(job_dir):
+        return os.path.join(job_dir, "job.json")
+
+    @classmethod
+    def create(cls, agent_manager, pipeline_name, input_path, job_dir):
+        agent_manager.get_pipeline(pipeline_name)  # fail fast on an unknown pipeline
+        if os.path.exists(cls._state_path(job_dir)):
+            raise ValueError(f"{job_dir} already holds a batch job; load it or pick another directory.")
+        os.makedirs(job_dir, exist_ok=True)
+        items = {
+            item["id"]: {"context": item, "skipped": [], "usage": UsageStats().as_dict(), "error": None}
+            for item in read_inputs(input_path)
+        }
+        job = cls(agent_manager, job_dir, {"pipeline": pipeline_name, "stage": 0, "items": items, "expected": {}})
+        job._save()
+        return job
+
+    @classmethod
+    def load(cls, agent_manager, job_dir):
+        with open(cls._state_path(job_dir), encoding="utf-8") as f:
+            return cls(agent_manager, job_dir, json.load(f))
+
+    def _save(self):
+        # Written aside and renamed, so an interrupted save never leaves a half-written job behind
+        path = self._state_path(self.job_dir)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def done(self):
+        return self.state["stage"] >= len(self.stages)
+
+    def _skip(self, step, item):
+        item["context"][step.output] = item["context"].get(step.fallback) if step.fallback else None
+        # A stage exported again after a failed ingest skips the same steps again
+        if step.output not in item["skipped"]:
+            item["skipped"].append(step.output)
+
+    def _body(self, agent, messages, params):
+        model = agent._choose_model(messages)
+        body = {
+            "model": model,
+            "messages": messages,
+            "temperature": params.get("temperature", 0.7),
+            "max_tokens": params.get("max_tokens", 150),
+        }
+        body.update(request_options(model, params.get("response_format")))
+        return body
+
+    def export(self):
+        """
+        Write the current stage's batch input file; returns its path and the number of requests in it.
+        Stages with nothing to request (every step skipped or every item failed) are passed over,
+        and (None, 0) means the job is done.
+        """
+        if self.done:
+            raise ValueError("Every stage of this job has been ingested; write_output() has the results.")
+        while not self.done:
+            path, count = self._export_stage()
+            if count:
+                return path, count
+        return None, 0
+
+    def _export_stage(self):
+        stage_number = self.state["stage"] + 1
+        path = os.path.join(self.job_dir, f"stage-{stage_number}.requests.jsonl")
+        expected, count = {}, 0
+        with open(path, "w", encoding="utf-8") as out:
+            for item_id, item in self.state["items"].items():
+                if item["error"]:
+                    continue
+                for step in self.stages[self.state["stage"]]:
+                    if should_skip(step, item["context"]):
+                        self._skip(step, item)
+                        continue
+                    agent = self.agent_manager.get_agent(step.agent)
+                    try:
+                        requests = agent.plan_requests(agent._bind((), step_kwargs(step, item["context"])))
+                    except Exception as e:
+                        logger.error(f"[batch-job:{self.state['pipeline']}] Item {item_id} failed: {e}")
+                        item["error"] = str(e)
+                        break
+                    for piece, (messages, params) in enumerate(requests):
+                        line = {"custom_id": custom_id(item_id, step.output, piece), "method": "POST",
+                                "url": BATCH_ENDPOINT, "body": self._body(agent, messages, params)}
+                        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                        count += 1
+                    expected.setdefault(item_id, {})[step.output] = len(requests)
+        self.state["expected"] = expected
+        if not count:
+            os.remove(path)
+            self.state["stage"] += 1
+            self._save()
+            return None, 0
+        self._save()
+        logger.info(f"[batch-job:{self.state['pipeline']}] Stage {stage_number}/{len(self.stages)}: {count} requests written to {path}")
+        return path, count
+
+    def _read_results(self, result_path):
+        replies, errors = {}, {}
+        with open(result_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                item_id, output, piece = parse_custom_id(record["custom_id"])
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or (response.get("body") or {}).get("error") or {}
+                    errors[item_id] = f"Batch request {record['custom_id']} failed: {error.get('message', error) or response.get('status_code')}"
+                    continue
+                body = response["body"]
+                choice = body["choices"][0]
+                usage = body.get("usage") or {}
+                replies.setdefault((item_id, output), {})[piece] = AgentResult(
+                    choice["message"]["content"], model=body.get("model"), finish_reason=choice.get("finish_reason"),
+                    usage={"prompt_tokens": usage.get("prompt_tokens", 0), "completion_tokens": usage.get("completion_tokens", 0)},
+                )
+        return replies, errors
+
+    def ingest(self, result_path):
+        """Apply a provider result file to the exported stage and advance; returns {"ok", "error"} item counts."""
+        if not self.state["expected"]:
+            raise ValueError("No exported stage is waiting for results; call export() first.")
+        replies, errors = self._read_results(result_path)
+        stage = self.stages[self.state["stage"]]
+        counts = {"ok": 0, "error": 0}
+        for item_id, expected in self.state["expected"].items():
+            item = self.state["items"][item_id]
+            usage = UsageStats.from_dict(item["usage"])
+            for step in stage:
+                if step.output not in expected:
+                    continue
+                pieces = replies.get((item_id, step.output), {})
+                if len(pieces) < expected[step.output]:
+                    item["error"] = errors.get(item_id) or f"No batch result for step '{step.output}'"
+                    break
+                result = AgentResult.join([pieces[index] for index in range(expected[step.output])])
+                agent = self.agent_manager.get_agent(step.agent)
+                for stats in (usage, agent.usage):
+                    stats.record(agent.name, result.usage["prompt_tokens"], result.usage["completion_tokens"])
+                item["context"][step.output] = result.text
+            item["usage"] = usage.as_dict()
+            if item["error"]:
+                counts["error"] += 1
+                continue
+            # A step exported speculatively is discarded if its stage made it unnecessary, as in live runs
+            for step in stage:
+                if step.output in expected and should_skip(step, item["context"]):
+                    self._skip(step, item)
+            counts["ok"] += 1
+        self.state["stage"] += 1
+        self.state["expected"] = {}
+        self._save()
+        logger.info(f"[batch-job:{self.state['pipeline']}] Ingested stage {self.state['stage']}/{len(self.stages)}: "
+                    f"{counts['ok']} ok, {counts['error']} failed")
+        return counts
+
+    def records(self):
+        """One record per item, shaped like run_batch's output lines."""
+        outputs = [step.output for stage in self.stages for step in stage]
+        for item_id, item in self.state["items"].items():
+            record = {"id": item_id, "pipeline": self.state["pipeline"]}
+            if item["error"]:
+                record["status"] = "error"
+                record["error"] = item["error"]
+            else:
+                record["status"] = "ok" if self.done else "pending"
+                record["outputs"] = {output: item["context"].get(output) for output in outputs}
+                if item["skipped"]:
+                    record["skipped"] = item["skipped"]
+            record["usage"] = item["usage"]
+            yield record
+
+    def write_output(self, output_path):
+        with open(output_path, "w", encoding="utf-8") as out:
+            for record in self.records():
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def simulate_batch(requests_path, results_path, backend=None):
+    """
+    Local stand-in for a provider batch run: answers every request in a batch input file with
+    `backend` (a zero-latency MockBackend by default) and writes the result file the provider
+    would return, failed requests included, so offline jobs can be tested end to end.
+    """
+    backend = backend or MockBackend(latency=LatencyModel("fixed", median=0.0))
+    counts = {"ok": 0, "error": 0}
+    with open(requests_path, encoding="utf-8") as f, open(results_path, "w", encoding="utf-8") as out:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"batch_req_{index}", "custom_id": request["custom_id"], "error": None}
+            try:
+                completion = backend.client.chat.completions.create(**request["body"])
+                result["response"] = {"status_code": 200, "request_id": f"req_{index}", "body": completion.model_dump()}
+                counts["ok"] += 1
+            except openai.APIStatusError as e:
+                result["response"] = {"status_code": e.status_code, "request_id": f"req_{index}",
+                                      "body": {"error": {"message": str(e), "type": type(e).__name__}}}
+                counts["error"] += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return counts
@@ -0,0 +1,121 @@
+# pipeline/refine.py
+
+import re
+from collections import namedtuple
+
+from agents import REFINE_SPECS, parse_validation, reply_text, step_kwargs
+from utils.tokens import TokenBudgetExceeded, current_usage, track_usage
+from utils.tracing import maybe_span
+from .dag import Workflow
+
+# `outputs`, `skipped` and `near_duplicates` as in WorkflowResult; `iterations` counts revisions, `scores` holds the
+# score after the first pass and after each revision, `tokens` is what the revisions cost, and
+# `stopped` says why the loop ended: "threshold", "max_iterations", "token_budget" or "no_score";
+# `reused` lists first-pass outputs taken from the run store
+RefineResult = namedtuple("RefineResult", ["outputs", "skipped", "near_duplicates", "iterations", "scores", "tokens", "stopped",
+                                           "reused"], defaults=((),))
+
+class RefineLoop:
+    """
+    Runs a pipeline as a Workflow, then revises its output until the validator is satisfied:
+    tool -> validator -> refiner -> validator ... The loop stops as soon as the score reaches
+    `threshold`, after `max_iterations` revisions, or when the next revision would likely push
+    the revisions past `max_tokens`. The best-scoring version is kept, so a revision that makes
+    things worse is never returned.
+    """
+
+    def __init__(self, workflow, spec, threshold=4.0, max_iterations=2, max_tokens=None):
+        self.workflow = workflow
+        self.spec = spec
+        self.threshold = threshold
+        self.max_iterations = max_iterations
+        self.max_tokens = max_tokens
+        self.validation_step = next(step for step in workflow.steps if step.output == spec.validation)
+
+    @classmethod
+    def from_pipeline(cls, agent_manager, pipeline_name, **options):
+        spec = REFINE_SPECS.get(pipeline_name)
+        if spec is None:
+            raise ValueError(f"Pipeline '{pipeline_name}' has no refine loop.")
+        return cls(Workflow.from_pipeline(agent_manager, pipeline_name), spec, **options)
+
+    def _redact(self, text, verdict):
+        # Replace reported PHI verbatim; whatever the validator only describes is left to the refiner
+        redacted = text
+        for span in verdict.phi:
+            redacted = re.sub(re.escape(span["text"]), f"[{(span.get('type') or 'PHI').upper()}]", redacted)
+        return redacted
+
+    def _stop_reason(self, verdict, iterations, spent, last_cost):
+        if verdict.score is not None and verdict.score >= self.threshold:
+            return "threshold"
+        if verdict.score is None and not verdict.issues:
+            return "no_score"
+        if iterations >= self.max_iterations:
+            return "max_iterations"
+        # A revision costs about what the previous one did
+        if self.max_tokens is not None and spent + last_cost > self.max_tokens:
+            return "token_budget"
+        return None
+
+    async def arun(self, agent_manager, inputs, on_event=None):
+        # The first pass and the revisions share one trace per item
+        with self.workflow._root_span(agent_manager, inputs) as span:
+            # Only the first pass goes through the run store; revisions depend on the validator's verdict
+            with self.workflow._stored_run(agent_manager, inputs, ()) as run:
+                result = await self.workflow._arun(agent_manager, inputs, on_event, run)
+            if span is not None and result.skipped:
+                span.set(**{"pipeline.skipped": ",".join(result.skipped)})
+            context = dict(inputs, **result.outputs)
+            ledger = current_usage.get()
+            if ledger is None:
+                with track_usage() as ledger:
+                    return await self._refine(agent_manager, context, result, ledger, on_event)
+            return await self._refine(agent_manager, context, result, ledger, on_event)
+
+    async def _refine(self, agent_manager, context, first_pass, ledger, on_event):
+        spec = self.spec
+        refiner = agent_manager.get_agent("refiner")
+        validator = agent_manager.get_agent(self.validation_step.agent)
+        verdict = parse_validation(context[spec.validation])
+        scores = [verdict.score]
+        best = (verdict.score or 0, context[spec.output], context[spec.validation])
+        started_tokens = ledger.total_tokens
+        last_cost = 0
+        iterations = 0
+        with maybe_span(getattr(agent_manager, "tracer", None), "refine_loop", **{"refine.threshold": self.threshold}) as span:
+            while True:
+                stopped = self._stop_reason(verdict, iterations, ledger.total_tokens - started_tokens, last_cost)
+                if stopped:
+                    break
+                before = ledger.total_tokens
+                revised = context[spec.output]
+                if spec.redact_phi and verdict.phi:
+                    revised = self._redact(revised, verdict)
+                try:
+                    if revised == context[spec.output]:
+                        revised = reply_text(await refiner.aexecute(
+                            draft=revised, issues=verdict.issues, kind=spec.kind,
+                            reference=context.get(spec.reference) if spec.reference else None,
+                        ))
+                    validation = reply_text(await validator.aexecute(**step_kwargs(self.validation_step, dict(context, **{spec.output: revised}))))
+                except TokenBudgetExceeded:
+                    # The item's overall budget ran out mid-revision; keep the best version so far
+                    stopped = "token_budget"
+                    break
+                context[spec.output], context[spec.validation] = revised, validation
+                verdict = parse_validation(context[spec.validation])
+                iterations += 1
+                scores.append(verdict.score)
+                last_cost = ledger.total_tokens - before
+                if (verdict.score or 0) > best[0]:
+                    best = (verdict.score, revised, context[spec.validation])
+                if on_event:
+                    on_event("refined", spec.output, {"iteration": iterations, "score": verdict.score})
+            context[spec.output], context[spec.validation] = best[1], best[2]
+            tokens = ledger.total_tokens - started_tokens
+            if span is not None:
+                span.set(**{"refine.iterations": iterations, "refine.tokens": tokens, "refine.stopped": stopped})
+        outputs = {step.output: context.get(step.output) for step in self.workflow.steps}
+        return RefineResult(outputs, first_pass.skipped, first_pass.near_duplicates, iterations, scores, tokens, stopped,
+                            first_pass.reused)
@@ -0,0 +1,186 @@
+# pipeline/staged.py
+
+import asyncio
+import time
+
+from agents import step_kwargs, reply_text, should_skip
+from utils.logger import logger
+from utils.tokens import UsageStats, current_usage
+from utils.tracing import current_span
+
+_DONE = object()
+
+class _Item:
+    # Everything that travels with one input from stage to stage
+    def __init__(self, context, usage, span):
+        self.context = context
+        self.outputs = {}
+        self.usage = usage
+        self.skipped = []
+        self.near_duplicates = {}
+        self.span = span  # root trace span of this item's pipeline run, if tracing
+
+class StageStats:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.queue = None
+
+    def as_dict(self, elapsed):
+        capacity = self.workers * elapsed
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+        }
+
+class StagedPipeline:
+    """
+    Runs a named pipeline with one worker pool per step and a bounded queue in front of each
+    step, so step k+1 of one item overlaps with step k of the next. A full queue blocks the
+    upstream stage (backpressure), and throughput settles at the rate of the slowest stage.
+
+    `stage_workers` maps agent names (e.g. "refiner") to pool sizes; other stages use `default_workers`.
+    `token_budget` caps the tokens one item may spend across all stages.
+    """
+
+    def __init__(self, agent_manager, pipeline_name, default_workers=4, stage_workers=None,
+                 queue_size=16, report_interval=10.0, token_budget=None):
+        self.agent_manager = agent_manager
+        self.pipeline_name = pipeline_name
+        self.steps = agent_manager.get_pipeline(pipeline_name)
+        stage_workers = stage_workers or {}
+        self.stats = [StageStats(step.agent, stage_workers.get(step.agent, default_workers)) for step in self.steps]
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.token_budget = token_budget
+        self._started = None
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return [stats.as_dict(elapsed) for stats in self.stats]
+
+    async def _put(self, index, item):
+        queue = self.stats[index].queue
+        await queue.put(item)
+        self.stats[index].max_queue_depth = max(self.stats[index].max_queue_depth, queue.qsize())
+
+    async def _worker(self, index, sink):
+        step = self.steps[index]
+        stats = self.stats[index]
+        agent = self.agent_manager.get_agent(step.agent)
+        while True:
+            item = await stats.queue.get()
+            if item is _DONE:
+                return
+            context = item.context
+            if should_skip(step, context):
+                # Stages run in pipeline order, so whatever `skip_if` looks at is already in the context
+                context[step.output] = item.outputs[step.output] = context.get(step.fallback) if step.fallback else None
+                item.skipped.append(step.output)
+                await self._forward(index, item, sink)
+                continue
+            started = time.perf_counter()
+            # The item's usage ledger and trace travel with it from stage to stage
+            usage_token = current_usage.set(item.usage)
+            span_token = current_span.set(item.span)
+            try:
+                reply = await agent.aexecute(**step_kwargs(step, context))
+            except Exception as e:
+                stats.busy_seconds += time.perf_counter() - started
+                stats.failed += 1
+                logger.error(f"[pipeline:{self.pipeline_name}] Item {context['id']} failed at {step.agent}: {e}")
+                if item.span is not None:
+                    item.span.end(error=e)
+                await sink({"id": context["id"], "pipeline": self.pipeline_name, "outputs": item.outputs,
+                            "status": "error", "error": str(e), "usage": item.usage.as_dict()})
+                continue
+            finally:
+                current_span.reset(span_token)
+                current_usage.reset(usage_token)
+            stats.busy_seconds += time.perf_counter() - started
+            stats.processed += 1
+            if getattr(reply, "near_duplicate", None):
+                item.near_duplicates[step.output] = reply.near_duplicate
+            context[step.output] = item.outputs[step.output] = reply_text(reply)
+            await self._forward(index, item, sink)
+
+    async def _forward(self, index, item, sink):
+        if index + 1 < len(self.steps):
+            await self._put(index + 1, item)
+            return
+        record = {"id": item.context["id"], "pipeline": self.pipeline_name, "outputs": item.outputs,
+                  "status": "ok", "usage": item.usage.as_dict()}
+        if item.skipped:
+            record["skipped"] = item.skipped
+        if item.near_duplicates:
+            record["near_duplicates"] = item.near_duplicates
+        if item.span is not None:
+            item.span.end(**({"pipeline.skipped": ",".join(item.skipped)} if item.skipped else {}))
+        await sink(record)
+
+    def _start_item(self, item):
+        tracer = getattr(self.agent_manager, "tracer", None)
+        span = None
+        if tracer is not None:
+            span = tracer.start_span(f"pipeline.{self.pipeline_name}", **{
+                "pipeline.name": self.pipeline_name, "pipeline.mode": "staged", "item.id": item["id"],
+            })
+        return _Item(dict(item), UsageStats(max_total_tokens=self.token_budget), span)
+
+    async def _run_stage(self, index, sink):
+        workers = [asyncio.ensure_future(self._worker(index, sink)) for _ in range(self.stats[index].workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # A worker that raised, or a cancelled stage, takes the rest of the pool down with it
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        # Every worker of this stage has drained; let the next stage shut down the same way
+        if index + 1 < len(self.steps):
+            for _ in range(self.stats[index + 1].workers):
+                await self.stats[index + 1].queue.put(_DONE)
+
+    async def _feed(self, items):
+        for item in items:
+            await self._put(0, self._start_item(item))
+        for _ in range(self.stats[0].workers):
+            await self.stats[0].queue.put(_DONE)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            for stage in self.snapshot():
+                logger.info(
+                    f"[pipeline:{self.pipeline_name}] stage={stage['stage']} queue={stage['queue_depth']} "
+                    f"processed={stage['processed']} utilization={stage['utilization']:.0%}"
+                )
+
+    async def run(self, items, sink):
+        """Feed `items` through every stage, awaiting `sink(record)` for each finished item; returns stage stats."""
+        for stats in self.stats:
+            stats.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._started = time.perf_counter()
+        stages = [asyncio.ensure_future(self._run_stage(index, sink)) for index in range(len(self.steps))]
+        # Feeding runs as a task too, so a stage that fails (e.g. its sink raises) ends the run even
+        # while the feeder is blocked on a full queue
+        feeder = asyncio.ensure_future(self._feed(items))
+        reporter = asyncio.ensure_future(self._report()) if self.report_interval else None
+        try:
+            await asyncio.gather(feeder, *stages)
+        finally:
+            # On an error or cancellation the other stages may still be blocked on their queues
+            tasks = [feeder] + stages + ([reporter] if reporter is not None else [])
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.snapshot()
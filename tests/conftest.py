@@ -0,0 +1,28 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Tests import the packages from the repository root and never reach a real API
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from agents import AgentManager, LatencyModel, MockBackend  # noqa: E402
+
+@pytest.fixture
+def instant_backend():
+    """Factory for MockBackends that answer without simulated latency."""
+    def make(**options):
+        return MockBackend(latency=LatencyModel("fixed", median=0.0), **options)
+    return make
+
+@pytest.fixture
+def backend(instant_backend):
+    return instant_backend()
+
+@pytest.fixture
+def agent_manager(backend):
+    return AgentManager(max_retries=0, verbose=False, backend=backend)
@@ -0,0 +1,47 @@
+# tests/test_backends.py
+
+from agents import AgentManager
+from agents.prompts import get_prompt
+from utils.metrics import MetricsRegistry
+
+LONG_TEXT = "The patient was admitted with community-acquired pneumonia and treated with ceftriaxone. " * 80
+
+def test_prompt_cache_reports_cached_tokens_on_repeated_prefix(instant_backend):
+    backend = instant_backend(prompt_cache=True)
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend)
+    summarize = agent_manager.get_agent("summarize")
+
+    first = summarize.execute(LONG_TEXT)
+    second = summarize.execute(LONG_TEXT + " Discharged on day five.")
+
+    assert first.usage["cached_prompt_tokens"] == 0
+    assert 0 < second.usage["cached_prompt_tokens"] < second.usage["prompt_tokens"]
+    assert backend.stats["prefix_cache_hits"] == 1
+
+def test_short_prompts_are_never_cached(instant_backend):
+    backend = instant_backend(prompt_cache=True)
+    response = backend.client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}])
+    response = backend.client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}])
+    assert response.usage.prompt_tokens_details.cached_tokens == 0
+
+def test_prefix_cache_hits_reach_the_metrics(instant_backend):
+    metrics = MetricsRegistry()
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(prompt_cache=True), metrics=metrics)
+    summarize = agent_manager.get_agent("summarize")
+    first = summarize.execute(LONG_TEXT)
+    second = summarize.execute(LONG_TEXT + " Discharged on day five.")
+    prefix_cache = metrics.snapshot()[summarize.name]["prefix_cache"]
+    cached = second.usage["cached_prompt_tokens"]
+    assert prefix_cache["calls"] == 2 and prefix_cache["hits"] == 1 and prefix_cache["hit_rate"] == 0.5
+    assert prefix_cache["cached_tokens"] == cached
+    assert prefix_cache["cached_token_share"] == round(cached / (first.usage["prompt_tokens"] + second.usage["prompt_tokens"]), 4)
+    assert f'agent_prefix_cache_requests_total{{agent="{summarize.name}",result="hit"}} 1' in metrics.to_prometheus()
+
+def test_revision_prompts_share_one_prefix(agent_manager):
+    refiner = agent_manager.get_agent("refiner")
+    summary, _ = refiner.build_revision_request("A summary.", ["Too vague"], "The source.", "summary of a medical text")
+    record, _ = refiner.build_revision_request("A record.", ["Names left in"], None, "sanitized medical record")
+    # The system message is one shared object and the instructions come before anything that varies
+    assert summary[0] is record[0]
+    prefix = get_prompt("refiner.revision").prefix
+    assert summary[1]["content"].startswith(prefix) and record[1]["content"].startswith(prefix)
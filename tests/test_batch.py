@@ -0,0 +1,37 @@
+# tests/test_batch.py
+
+import asyncio
+import json
+
+from agents import AgentManager
+from pipeline.batch import run_batch
+
+def write_lines(path, values):
+    path.write_text("".join(json.dumps(value) + "\n" for value in values), encoding="utf-8")
+
+def read_lines(path):
+    return path.read_text(encoding="utf-8").splitlines()
+
+def test_resume_skips_items_already_written(tmp_path, instant_backend):
+    inputs, output = tmp_path / "notes.jsonl", tmp_path / "out.jsonl"
+    write_lines(inputs, [{"id": f"note-{index}", "text": f"Patient {index} stable on metformin."} for index in range(3)])
+    write_lines(output, [{"id": "note-0", "status": "ok"}, {"id": "note-1", "status": "error", "error": "timeout"}])
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "note-2", "sta')  # cut off by a crash
+
+    backend = instant_backend()
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend)
+    stats = asyncio.run(run_batch(agent_manager, "summarize", str(inputs), str(output), concurrency=2))
+
+    assert (stats["ok"], stats["error"], stats["skipped"]) == (2, 0, 1)
+    assert backend.stats["requests"] == 4  # summary and validation for the two unfinished items
+    lines = read_lines(output)
+    assert lines[2] == '{"id": "note-2", "sta'  # the next record starts on a line of its own
+    records = [json.loads(line) for line in lines[3:]]
+    assert sorted(record["id"] for record in records) == ["note-1", "note-2"]
+    assert all(record["status"] == "ok" and record["outputs"]["summary"] for record in records)
+
+    # Once everything is written a rerun has nothing left to do
+    stats = asyncio.run(run_batch(agent_manager, "summarize", str(inputs), str(output)))
+    assert (stats["ok"], stats["skipped"]) == (0, 3)
+    assert backend.stats["requests"] == 4
@@ -0,0 +1,72 @@
+# tests/test_cache.py
+
+import sqlite3
+
+import pytest
+
+from utils.at_rest import AtRestPolicy
+from utils.cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "Summarize: patient stable."}]
+
+def test_lookup_misses_then_hits():
+    cache = ResponseCache()
+    key, value = cache.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)
+    assert key is not None and value is None
+    cache.store(key, {"text": "Stable."})
+    assert cache.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150) == (key, {"text": "Stable."})
+    # Any part of the request changes the key
+    assert cache.lookup("summarize", "gpt-4", MESSAGES, 0.3, 200)[1] is None
+    assert cache.snapshot() == {"summarize": {"hits": 1, "misses": 2, "bypassed": 0}}
+
+def test_high_temperature_bypasses_unless_forced():
+    assert ResponseCache().lookup("write_article", "gpt-4", MESSAGES, 0.9, 150) == (None, None)
+    assert ResponseCache(force=True).lookup("write_article", "gpt-4", MESSAGES, 0.9, 150)[0] is not None
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(max_entries=2)
+    keys = []
+    for text in ("a", "b", "c"):
+        key, _ = cache.lookup("summarize", "gpt-4", [{"role": "user", "content": text}], 0.3, 150)
+        cache.store(key, text)
+        keys.append(key)
+    assert cache.memory.get(keys[0]) is None
+    assert cache.memory.get(keys[2]) == "c"
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(disk_path=path)
+    key, _ = cache.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)
+    cache.store(key, {"text": "Stable."})
+    restarted = ResponseCache(disk_path=path)
+    assert restarted.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)[1] == {"text": "Stable."}
+    assert restarted.memory.get(key) == {"text": "Stable."}  # promoted into memory
+
+class XorCipher:
+    """Stands in for cryptography.fernet.Fernet: anything with encrypt(bytes) and decrypt(bytes)."""
+
+    def encrypt(self, data):
+        return bytes(byte ^ 0x5A for byte in data)
+
+    decrypt = encrypt
+
+def disk_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT key, value FROM responses").fetchall()
+
+def test_disk_tier_stores_no_request_key_and_encrypts_with_a_cipher(tmp_path):
+    plain_path, sealed_path = str(tmp_path / "plain.db"), str(tmp_path / "sealed.db")
+    for path, at_rest in ((plain_path, None), (sealed_path, AtRestPolicy(cipher=XorCipher()))):
+        cache = ResponseCache(disk_path=path, at_rest=at_rest)
+        key, _ = cache.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)
+        cache.store(key, {"text": "John Doe is stable."})
+
+    [(stored_key, value)] = disk_rows(plain_path)
+    assert stored_key != key and value == '{"text": "John Doe is stable."}'
+    [(_, value)] = disk_rows(sealed_path)
+    assert isinstance(value, bytes) and b"John Doe" not in value
+
+    restarted = ResponseCache(disk_path=sealed_path, at_rest=AtRestPolicy(cipher=XorCipher()))
+    assert restarted.lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)[1] == {"text": "John Doe is stable."}
+    with pytest.raises(ValueError):
+        ResponseCache(disk_path=sealed_path).lookup("summarize", "gpt-4", MESSAGES, 0.3, 150)
@@ -0,0 +1,34 @@
+# tests/test_chunking.py
+
+from agents.chunking import split_into_chunks, split_sections
+
+def words(text):
+    return len(text.split())
+
+SECTION = " ".join(f"Sentence {index} of the history is here." for index in range(12))
+
+def note(plan="Continue current therapy."):
+    return f"HISTORY:\n{SECTION}\n\n{SECTION}\n\n## Medications\nMetformin 500 mg twice daily.\n\nPLAN:\n{plan}"
+
+def test_sections_start_at_headings():
+    assert [section.split("\n")[0] for section in split_sections(note())] == ["HISTORY:", "## Medications", "PLAN:"]
+
+def test_chunks_fit_the_budget_and_keep_every_word():
+    chunks = split_into_chunks(note(), 50, count=words)
+    assert all(words(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == note().split()
+
+def test_sections_are_never_merged():
+    before = split_into_chunks(note(), 200, count=words)
+    after = split_into_chunks(note("Stop metformin."), 200, count=words)
+    assert len(before) == 3
+    # Only the edited section's chunk changes, so the others stay cacheable
+    assert [a == b for a, b in zip(before, after)] == [True, True, False]
+
+def test_falls_back_to_sentences_then_words():
+    paragraph = " ".join(f"Sentence {index} is five words." for index in range(10))
+    assert split_into_chunks(paragraph, 12, count=words) == [
+        " ".join(f"Sentence {index} is five words." for index in (start, start + 1)) for start in range(0, 10, 2)
+    ]
+    run_on = " ".join(["word"] * 25)
+    assert [words(chunk) for chunk in split_into_chunks(run_on, 10, count=words)] == [10, 10, 5]
@@ -0,0 +1,95 @@
+# tests/test_dag.py
+
+import asyncio
+import time
+
+import pytest
+
+from pipeline.dag import Workflow
+
+DRAFT = "A short draft on sepsis."
+REFINED = "A refined article on sepsis."
+
+class FakeAgent:
+    """Answers `reply` after `delay` seconds through every call path a Workflow uses."""
+
+    def __init__(self, reply, delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+
+    def execute(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.reply
+
+    async def aexecute(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.reply
+
+    def stream_execute(self, **kwargs):
+        self.calls += 1
+        words = self.reply.split(" ")
+        for index, word in enumerate(words):
+            time.sleep(self.delay / len(words))
+            yield word if index == 0 else " " + word
+        return self.reply
+
+class FakeManager:
+    def __init__(self, draft_score, delays=None):
+        delays = delays or {}
+        self.agents = {
+            "write_article": FakeAgent(DRAFT, delays.get("write_article", 0.0)),
+            "write_article_validator": FakeAgent(f"Thorough. Rating: {draft_score}/5", delays.get("write_article_validator", 0.0)),
+            "refiner": FakeAgent(REFINED, delays.get("refiner", 0.0)),
+            "validator": FakeAgent("Clear and complete. Rating: 4/5", delays.get("validator", 0.0)),
+        }
+
+    def get_pipeline(self, name):
+        from agents.pipelines import PIPELINES
+        return PIPELINES[name]
+
+    def get_agent(self, name):
+        return self.agents[name]
+
+def run_article(agent_manager, mode, **options):
+    workflow = Workflow.from_pipeline(agent_manager, "article")
+    if mode == "async":
+        return asyncio.run(workflow.arun(agent_manager, {"topic": "Sepsis"}))
+    return workflow.run(agent_manager, {"topic": "Sepsis"}, **options)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_excellent_draft_cancels_refinement_and_its_validation(mode):
+    agent_manager = FakeManager(5, delays={"refiner": 0.3})
+    result = run_article(agent_manager, mode)
+    assert result.skipped == ["refined_article", "validation"]
+    assert result.outputs["refined_article"] == DRAFT
+    assert result.outputs["validation"] == result.outputs["draft_validation"]
+    assert agent_manager.agents["validator"].calls == 0
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_finished_refinement_is_validated_even_if_the_draft_scores_five(mode):
+    # The refiner wins the race and the final validation is under way when the draft's 5/5 arrives;
+    # the draft validation must not stand in for the refined article's
+    agent_manager = FakeManager(5, delays={"write_article_validator": 0.2, "validator": 0.4})
+    result = run_article(agent_manager, mode)
+    assert result.skipped == []
+    assert result.outputs["refined_article"] == REFINED
+    assert result.outputs["validation"] == "Clear and complete. Rating: 4/5"
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_good_draft_is_refined_and_validated(mode):
+    agent_manager = FakeManager(3)
+    result = run_article(agent_manager, mode)
+    assert result.skipped == []
+    assert all(agent.calls == 1 for agent in agent_manager.agents.values())
+
+def test_streamed_refinement_is_cancelled_by_an_excellent_draft():
+    agent_manager = FakeManager(5, delays={"write_article_validator": 0.05, "refiner": 1.0})
+    events = []
+    result = run_article(agent_manager, "sync", stream=("refined_article",),
+                         on_event=lambda kind, output, payload: events.append((kind, output)))
+    assert result.skipped == ["refined_article", "validation"]
+    assert ("started", "refined_article") in events and ("skipped", "refined_article") in events
+    assert ("completed", "refined_article") not in events
@@ -0,0 +1,76 @@
+# tests/test_map_reduce.py
+
+import asyncio
+
+import pytest
+
+from agents import AgentManager, LatencyModel, MockBackend
+from agents.backends import default_reply
+from utils.near_duplicate import NearDuplicateCache
+from utils.tokens import TokenBudgetExceeded, count_message_tokens
+
+DOCUMENT = "\n\n".join(
+    f"SECTION {part}:\n" + " ".join(f"Visit {part}.{line}: blood pressure {118 + line}/78, no new complaints." for line in range(25))
+    for part in range(1, 7)
+)
+
+def summarizer(backend, **options):
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend, **options)
+    agent = agent_manager.get_agent("summarize")
+    agent.long_document_tokens = 400
+    agent.chunk_tokens = 300
+    return agent
+
+def recording_backend(latency=0.0, reply_tokens=120):
+    prompts = []
+
+    def reply(messages, max_tokens, rng):
+        prompts.append(messages)
+        return default_reply(messages, max_tokens, rng, reply_tokens=reply_tokens)
+
+    return MockBackend(latency=LatencyModel("fixed", median=latency), reply=reply), prompts
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_result_is_charged_for_every_map_and_reduce_call(mode):
+    backend, prompts = recording_backend(latency=0.02)
+    agent = summarizer(backend)
+    result = agent.execute(DOCUMENT) if mode == "sync" else asyncio.run(agent.aexecute(DOCUMENT))
+
+    # Every section is mapped (in parallel), then the digests are reduced in one or more rounds
+    assert backend.stats["requests"] == len(prompts) > 6
+    assert result.usage == {"prompt_tokens": agent.usage.prompt_tokens, "completion_tokens": agent.usage.completion_tokens}
+    assert agent.usage.calls == len(prompts)
+    # Map calls, then at least one reduce call after them
+    assert result.latency >= 0.04
+
+def test_digests_are_reused_by_a_digesting_validator():
+    backend, prompts = recording_backend()
+    agent = summarizer(backend)
+    digests = agent.chunk_digests(DOCUMENT)
+    assert len(digests) == len(prompts) >= 6
+    assert agent.chunk_digests(DOCUMENT) == digests and len(prompts) == len(digests)
+
+def test_unchanged_long_document_reuses_its_summary():
+    backend, prompts = recording_backend()
+    agent = summarizer(backend, near_duplicates=NearDuplicateCache(threshold=0.8))
+    first = agent.execute(DOCUMENT)
+    calls = len(prompts)
+
+    again = agent.execute(DOCUMENT + "\n")
+    assert again.near_duplicate["mode"] == "reuse" and again.text == first.text and len(prompts) == calls
+
+    # A changed value is summarized again, section by section
+    changed = agent.execute(DOCUMENT.replace("Visit 3.4: blood pressure 122/78", "Visit 3.4: blood pressure 182/98"))
+    assert changed.near_duplicate is None and len(prompts) > calls
+
+def test_map_and_reduce_prompts_respect_the_prompt_budget():
+    backend, prompts = recording_backend(reply_tokens=40)
+    agent = summarizer(backend)
+    agent.chunk_tokens = 1500
+    agent.max_prompt_tokens = 300
+    agent.execute(DOCUMENT)
+    assert prompts and all(count_message_tokens(messages, agent.model) <= 300 for messages in prompts)
+
+    agent.max_prompt_tokens = 20
+    with pytest.raises(TokenBudgetExceeded):
+        agent.execute(DOCUMENT.replace("SECTION 1", "SECTION ONE"))
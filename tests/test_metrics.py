@@ -0,0 +1,89 @@
+# tests/test_metrics.py
+
+import json
+
+import pytest
+
+from agents import AgentManager
+from utils.metrics import Histogram, MetricsRegistry
+
+def test_quantiles_interpolate_inside_the_bucket():
+    histogram = Histogram(buckets=(1.0, 2.0, 3.0, 4.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 2.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == pytest.approx(1.0)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(3.0)
+    assert histogram.summary() == {"count": 4, "mean": 1.5, "p50": 1.5, "p95": 2.8, "p99": 2.96}
+    # Past the last bucket there is nothing to interpolate towards
+    histogram.observe(10.0)
+    assert histogram.quantile(1.0) == 4.0
+
+def recorded():
+    registry = MetricsRegistry()
+    registry.record_call("summarize", 0.3, 2, 100, 20, model="gpt-4", cached_tokens=64)
+    registry.record_call("summarize", 1.2, 1, 50, 10, ttft=0.2, model="gpt-4o-mini", cached_tokens=0)
+    registry.record_error("summarize", "transient", TimeoutError())
+    registry.record_failure("validator", 3.0, 3)
+    registry.record_cache_hit("validator")
+    return registry
+
+def samples(text):
+    """{metric{labels}: value} for every sample line, checking each metric was declared first."""
+    declared, values = set(), {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            declared.add(line.split()[2])
+            continue
+        if line.startswith("#"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        metric = name.split("{")[0]
+        assert metric in declared or metric.rsplit("_", 1)[0] in declared
+        values[name] = float(value)
+    return values
+
+def test_prometheus_export():
+    values = samples(recorded().to_prometheus())
+    assert values['agent_requests_total{agent="summarize",outcome="ok"}'] == 2
+    assert values['agent_requests_total{agent="validator",outcome="error"}'] == 1
+    assert values['agent_requests_total{agent="validator",outcome="cached"}'] == 1
+    assert values['agent_request_latency_seconds_bucket{agent="summarize",le="0.25"}'] == 0
+    assert values['agent_request_latency_seconds_bucket{agent="summarize",le="0.5"}'] == 1
+    assert values['agent_request_latency_seconds_bucket{agent="summarize",le="2.5"}'] == 2
+    assert values['agent_request_latency_seconds_bucket{agent="summarize",le="+Inf"}'] == 2
+    assert values['agent_request_latency_seconds_sum{agent="summarize"}'] == pytest.approx(1.5)
+    assert values['agent_time_to_first_token_seconds_count{agent="summarize"}'] == 1
+    assert values['agent_retries_total{agent="summarize"}'] == 1
+    assert values['agent_retries_total{agent="validator"}'] == 2
+    assert values['agent_errors_total{agent="summarize",category="transient",type="TimeoutError"}'] == 1
+    assert values['agent_tokens_total{agent="summarize",kind="prompt"}'] == 150
+    assert values['agent_model_requests_total{agent="summarize",model="gpt-4o-mini"}'] == 1
+    assert values['agent_prefix_cache_requests_total{agent="summarize",result="hit"}'] == 1
+    assert values['agent_cached_prompt_tokens_total{agent="summarize"}'] == 64
+
+def test_json_export_matches_the_snapshot(tmp_path):
+    registry = recorded()
+    snapshot = registry.snapshot()
+    assert json.loads(registry.to_json()) == snapshot
+    summarize = snapshot["summarize"]
+    assert summarize["requests"] == {"ok": 2}
+    assert summarize["errors"] == {"transient:TimeoutError": 1}
+    assert summarize["models"] == {"gpt-4": 1, "gpt-4o-mini": 1}
+    assert summarize["prefix_cache"] == {"calls": 2, "hits": 1, "hit_rate": 0.5, "cached_tokens": 64, "cached_token_share": 0.4267}
+    registry.write(str(tmp_path / "metrics.json"))
+    registry.write(str(tmp_path / "metrics.prom"))
+    assert json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8")) == snapshot
+    assert (tmp_path / "metrics.prom").read_text(encoding="utf-8") == registry.to_prometheus()
+
+def test_agent_calls_are_recorded(instant_backend):
+    registry = MetricsRegistry()
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(), metrics=registry)
+    agent = agent_manager.get_agent("summarize")
+    reply = agent.execute("Patient stable on metformin.")
+    metrics = registry.snapshot()[agent.name]
+    assert metrics["requests"] == {"ok": 1}
+    assert metrics["latency_seconds"]["count"] == 1
+    assert metrics["prompt_tokens"] == reply.usage["prompt_tokens"]
+    assert metrics["completion_tokens"] == reply.usage["completion_tokens"]
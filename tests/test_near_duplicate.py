@@ -0,0 +1,57 @@
+# tests/test_near_duplicate.py
+
+import pytest
+
+from agents import AgentManager
+from agents.backends import default_reply
+from utils.near_duplicate import NearDuplicateCache
+
+NOTE = " ".join(
+    f"Visit {day}: the patient reports stable blood pressure, no chest pain and good adherence to the diet plan."
+    for day in range(1, 41)
+) + (" Continue lisinopril 10 mg daily and recheck the basic metabolic panel in two weeks."
+     " Next appointment on 03/14/2026.")
+
+def recording_backend(instant_backend):
+    prompts = []
+
+    def reply(messages, max_tokens, rng):
+        prompts.append(messages[-1]["content"])
+        return default_reply(messages, max_tokens, rng)
+
+    return instant_backend(reply=reply), prompts
+
+def manager(backend):
+    return AgentManager(max_retries=0, verbose=False, backend=backend, near_duplicates=NearDuplicateCache(threshold=0.8))
+
+def test_lookup_finds_similar_notes_only():
+    cache = NearDuplicateCache(threshold=0.8)
+    cache.store("SummarizeTool", NOTE, "summary")
+    match = cache.lookup("SummarizeTool", NOTE.replace("two weeks", "three weeks"))
+    assert match is not None and match.result == "summary" and match.similarity >= 0.8
+    assert cache.lookup("SummarizeTool", "An unrelated discharge letter about a fractured wrist.") is None
+    assert cache.lookup("SanitizeDataTool", NOTE) is None
+
+@pytest.mark.parametrize("before, after", [("10 mg", "40 mg"), ("03/14/2026", "03/21/2026")])
+def test_changed_sentence_is_never_answered_with_the_old_summary(instant_backend, before, after):
+    backend, prompts = recording_backend(instant_backend)
+    summarize = manager(backend).get_agent("summarize")
+    first = summarize.execute(NOTE)
+    changed = summarize.execute(NOTE.replace(before, after))
+
+    # The similarity estimate barely sees the edit; only the sentence diff can tell it apart
+    assert changed.near_duplicate["similarity"] >= 0.95
+    assert changed.near_duplicate["mode"] == "diff"
+    assert changed.text != first.text
+    assert backend.stats["requests"] == 2
+    edited = next(sentence for sentence in NOTE.split(". ") if before in sentence)
+    assert f"+ {edited.replace(before, after)}" in prompts[-1] and f"- {edited}" in prompts[-1]
+
+def test_unchanged_note_reuses_the_summary(backend):
+    summarize = manager(backend).get_agent("summarize")
+    first = summarize.execute(NOTE)
+    again = summarize.execute(NOTE + " ")
+
+    assert again.near_duplicate["mode"] == "reuse"
+    assert again.text == first.text
+    assert backend.stats["requests"] == 1
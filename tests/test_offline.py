@@ -0,0 +1,94 @@
+# tests/test_offline.py
+
+import json
+import sys
+
+import pytest
+
+from agents import AgentManager, OfflineBackend
+from agents.backends import default_reply
+from pipeline import __main__ as cli
+from pipeline.offline import OfflineBatchJob, simulate_batch
+
+def write_inputs(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+    return str(path)
+
+def run_to_completion(job, backend, job_dir):
+    stages = 0
+    path, count = job.export()
+    while path is not None:
+        results = str(job_dir / f"stage-{stages + 1}.results.jsonl")
+        simulate_batch(path, results, backend)
+        job.ingest(results)
+        stages += 1
+        path, count = job.export() if not job.done else (None, 0)
+    return stages
+
+def test_round_trip_matches_the_batch_record_shape(tmp_path, instant_backend):
+    # The job only builds prompts and parses result files, so it never needs a live client
+    agent_manager = AgentManager(verbose=False, backend=OfflineBackend())
+    inputs = write_inputs(tmp_path / "notes.jsonl", [{"id": "a:1", "text": "Patient stable on metformin."},
+                                                     {"text": "Follow-up in two weeks."}])
+    job = OfflineBatchJob.create(agent_manager, "summarize", inputs, str(tmp_path / "job"))
+    backend = instant_backend()
+    assert run_to_completion(OfflineBatchJob.load(agent_manager, job.job_dir), backend, tmp_path / "job") == 2
+    records = {record["id"]: record for record in OfflineBatchJob.load(agent_manager, job.job_dir).records()}
+    assert set(records) == {"a:1", "1"}
+    for record in records.values():
+        assert record["status"] == "ok"
+        assert record["outputs"]["summary"] and record["outputs"]["validation"]
+        assert record["usage"]["prompt_tokens"] > 0
+    assert backend.stats["requests"] == 4
+
+def test_failed_requests_drop_the_item(tmp_path, instant_backend):
+    agent_manager = AgentManager(verbose=False, backend=OfflineBackend())
+    inputs = write_inputs(tmp_path / "notes.jsonl", [{"text": "Note one."}, {"text": "Note two."}])
+    job = OfflineBatchJob.create(agent_manager, "summarize", inputs, str(tmp_path / "job"))
+    run_to_completion(job, instant_backend(error_rate=1.0), tmp_path / "job")
+    assert job.done
+    assert [record["status"] for record in job.records()] == ["error", "error"]
+
+def test_reexported_stage_lists_skipped_steps_once(tmp_path, instant_backend):
+    def reply(messages, max_tokens, rng):
+        text = default_reply(messages, max_tokens, rng)
+        if "Sepsis" in messages[-1]["content"]:
+            return text.replace("4/5", "5/5").replace('"score": 4', '"score": 5')
+        return text
+
+    agent_manager = AgentManager(verbose=False, backend=OfflineBackend())
+    inputs = write_inputs(tmp_path / "topics.jsonl", [{"id": "excellent", "topic": "Sepsis"}, {"id": "good", "topic": "Asthma"}])
+    job = OfflineBatchJob.create(agent_manager, "article", inputs, str(tmp_path / "job"))
+    backend = instant_backend(reply=reply)
+    for stage in (1, 2):
+        path, _ = job.export()
+        simulate_batch(path, str(tmp_path / f"stage-{stage}.results.jsonl"), backend)
+        job.ingest(str(tmp_path / f"stage-{stage}.results.jsonl"))
+    # The final validation goes out for the refined article only; exporting the stage again must not repeat the skip
+    job.export()
+    path, count = job.export()
+    assert count == 1
+    simulate_batch(path, str(tmp_path / "stage-3.results.jsonl"), backend)
+    job.ingest(str(tmp_path / "stage-3.results.jsonl"))
+    records = {record["id"]: record for record in job.records()}
+    assert records["excellent"]["skipped"] == ["refined_article", "validation"]
+    assert records["excellent"]["outputs"]["validation"] == records["excellent"]["outputs"]["draft_validation"]
+    assert "skipped" not in records["good"]
+
+def test_cli_runs_without_an_api_key_and_rejects_an_early_ingest(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    inputs = write_inputs(tmp_path / "notes.jsonl", [{"text": "Note one."}])
+    job_dir = str(tmp_path / "job")
+    monkeypatch.setattr(sys, "argv", ["pipeline", "export", "--pipeline", "summarize", "--input", inputs, "--job", job_dir])
+    cli.main()
+    assert (tmp_path / "job" / "stage-1.requests.jsonl").exists()
+
+    fresh_dir = str(tmp_path / "fresh")
+    OfflineBatchJob.create(AgentManager(verbose=False, backend=OfflineBackend()), "summarize", inputs, fresh_dir)
+    monkeypatch.setattr(sys, "argv", ["pipeline", "ingest", "--job", fresh_dir, "--results", str(tmp_path / "none.jsonl")])
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main()
+    assert exit_info.value.code == 2
+    assert "call export() first" in capsys.readouterr().err
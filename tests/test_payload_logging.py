@@ -0,0 +1,90 @@
+# tests/test_payload_logging.py
+
+import threading
+
+from loguru import logger
+
+from agents.payload_logging import LogPayload, PayloadLogPolicy
+from utils.logger import BackgroundFileSink
+
+NOTE = "Patient SSN 123-45-6789, reachable at jane.doe@example.com. " + "Stable vitals. " * 100
+
+def test_render_truncates_and_redacts():
+    text = PayloadLogPolicy(max_chars=80).render(NOTE)
+    assert "123-45-6789" not in text and "[SSN]" in text and "[EMAIL]" in text
+    assert text.endswith(f"... [{len(NOTE) - 80} chars truncated]")
+
+def test_sampling_is_deterministic_per_prompt():
+    policy = PayloadLogPolicy(sample_rate=0.5)
+    prompts = [f"prompt {index}" for index in range(200)]
+    first = [policy.sampled(prompt) for prompt in prompts]
+    assert first == [policy.sampled(prompt) for prompt in prompts]
+    assert 50 < sum(first) < 150
+
+def test_background_sink_renders_payloads_on_its_writer_thread(tmp_path):
+    rendered_on = []
+
+    class RecordingPolicy(PayloadLogPolicy):
+        def render(self, text):
+            rendered_on.append(threading.current_thread().name)
+            return super().render(text)
+
+    path = tmp_path / "debug.log"
+    handler = logger.add(BackgroundFileSink(str(path)), level="DEBUG", format="{level} {message}",
+                         filter=lambda record: "payload" in record["extra"])
+    try:
+        logger.debug("[Agent] Request:", payload=LogPayload(RecordingPolicy(max_chars=80), [("user: ", NOTE)]))
+    finally:
+        logger.remove(handler)  # stops the sink once its queue is drained
+
+    assert rendered_on and set(rendered_on) == {"log-writer"}  # never on the caller
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "DEBUG [Agent] Request:"
+    assert lines[1].startswith("  user: Patient SSN [SSN]") and "chars truncated" in lines[1]
+
+class Line(str):
+    """A formatted line carrying a payload, as loguru hands it to a sink."""
+
+    def __new__(cls, text, payload):
+        line = super().__new__(cls, text)
+        line.record = {"extra": {"payload": payload}}
+        return line
+
+class Payload:
+    def __init__(self, render):
+        self.render = render
+
+def test_background_sink_survives_a_failing_line(tmp_path, capsys):
+    def fail():
+        raise RuntimeError("render failed")
+
+    path = tmp_path / "debug.log"
+    sink = BackgroundFileSink(str(path))
+    sink.write("first\n")
+    sink.write(Line("broken\n", Payload(fail)))
+    sink.write("last\n")
+    sink.stop()
+    assert path.read_text(encoding="utf-8").splitlines() == ["first", "last"]
+    assert sink.errors == 1
+    assert "render failed" in capsys.readouterr().err
+
+def test_background_sink_drops_lines_when_its_queue_is_full(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return "body"
+
+    path = tmp_path / "debug.log"
+    sink = BackgroundFileSink(str(path), max_queued=3)
+    sink.write(Line("slow\n", Payload(block)))
+    assert started.wait(5)
+    for index in range(5):
+        sink.write(f"line {index}\n")  # never blocks the caller
+    release.set()
+    sink.stop()
+    assert sink.dropped == 2
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[:5] == ["slow", "body", "line 0", "line 1", "line 2"]
+    assert lines[5].endswith("BackgroundFileSink dropped 2 log lines: writer queue full")
@@ -0,0 +1,84 @@
+# tests/test_phi_scrubber.py
+
+import pytest
+
+from agents import AgentManager, PHIScrubber
+from agents.backends import default_reply
+
+def restore(result, original):
+    """Put the original text back in place of each placeholder, using the spans' offsets."""
+    parts = []
+    position = 0
+    for start, end, label in result.spans:
+        placeholder = result.text.index(f"[{label}]", position)
+        parts.append(result.text[position:placeholder] + original[start:end])
+        position = placeholder + len(label) + 2
+    return "".join(parts) + result.text[position:]
+
+@pytest.mark.parametrize("value, label", [
+    ("123-45-6789", "SSN"),
+    ("MRN: 00482913", "MRN"),
+    ("medical record number #AB123456", "MRN"),
+    ("(555) 123-4567", "PHONE"),
+    ("+1 555.123.4567", "PHONE"),
+    ("jane.roe@example.org", "EMAIL"),
+    ("03/14/2026", "DATE"),
+    ("2026-03-14", "DATE"),
+    ("March 14th, 2026", "DATE"),
+])
+def test_patterns(value, label):
+    text = f"Seen today; {value} on file."
+    result = PHIScrubber().scrub(text)
+    assert result.text == f"Seen today; [{label}] on file."
+    [(start, end, found)] = result.spans
+    assert (text[start:end], found) == (value, label)
+
+def test_text_without_phi_is_unchanged():
+    text = "Blood pressure stable, continue current dose."
+    assert PHIScrubber(names=["John Doe"]).scrub(text) == (text, [])
+
+def test_dictionary_names_and_facilities():
+    scrubber = PHIScrubber(names=["John Doe", "John"], facilities=["Mercy General", "Mercy General Hospital"])
+    text = "JOHN DOE was moved to mercy general hospital. Johnson and Mercy Generals are not matches."
+    result = scrubber.scrub(text)
+    # Case-insensitive, whole words only, and the longest of overlapping terms wins
+    assert result.text == "[NAME] was moved to [FACILITY]. Johnson and Mercy Generals are not matches."
+    assert [text[start:end] for start, end, _ in result.spans] == ["JOHN DOE", "mercy general hospital"]
+
+def test_adjacent_and_overlapping_matches():
+    scrubber = PHIScrubber(names=["John Doe", "Doe", "Jane Roe", "john"], facilities=["Roe Clinic"])
+    result = scrubber.scrub("John Doe Jane Roe Clinic; john.doe@example.org")
+    assert result.text == "[NAME] [NAME] Clinic; [EMAIL]"
+    assert [label for _, _, label in result.spans] == ["NAME", "NAME", "EMAIL"]
+
+def test_offsets_survive_characters_whose_lower_case_is_longer():
+    # "İ".lower() is two characters; offsets must still point into the original text
+    scrubber = PHIScrubber(names=["John Doe", "İpek Yılmaz"])
+    text = "İİ John Doe, İpek Yılmaz and IPEK ... call 555-123-4567."
+    result = scrubber.scrub(text)
+    assert result.text == "İİ [NAME], [NAME] and IPEK ... call [PHONE]."
+    assert [text[start:end] for start, end, _ in result.spans] == ["John Doe", "İpek Yılmaz", "555-123-4567"]
+    assert restore(result, text) == text
+
+def test_restore_round_trip():
+    scrubber = PHIScrubber(names=["John Doe"], facilities=["St. Mary's"])
+    text = "John Doe (MRN 00482913) was admitted to St. Mary's on 2026-03-14; call 555-123-4567."
+    result = scrubber.scrub(text)
+    assert "John Doe" not in result.text and "00482913" not in result.text
+    assert restore(result, text) == text
+
+def test_sanitize_tool_sends_only_scrubbed_text(instant_backend):
+    prompts = []
+
+    def reply(messages, max_tokens, rng):
+        prompts.append(messages[-1]["content"])
+        return default_reply(messages, max_tokens, rng)
+
+    scrubber = PHIScrubber(names=["John Doe"])
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(reply=reply), phi_scrubber=scrubber)
+    text = "John Doe, SSN 123-45-6789, seen 03/14/2026 for chest pain."
+    agent_manager.get_agent("sanitize_data").execute(text)
+
+    [prompt] = prompts
+    assert "[NAME], SSN [SSN], seen [DATE] for chest pain." in prompt
+    assert not any(value in prompt for value in ("John Doe", "123-45-6789", "03/14/2026"))
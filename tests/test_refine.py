@@ -0,0 +1,61 @@
+# tests/test_refine.py
+
+import asyncio
+import json
+
+import pytest
+
+from agents import AgentManager
+from agents.backends import default_reply
+from pipeline.refine import RefineLoop
+
+NOTE = {"text": "Patient admitted with pneumonia, treated with ceftriaxone and discharged on day five."}
+
+def scored_backend(instant_backend, scores):
+    """Validators answer the given scores in turn (repeating the last); everything else gets the default reply."""
+    scores = list(scores)
+
+    def reply(messages, max_tokens, rng):
+        text = default_reply(messages, max_tokens, rng)
+        if not text.startswith("{"):
+            return text
+        score = scores.pop(0) if len(scores) > 1 else scores[0]
+        return json.dumps({"score": score, "issues": [f"Scored {score}"], "phi": []})
+    return instant_backend(reply=reply)
+
+def refine(backend, **options):
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend)
+    return asyncio.run(RefineLoop.from_pipeline(agent_manager, "summarize", **options).arun(agent_manager, NOTE))
+
+def test_good_first_pass_is_not_revised(instant_backend):
+    backend = scored_backend(instant_backend, [4])
+    result = refine(backend, threshold=4)
+    assert (result.iterations, result.scores, result.stopped, result.tokens) == (0, [4], "threshold", 0)
+    assert backend.stats["requests"] == 2
+
+def test_loop_stops_once_the_threshold_is_reached(instant_backend):
+    backend = scored_backend(instant_backend, [2, 3, 5, 1])
+    result = refine(backend, threshold=4, max_iterations=5)
+    assert (result.iterations, result.scores, result.stopped) == (2, [2, 3, 5], "threshold")
+    assert json.loads(result.outputs["validation"])["score"] == 5
+    assert backend.stats["requests"] == 2 + 2 * 2
+
+def test_best_version_is_kept_when_revisions_run_out(instant_backend):
+    backend = scored_backend(instant_backend, [3, 2])
+    first = refine(scored_backend(instant_backend, [3]), threshold=4, max_iterations=0)
+    result = refine(backend, threshold=4, max_iterations=2)
+    assert (result.iterations, result.scores, result.stopped) == (2, [3, 2, 2], "max_iterations")
+    assert result.outputs["summary"] == first.outputs["summary"]
+    assert json.loads(result.outputs["validation"])["score"] == 3
+
+def test_token_cap_stops_before_a_revision_would_overspend(instant_backend):
+    backend = scored_backend(instant_backend, [2])
+    result = refine(backend, threshold=4, max_iterations=5, max_tokens=1)
+    # The first revision shows what one costs; a second would take the revisions past the cap
+    assert (result.iterations, result.stopped) == (1, "token_budget")
+    assert result.tokens > 1
+    assert backend.stats["requests"] == 2 + 2
+
+def test_pipelines_without_a_refine_spec_are_rejected(agent_manager):
+    with pytest.raises(ValueError):
+        RefineLoop.from_pipeline(agent_manager, "unknown")
@@ -0,0 +1,113 @@
+# tests/test_retry.py
+
+import time
+
+import httpx
+import openai
+import pytest
+
+from agents import AgentManager
+
+from utils.retry import (FATAL, RATE_LIMIT, TRANSIENT, CircuitBreaker, CircuitOpenError, RetryPolicy,
+                         classify_error, retry_after_seconds)
+
+def status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://test/v1/chat/completions"))
+    error_class = {429: openai.RateLimitError, 500: openai.InternalServerError, 400: openai.BadRequestError}[status]
+    return error_class("error", response=response, body=None)
+
+def test_classify_error():
+    assert classify_error(status_error(429)) == RATE_LIMIT
+    assert classify_error(status_error(500)) == TRANSIENT
+    assert classify_error(status_error(400)) == FATAL
+    assert classify_error(TimeoutError()) == TRANSIENT
+    assert classify_error(ValueError()) == FATAL
+
+def test_backoff_is_jittered_within_bounds():
+    policy = RetryPolicy(base_delay=1.0, max_delay=20.0)
+    assert all(0 <= policy.delay(attempt) <= min(20.0, 2 ** (attempt - 1)) for attempt in range(1, 8))
+
+def test_retry_after_is_honoured_up_to_the_cap():
+    policy = RetryPolicy(base_delay=1.0, max_retry_after=10.0)
+    assert retry_after_seconds(status_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert 2.0 <= policy.delay(1, status_error(429, {"retry-after": "2"})) <= 2.3
+    assert 10.0 <= policy.delay(1, status_error(429, {"retry-after": "10"})) <= 11.05
+    # A wait longer than the cap is not slept through: the call fails instead
+    assert policy.delay(1, status_error(429, {"retry-after": "60"})) is None
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_breaker_cycles_closed_open_half_open_closed():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    trip(breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()  # the trial
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_abandoned_trial_expires():
+    # A trial cancelled mid-call never reports back; the breaker must not stay half-open for good
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()  # a new trial
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_circuit_breaker_is_opt_in(backend):
+    assert AgentManager(verbose=False, backend=backend).circuit_breaker is None
+    breaker = CircuitBreaker()
+    agent_manager = AgentManager(verbose=False, backend=backend, circuit_breaker=breaker)
+    assert all(agent.circuit_breaker is breaker for agent in agent_manager.agents.values())
+
+def test_transient_errors_open_the_shared_circuit(instant_backend):
+    backend = instant_backend(error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    agent_manager = AgentManager(max_retries=4, verbose=False, backend=backend, circuit_breaker=breaker,
+                                 retry_policy=RetryPolicy(base_delay=0.0))
+    with pytest.raises(CircuitOpenError):
+        agent_manager.get_agent("summarize").call_openai([{"role": "user", "content": "Patient stable."}])
+    # The third attempt failed fast instead of reaching the upstream
+    assert backend.stats["requests"] == 2
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        agent_manager.get_agent("refiner").call_openai([{"role": "user", "content": "Patient stable."}])
+    assert backend.stats["requests"] == 2
+
+def test_only_an_upstream_answer_closes_the_circuit(backend):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    agent = AgentManager(verbose=False, backend=backend, circuit_breaker=breaker).get_agent("summarize")
+    breaker.record_failure()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # An error raised on our side says nothing about the upstream: the trial stays unresolved
+    with pytest.raises(ValueError):
+        agent._retry_delay(ValueError("bad input"), 1, time.monotonic())
+    assert breaker.state == "half_open"
+    with pytest.raises(openai.BadRequestError):
+        agent._retry_delay(status_error(400), 1, time.monotonic())
+    assert breaker.state == "closed"
@@ -0,0 +1,40 @@
+# tests/test_routing.py
+
+import json
+
+from agents import AgentManager, default_model_routes
+from agents.backends import default_reply
+
+LONG_NOTE = "The patient was admitted with community-acquired pneumonia and treated with ceftriaxone. " * 100
+
+def routed_manager(backend):
+    return AgentManager(max_retries=0, verbose=False, backend=backend,
+                        model_routes=default_model_routes(fast_model="gpt-4o-mini", strong_model="gpt-4"))
+
+def test_validators_and_short_notes_use_the_fast_model(instant_backend):
+    backend = instant_backend()
+    agent_manager = routed_manager(backend)
+    summary = agent_manager.get_agent("summarize").execute("Patient stable on metformin.")
+    verdict = agent_manager.get_agent("summarize_validator").execute(original_text="Patient stable on metformin.",
+                                                                     summary=summary.text)
+    assert summary.model == verdict.model == "gpt-4o-mini"
+    assert backend.stats["requests:gpt-4o-mini"] == 2
+    assert backend.stats["requests:gpt-4"] == 0
+
+def test_long_notes_go_straight_to_the_main_model(instant_backend):
+    backend = instant_backend()
+    summary = routed_manager(backend).get_agent("summarize").execute(LONG_NOTE)
+    assert summary.model == "gpt-4"
+    assert backend.stats["requests:gpt-4o-mini"] == 0
+
+def test_low_validator_score_escalates_to_the_main_model(instant_backend):
+    def reply(messages, max_tokens, rng):
+        text = default_reply(messages, max_tokens, rng)
+        return json.dumps(dict(json.loads(text), score=2)) if text.startswith("{") else text
+
+    backend = instant_backend(reply=reply)
+    verdict = routed_manager(backend).get_agent("summarize_validator").execute(
+        original_text="Patient stable on metformin.", summary="Patient unwell.")
+    assert verdict.model == "gpt-4"
+    assert backend.stats["requests:gpt-4o-mini"] == 1
+    assert backend.stats["requests:gpt-4"] == 1
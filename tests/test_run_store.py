@@ -0,0 +1,87 @@
+# tests/test_run_store.py
+
+import sqlite3
+
+import pytest
+
+from agents import AgentManager, PHIScrubber
+from pipeline.dag import Workflow
+from utils.at_rest import AtRestPolicy
+from utils.run_store import RunStore, step_fingerprint
+
+NOTE = "John Doe, SSN 123-45-6789, is stable on metformin."
+
+def test_fingerprint_follows_inputs_and_model(agent_manager):
+    agent = agent_manager.get_agent("summarize")
+    fingerprint = step_fingerprint(agent, {"text": "Patient stable on metformin."})
+    assert step_fingerprint(agent, {"text": "Patient stable on metformin."}) == fingerprint
+    assert step_fingerprint(agent, {"text": "Patient stable on insulin."}) != fingerprint
+    agent.model = "gpt-4o-mini"
+    assert step_fingerprint(agent, {"text": "Patient stable on metformin."}) != fingerprint
+
+def test_rerun_reuses_unchanged_steps(tmp_path, instant_backend):
+    backend = instant_backend()
+    store = RunStore(str(tmp_path / "runs.db"))
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend, run_store=store)
+    workflow = Workflow.from_pipeline(agent_manager, "summarize")
+
+    first = workflow.run(agent_manager, {"text": "Patient stable on metformin."})
+    assert first.reused == [] and backend.stats["requests"] == 2
+    second = workflow.run(agent_manager, {"text": "Patient stable on metformin."})
+    assert second.reused == ["summary", "validation"] and backend.stats["requests"] == 2
+    assert second.outputs == first.outputs
+
+    # A forced step executes again; the one before it is still reused
+    third = workflow.run(agent_manager, {"text": "Patient stable on metformin."}, rerun=("validation",))
+    assert third.reused == ["summary"] and backend.stats["requests"] == 3
+
+    changed = workflow.run(agent_manager, {"text": "Patient stable on insulin."})
+    assert changed.reused == [] and backend.stats["requests"] == 5
+
+    runs = store.runs(pipeline="summarize")
+    assert [run["id"] for run in runs] == [changed.run_id, third.run_id, second.run_id, first.run_id]
+    assert (runs[2]["ran"], runs[2]["reused"], runs[2]["status"]) == (0, 2, "ok")
+    reused = {step["output"]: step for step in store.steps(second.run_id)}
+    assert reused["summary"]["source_run"] == first.run_id
+    assert store.outputs(second.run_id) == second.outputs
+
+def test_failed_run_is_recorded(tmp_path, instant_backend):
+    store = RunStore(str(tmp_path / "runs.db"))
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(error_rate=1.0), run_store=store)
+    with pytest.raises(Exception):
+        Workflow.from_pipeline(agent_manager, "summarize").run(agent_manager, {"text": "Note."})
+    [run] = store.runs()
+    assert run["status"] == "error" and run["error"]
+
+class XorCipher:
+    def encrypt(self, data):
+        return bytes(byte ^ 0x5A for byte in data)
+
+    decrypt = encrypt
+
+def raw_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT inputs FROM runs").fetchall(), conn.execute("SELECT text FROM steps").fetchall()
+
+def test_inputs_are_hashed_or_scrubbed_and_outputs_encrypted(tmp_path, instant_backend):
+    path = str(tmp_path / "runs.db")
+    store = RunStore(path)
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(), run_store=store)
+    Workflow.from_pipeline(agent_manager, "summarize").run(agent_manager, {"text": NOTE})
+    [(inputs,)], _ = raw_rows(path)
+    assert "123-45-6789" not in inputs and store.runs()[0]["inputs"]["text"].startswith("sha256:")
+
+    path = str(tmp_path / "sealed.db")
+    at_rest = AtRestPolicy(scrubber=PHIScrubber(names=["John Doe"]), cipher=XorCipher())
+    store = RunStore(path, at_rest=at_rest)
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(), run_store=store)
+    workflow = Workflow.from_pipeline(agent_manager, "summarize")
+    first = workflow.run(agent_manager, {"text": NOTE})
+    [(inputs,)], steps = raw_rows(path)
+    assert store.runs()[0]["inputs"] == {"text": "[NAME], SSN [SSN], is stable on metformin."}
+    assert all(isinstance(text, bytes) and first.outputs["summary"].encode("utf-8") not in text for text, in steps)
+
+    # Encrypted outputs are still reused, and read back as text
+    second = workflow.run(agent_manager, {"text": NOTE})
+    assert second.reused == ["summary", "validation"] and second.outputs == first.outputs
+    assert store.outputs(second.run_id) == first.outputs
@@ -0,0 +1,122 @@
+# tests/test_single_flight.py
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agents import AgentManager
+from utils.single_flight import SingleFlight
+
+def test_concurrent_threads_share_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "reply"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flights.do, "summarize", "key", fn) for _ in range(4)]
+        while flights.snapshot().get("summarize", {}).get("coalesced", 0) < 3:
+            threading.Event().wait(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+    assert len(calls) == 1
+    assert sorted(leader for _, leader in results) == [False, False, False, True]
+    assert {reply for reply, _ in results} == {"reply"}
+    assert flights.in_flight() == 0
+    # A finished flight is never joined: the next call runs again
+    assert flights.do("summarize", "key", lambda: "again") == ("again", True)
+
+def test_followers_share_the_leaders_error():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "summarize", "key", fail)
+        started.wait(5)
+        follower = pool.submit(flights.do, "summarize", "key", lambda: "unused")
+        while flights.snapshot()["summarize"]["coalesced"] < 1:
+            threading.Event().wait(0.001)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result()
+
+def test_async_call_survives_a_cancelled_leader():
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "reply"
+
+    async def main():
+        leader = asyncio.ensure_future(flights.ado("summarize", "key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.ado("summarize", "key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ("reply", False)
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+
+def test_async_call_is_cancelled_with_its_last_caller():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        callers = [asyncio.ensure_future(flights.ado("summarize", "key", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [1]
+    assert flights.in_flight() == 0
+
+def test_identical_agent_calls_send_one_request(instant_backend):
+    backend = instant_backend(seconds_per_token=0.0005)
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=backend, single_flight=SingleFlight())
+    agent = agent_manager.get_agent("summarize")
+
+    async def main():
+        return await asyncio.gather(*(agent.aexecute("Patient stable on metformin.") for _ in range(5)))
+
+    replies = asyncio.run(main())
+    assert backend.stats["requests"] == 1
+    assert len({reply.text for reply in replies}) == 1
+    assert agent_manager.single_flight.snapshot()[agent.name] == {"leaders": 1, "coalesced": 4}
+
+def test_coalescing_is_opt_in(instant_backend):
+    backend = instant_backend(seconds_per_token=0.0005)
+    agent = AgentManager(max_retries=0, verbose=False, backend=backend).get_agent("summarize")
+
+    async def main():
+        return await asyncio.gather(*(agent.aexecute("Patient stable on metformin.") for _ in range(3)))
+
+    replies = asyncio.run(main())
+    assert agent.single_flight is None
+    assert backend.stats["requests"] == 3
+    assert not any(reply.coalesced for reply in replies)
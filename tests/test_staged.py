@@ -0,0 +1,106 @@
+# tests/test_staged.py
+
+import asyncio
+
+import pytest
+
+from agents.pipelines import PIPELINES
+from pipeline.staged import StagedPipeline
+
+class GatedAgent:
+    """Answers once `gate` is open (immediately when there is none)."""
+
+    def __init__(self, reply, gate=None):
+        self.reply = reply
+        self.gate = gate
+        self.calls = 0
+
+    async def aexecute(self, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return self.reply
+
+class FakeManager:
+    def __init__(self, validator_gate=None):
+        self.agents = {
+            "summarize": GatedAgent("Stable."),
+            "summarize_validator": GatedAgent("Accurate. Rating: 5/5", validator_gate),
+        }
+
+    def get_pipeline(self, name):
+        return PIPELINES[name]
+
+    def get_agent(self, name):
+        return self.agents[name]
+
+def items(count):
+    return ({"id": index, "text": f"Note {index}: patient stable."} for index in range(count))
+
+def test_items_flow_through_every_stage(agent_manager):
+    records = []
+
+    async def sink(record):
+        records.append(record)
+
+    staged = StagedPipeline(agent_manager, "summarize", default_workers=3, report_interval=0)
+    stats = asyncio.run(staged.run(items(10), sink))
+
+    assert sorted(record["id"] for record in records) == list(range(10))
+    assert all(record["status"] == "ok" and set(record["outputs"]) == {"summary", "validation"} for record in records)
+    assert [(stage["stage"], stage["processed"], stage["failed"]) for stage in stats] == [
+        ("summarize", 10, 0), ("summarize_validator", 10, 0)]
+
+def test_full_queue_blocks_the_upstream_stage():
+    async def scenario():
+        gate = asyncio.Event()
+        agent_manager = FakeManager(validator_gate=gate)
+        staged = StagedPipeline(agent_manager, "summarize", default_workers=1, queue_size=2, report_interval=0)
+        records = []
+
+        async def sink(record):
+            records.append(record)
+
+        run = asyncio.ensure_future(staged.run(items(20), sink))
+        await asyncio.sleep(0.05)
+        # One validator call is held at the gate, two items wait in its queue and the summarizer
+        # is blocked putting a third; nothing further has been read from the input
+        summarized = agent_manager.agents["summarize"].calls
+        assert summarized <= 1 + 2 + 2
+        assert staged.stats[1].max_queue_depth <= 2
+        gate.set()
+        await run
+        return records
+
+    assert len(asyncio.run(scenario())) == 20
+
+def test_failed_run_cancels_every_stage():
+    async def scenario():
+        gate = asyncio.Event()
+        staged = StagedPipeline(FakeManager(validator_gate=gate), "summarize", default_workers=2, queue_size=1,
+                                report_interval=0.01)
+
+        async def sink(record):
+            pass
+
+        run = asyncio.ensure_future(staged.run(items(50), sink))
+        await asyncio.sleep(0.05)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        # No stage worker or reporter outlives the run
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
+
+def test_sink_error_shuts_the_pipeline_down(agent_manager):
+    async def sink(record):
+        raise OSError("disk full")
+
+    async def scenario():
+        staged = StagedPipeline(agent_manager, "summarize", default_workers=2, queue_size=1, report_interval=0)
+        with pytest.raises(OSError):
+            await staged.run(items(20), sink)
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
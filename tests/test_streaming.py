@@ -0,0 +1,38 @@
+# tests/test_streaming.py
+
+from agents import AgentManager
+from utils.cache import ResponseCache
+
+DRAFT = "Sepsis is a life-threatening organ dysfunction caused by a dysregulated host response to infection."
+
+def drain(stream):
+    """(deltas, return value) of a stream_execute/stream_openai generator."""
+    deltas = []
+    while True:
+        try:
+            deltas.append(next(stream))
+        except StopIteration as stop:
+            return deltas, stop.value
+
+def test_streamed_text_equals_the_non_streamed_reply(instant_backend):
+    calls = [("write_article", {"topic": "Sepsis", "outline": "Definition; Treatment"}), ("refiner", {"draft": DRAFT})]
+    for agent_name, kwargs in calls:
+        # Two backends with the same seed give the same reply to the same prompt
+        streamed_backend, plain_backend = instant_backend(), instant_backend()
+        streaming = AgentManager(max_retries=0, verbose=False, backend=streamed_backend).get_agent(agent_name)
+        plain = AgentManager(max_retries=0, verbose=False, backend=plain_backend).get_agent(agent_name)
+        deltas, streamed = drain(streaming.stream_execute(**kwargs))
+        reply = plain.execute(**kwargs)
+        assert len(deltas) > 1
+        assert "".join(deltas) == streamed.text == reply.text
+        assert streamed.usage["completion_tokens"] == reply.usage["completion_tokens"]
+        assert streamed_backend.stats["streamed"] == 1 and plain_backend.stats["streamed"] == 0
+
+def test_streamed_reply_fills_the_cache(instant_backend):
+    backend = instant_backend()
+    agent = AgentManager(max_retries=0, verbose=False, backend=backend, cache=ResponseCache()).get_agent("refiner")
+    _, streamed = drain(agent.stream_execute(draft=DRAFT))
+    assert agent.execute(draft=DRAFT).text == streamed.text
+    # A cached reply streams back as one delta
+    assert drain(agent.stream_execute(draft=DRAFT))[0] == [streamed.text]
+    assert backend.stats["requests"] == 1
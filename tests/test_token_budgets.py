@@ -0,0 +1,84 @@
+# tests/test_token_budgets.py
+
+import asyncio
+import re
+
+import pytest
+
+from agents import AgentManager, LatencyModel, MockBackend
+from agents.backends import default_reply
+from utils.tokens import TokenBudgetExceeded, UsageStats, count_message_tokens, track_usage
+
+def recording_manager(latency=0.0, **options):
+    prompts = []
+
+    def reply(messages, max_tokens, rng):
+        prompts.append(messages[-1]["content"])
+        return default_reply(messages, max_tokens, rng)
+
+    backend = MockBackend(latency=LatencyModel("fixed", median=latency), reply=reply)
+    return AgentManager(max_retries=0, verbose=False, backend=backend, **options), prompts
+
+def test_check_reserves_until_the_call_records():
+    usage = UsageStats(max_total_tokens=1000)
+    reserved = usage.check("summarize", 600)
+    # Nothing is spent yet, but the first call's reservation already counts
+    with pytest.raises(TokenBudgetExceeded):
+        usage.check("summarize", 600)
+    usage.record("summarize", 300, 100, reserved=reserved)
+    assert (usage.total_tokens, usage.reserved) == (400, 0)
+    usage.release(usage.check("summarize", 600))
+    assert usage.reserved == 0
+
+def test_concurrent_calls_cannot_overrun_the_budget():
+    agent_manager, prompts = recording_manager(latency=0.05)
+    agent = agent_manager.get_agent("summarize")
+    note = "Patient stable on metformin, blood pressure controlled."
+    one_call = count_message_tokens(agent.build_request(note)[0]) + 300
+
+    async def run():
+        with track_usage(max_total_tokens=int(one_call * 2.5)) as usage:
+            outcomes = await asyncio.gather(*(agent.aexecute(f"{note} Visit {index}.") for index in range(6)),
+                                            return_exceptions=True)
+        return usage, outcomes
+
+    usage, outcomes = asyncio.run(run())
+    # All six pass a check made before any of them records; only two fit the reservations
+    assert sum(not isinstance(outcome, Exception) for outcome in outcomes) == len(prompts) == 2
+    assert all(isinstance(outcome, TokenBudgetExceeded) for outcome in outcomes if isinstance(outcome, Exception))
+    assert usage.total_tokens <= usage.max_total_tokens and usage.reserved == 0
+
+def test_truncate_strategy_cuts_the_field_to_the_budget():
+    agent_manager, prompts = recording_manager(token_budgets={"summarize": {"max_prompt_tokens": 200, "strategy": "truncate"}})
+    agent_manager.get_agent("summarize").execute(" ".join(f"Visit {index}: stable, no complaints." for index in range(200)))
+    [prompt] = prompts
+    assert "[...truncated]" in prompt and "Visit 0:" in prompt and "Visit 199:" not in prompt
+
+def test_chunk_strategy_splits_both_sides_along_the_same_lines():
+    agent_manager, prompts = recording_manager(token_budgets={"sanitize_data_validator": {"max_prompt_tokens": 400}})
+    original = "\n".join(f"Line {index}: John Doe was seen at Mercy Hospital, no new complaints." for index in range(60))
+    sanitized = original.replace("John Doe", "[NAME]").replace("Mercy Hospital", "[FACILITY]")
+    agent_manager.get_agent("sanitize_data_validator").execute(original, sanitized)
+
+    assert len(prompts) > 1
+    seen = []
+    for prompt in prompts:
+        original_part, sanitized_part = prompt.split("Sanitized Data:")
+        lines = re.findall(r"Line (\d+): John Doe", original_part)
+        assert lines and re.findall(r"Line (\d+): \[NAME\]", sanitized_part) == lines
+        seen += lines
+    assert seen == [str(index) for index in range(60)]
+
+def test_digest_strategy_validates_long_originals_against_chunk_digests():
+    agent_manager, prompts = recording_manager()
+    summarizer = agent_manager.get_agent("summarize")
+    summarizer.long_document_tokens, summarizer.chunk_tokens = 400, 300
+    document = "\n\n".join(f"SECTION {part}:\n" + " ".join(f"Visit {part}.{line}: stable." for line in range(40))
+                           for part in range(1, 4))
+    summary = summarizer.execute(document)
+    calls = len(prompts)
+
+    agent_manager.get_agent("summarize_validator").execute(document, summary)
+    # The digests from the summary are reused: one validator call, and the raw document never appears in it
+    assert len(prompts) == calls + 1
+    assert "[Part 1]" in prompts[-1] and "Visit 1.0: stable." not in prompts[-1]
@@ -0,0 +1,89 @@
+# tests/test_tracing.py
+
+import pytest
+
+from agents import AgentManager
+from utils.tracing import JSONLSpanSink, Tracer, flame_breakdown, print_flame, read_spans
+
+class MemorySink:
+    def __init__(self):
+        self.spans = []
+
+    def write(self, span):
+        self.spans.append(span)
+
+def attributes(span):
+    return {attribute["key"]: attribute["value"] for attribute in span["attributes"]}
+
+def test_nested_spans_link_to_their_parent(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = Tracer(JSONLSpanSink(str(path)))
+    with tracer.span("pipeline", items=2):
+        with tracer.span("step"):
+            pass
+        with pytest.raises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("bad input")
+    with tracer.span("other"):
+        pass
+    spans = {span["name"]: span for span in read_spans(str(path))}
+    root = spans["pipeline"]
+    assert "parentSpanId" not in root
+    assert attributes(root) == {"service.name": {"stringValue": "multi-agent-system"}, "items": {"intValue": "2"}}
+    for name in ("step", "failing"):
+        assert spans[name]["parentSpanId"] == root["spanId"]
+        assert spans[name]["traceId"] == root["traceId"]
+    assert spans["failing"]["status"] == {"code": "STATUS_CODE_ERROR", "message": "ValueError: bad input"}
+    assert spans["step"]["status"] == {"code": "STATUS_CODE_OK"}
+    # A span opened after the first trace closed starts a trace of its own
+    assert spans["other"]["traceId"] != root["traceId"] and "parentSpanId" not in spans["other"]
+
+def test_agent_spans_nest_under_the_caller(instant_backend):
+    sink = MemorySink()
+    tracer = Tracer(sink)
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(), tracer=tracer)
+    agent = agent_manager.get_agent("summarize")
+    with tracer.span("pipeline"):
+        agent.execute("Patient stable on metformin.")
+    by_name = {span.name: span for span in sink.spans}
+    execute, attempt = by_name[f"{agent.name}.execute"], by_name[f"{agent.name}.call_openai"]
+    assert execute.parent_id == by_name["pipeline"].span_id
+    assert attempt.parent_id == execute.span_id
+    assert attempt.attributes["retry.attempt"] == 1 and attempt.attributes["llm.prompt_tokens"] > 0
+
+def test_closed_stream_ends_its_attempt_span(instant_backend):
+    sink = MemorySink()
+    agent_manager = AgentManager(max_retries=0, verbose=False, backend=instant_backend(), tracer=Tracer(sink))
+    agent = agent_manager.get_agent("refiner")
+    stream = agent.stream_openai([{"role": "user", "content": "Refine this article on sepsis."}])
+    next(stream)
+    stream.close()  # the consumer stops reading, as a cancelled workflow step does
+    [attempt] = [span for span in sink.spans if span.name == f"{agent.name}.call_openai"]
+    assert attempt.end_ns is not None and attempt.attributes.get("attempt.abandoned") is True
+
+def span(span_id, name, start, end, parent_id=None):
+    value = {"spanId": span_id, "name": name, "startTimeUnixNano": str(int(start * 1e9)), "endTimeUnixNano": str(int(end * 1e9))}
+    if parent_id:
+        value["parentSpanId"] = parent_id
+    return value
+
+def test_flame_breakdown_aggregates_by_path(capsys):
+    spans = [
+        span("root", "pipeline", 0, 10),
+        span("a1", "summarize", 0, 4, "root"),
+        span("a2", "summarize", 5, 8, "root"),
+        span("c", "call_openai", 1, 3, "a1"),
+        span("v", "validate", 8, 9, "root"),
+    ]
+    rows = flame_breakdown(spans)
+    assert [(depth, name, count) for depth, name, count, _, _ in rows] == [
+        (0, "pipeline", 1), (1, "summarize", 2), (2, "call_openai", 1), (1, "validate", 1),
+    ]
+    totals = {name: (total, self_time) for _, name, _, total, self_time in rows}
+    assert totals["pipeline"] == pytest.approx((10.0, 2.0))
+    assert totals["summarize"] == pytest.approx((7.0, 5.0))
+    assert totals["call_openai"] == pytest.approx((2.0, 2.0))
+    print_flame(rows, width=10)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[:5] == ["pipeline", "1", "10.00", "2.00", "100%"]
+    assert lines[2].startswith("  summarize") and lines[2].split()[4] == "70%" and lines[2].endswith("█" * 7)
@@ -0,0 +1,44 @@
+# tests/test_validation.py
+
+import pytest
+
+from agents import reply_text
+from agents.validation import parse_score, parse_validation
+
+@pytest.mark.parametrize("text, score", [
+    ('{"score": 4, "issues": []}', 4.0),
+    ('```json\n{"score": "5/5", "issues": []}\n```', 5.0),
+    ('{"score": 4, "issues": []}\n{"score": 2, "issues": ["Chunk two drops a dose."]}', 2.0),
+    ('{"score": 9, "issues": []} Rating: 3/5', 3.0),
+    ("Mostly accurate. Rating: 4/5", 4.0),
+    ("I would rate it 3 out of 5.", 3.0),
+    ("Score - 4.5", 4.5),
+    ("First pass 2/5; after review, 4/5", 4.0),
+    ("No rating here.", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_score(text, score):
+    assert parse_score(text) == score
+
+def test_parse_validation_json():
+    result = parse_validation('Verdict: {"score": 3, "issues": ["Omits the dose."], '
+                              '"phi": [{"text": "John Smith", "type": "NAME"}, "555-0100"]}')
+    assert result.score == 3
+    assert result.issues == ["Omits the dose."]
+    assert result.phi == [{"text": "John Smith", "type": "NAME"}, {"text": "555-0100", "type": None}]
+
+def test_parse_validation_merges_chunk_verdicts():
+    result = parse_validation('{"score": 5, "issues": []}{"score": 3, "issues": "Missing follow-up."}')
+    assert result.score == 3
+    assert result.issues == ["Missing follow-up."]
+
+def test_parse_validation_free_text():
+    result = parse_validation("Issues:\n- Missing allergy list\n2) Wrong date\nRating: 2/5")
+    assert result.score == 2.0
+    assert result.issues == ["Missing allergy list", "Wrong date"]
+    assert result.format().startswith("Score: 2/5")
+
+def test_validator_agent_returns_a_parsed_verdict(agent_manager):
+    reply = agent_manager.get_agent("summarize_validator").execute(original_text="Patient stable.", summary="Stable.")
+    assert parse_validation(reply_text(reply)).score == 4
@@ -0,0 +1,54 @@
+# utils/at_rest.py
+
+import hashlib
+import os
+
+def text_digest(text):
+    return "sha256:" + hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+def cipher_from_env(name="STORE_ENCRYPTION_KEY"):
+    """A Fernet cipher for the key in environment variable `name`, or None when it is unset."""
+    key = os.getenv(name)
+    if not key:
+        return None
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise ValueError(f"{name} is set but the cryptography package is not installed")
+    return Fernet(key)
+
+class AtRestPolicy:
+    """
+    PHI policy shared by the local SQLite stores (the response cache's disk tier and the run store).
+
+    Lookup keys never reach the file as given: they are hashed again. Inputs kept only for display
+    are stored as their hash or, with a `scrubber` (an agents.PHIScrubber), as scrubbed text. Text a
+    store has to hand back, such as cached replies and step outputs, is encrypted when a `cipher` is
+    given: any object with encrypt(bytes) and decrypt(bytes), such as cryptography.fernet.Fernet.
+    Without one that text is written as is, and the file holds PHI.
+    """
+
+    def __init__(self, scrubber=None, cipher=None):
+        self.scrubber = scrubber
+        self.cipher = cipher
+
+    def key(self, key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def label(self, value):
+        if self.scrubber is not None and isinstance(value, str):
+            return self.scrubber.scrub(value).text
+        return text_digest(value)
+
+    def seal(self, text):
+        if self.cipher is None or text is None:
+            return text
+        return self.cipher.encrypt(text.encode("utf-8"))
+
+    def unseal(self, stored):
+        # Sealed text is stored as a BLOB, so a plain TEXT value was written without a cipher
+        if not isinstance(stored, bytes):
+            return stored
+        if self.cipher is None:
+            raise ValueError("this store holds encrypted text; open it with the cipher it was written with")
+        return self.cipher.decrypt(stored).decode("utf-8")
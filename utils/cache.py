@@ -0,0 +1,141 @@
+# utils/cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from utils.at_rest import AtRestPolicy
+
+def make_cache_key(model, messages, temperature, max_tokens):
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LRUTier:
+    """In-memory tier bounded by entry count, with per-entry time-to-live."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteTier:
+    """
+    Persistent tier; values are stored as JSON so they survive restarts. Rows hold a hash of the key
+    and the value as the `at_rest` policy seals it, so replies are encrypted when it has a cipher.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, at_rest=None):
+        self.ttl = ttl
+        self.at_rest = at_rest or AtRestPolicy()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        key = self.at_rest.key(key)
+        with self._lock:
+            row = self._conn.execute("SELECT stored_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            stored_at, value = row
+            if self.ttl and time.time() - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return stored_at, json.loads(self.at_rest.unseal(value))
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, stored_at, value) VALUES (?, ?, ?)",
+                (self.at_rest.key(key), time.time(), self.at_rest.seal(json.dumps(value, ensure_ascii=False))),
+            )
+            self._conn.commit()
+
+class ResponseCache:
+    """
+    Opt-in cache for OpenAI replies keyed by a hash of (model, messages, temperature, max_tokens).
+
+    Lookups go to the in-memory LRU first and fall back to the optional SQLite tier, promoting
+    disk hits into memory. Calls with a temperature above `max_temperature` are not cached unless
+    `force=True`, since their replies are meant to vary. Hits, misses and bypasses are counted per agent.
+    Replies are PHI for the medical agents; pass `at_rest=AtRestPolicy(cipher=...)` to encrypt them on disk.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, disk_path=None, disk_ttl=7 * 24 * 3600,
+                 max_temperature=0.7, force=False, at_rest=None):
+        self.memory = LRUTier(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteTier(disk_path, ttl=disk_ttl, at_rest=at_rest) if disk_path else None
+        self.max_temperature = max_temperature
+        self.force = force
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0, "bypassed": 0})
+        self._stats_lock = threading.Lock()
+
+    def _count(self, agent_name, outcome):
+        with self._stats_lock:
+            self.stats[agent_name][outcome] += 1
+
+    def lookup(self, agent_name, model, messages, temperature, max_tokens):
+        """Return (key, value). `key` is None when the call must bypass the cache; `value` is None on a miss."""
+        if not self.force and temperature > self.max_temperature:
+            self._count(agent_name, "bypassed")
+            return None, None
+        key = make_cache_key(model, messages, temperature, max_tokens)
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                stored_at, value = row
+                self.memory.set(key, value, stored_at=stored_at)
+        self._count(agent_name, "hits" if value is not None else "misses")
+        return key, value
+
+    def store(self, key, value):
+        if key is None:
+            return
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def snapshot(self):
+        with self._stats_lock:
+            return {agent_name: dict(counts) for agent_name, counts in self.stats.items()}
@@ -1,14 +1,127 @@
 # utils/logger.py
 
 from loguru import logger
+from datetime import datetime
+import glob
+import queue
 import sys
 import os
+import threading
+import time
 
 # Create logs directory if it doesn't exist
 if not os.path.exists("logs"):
     os.makedirs("logs")
 
-# Configure logger
+class BackgroundFileSink:
+    """
+    Loguru sink that only puts each formatted line on an in-process queue; a writer thread does
+    the disk I/O, size-based rotation and retention. Cheaper on the caller than loguru's
+    enqueue=True, which pickles every record through a multiprocessing pipe.
+
+    The queue holds at most `max_queued` lines. When the writer falls that far behind, new lines
+    are dropped rather than blocking callers or growing memory; `dropped` counts them and the
+    file notes how many were lost once the writer catches up. A line that fails to render or
+    write is reported on stderr and counted in `errors`, and the writer carries on.
+    """
+
+    def __init__(self, path, rotation_bytes=1_000_000, retention_days=10, max_queued=10000):
+        self.path = path
+        self.rotation_bytes = rotation_bytes
+        self.retention_days = retention_days
+        self.dropped = 0
+        self.errors = 0
+        self._reported_drops = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._drain, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    @staticmethod
+    def _render(message):
+        # Payload bodies (agents.payload_logging.LogPayload) are rendered here, on the writer thread
+        record = getattr(message, "record", None)
+        payload = record["extra"].get("payload") if record is not None else None
+        if payload is None:
+            return message
+        return f"{message.rstrip(chr(10))}\n{payload.render()}\n"
+
+    def stop(self):
+        # Called by loguru when the handler is removed (including at interpreter exit); the stop
+        # marker waits for room rather than being dropped
+        self._queue.put(None)
+        self._thread.join()
+
+    def _rotate(self, f):
+        f.close()
+        root, ext = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{datetime.now():%Y-%m-%d_%H-%M-%S_%f}{ext}")
+        cutoff = time.time() - self.retention_days * 86400
+        for old in glob.glob(f"{root}.*{ext}"):
+            if os.path.getmtime(old) < cutoff:
+                os.remove(old)
+        return open(self.path, "a", encoding="utf-8")
+
+    def _report(self, what, error):
+        # Never through loguru: this sink would be logging about itself
+        self.errors += 1
+        sys.stderr.write(f"BackgroundFileSink({self.path}): failed to {what}: {error!r}\n")
+
+    def _write(self, f, message):
+        try:
+            f.write(self._render(message))
+        except Exception as error:
+            self._report("write a log line", error)
+
+    def _note_drops(self, f):
+        with self._lock:
+            dropped = self.dropped - self._reported_drops
+            self._reported_drops = self.dropped
+        if dropped:
+            self._write(f, f"{datetime.now()} WARNING BackgroundFileSink dropped {dropped} log lines: writer queue full\n")
+
+    def _drain(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                message = self._queue.get()
+                # Write whatever has piled up in one go and flush once
+                while message is not None:
+                    self._write(f, message)
+                    if self._queue.empty():
+                        break
+                    message = self._queue.get()
+                self._note_drops(f)
+                try:
+                    f.flush()
+                    if f.tell() > self.rotation_bytes:
+                        f = self._rotate(f)
+                except Exception as error:
+                    self._report("flush or rotate the log file", error)
+                    if f.closed:
+                        f = open(self.path, "a", encoding="utf-8")
+                if message is None:
+                    return
+        finally:
+            f.close()
+
+def console_format(record):
+    # A console at DEBUG renders payload bodies itself, on the logging thread
+    payload = record["extra"].get("payload")
+    record["extra"]["body"] = "\n" + payload.render() if payload is not None else ""
+    return "<green>{time}</green> <level>{message}</level>{extra[body]}\n{exception}"
+
+# Configure logger. The DEBUG file sink is written by a background thread, which also renders
+# prompt/response bodies, so agent calls never wait on disk or PHI scrubbing; LOG_FILE_LEVEL=INFO
+# skips the bodies altogether.
 logger.remove()  # Remove the default logger
-logger.add(sys.stdout, level="INFO", format="<green>{time}</green> <level>{message}</level>")
-logger.add("logs/multi_agent_system.log", rotation="1 MB", retention="10 days", level="DEBUG", format="{time} {level} {message}")
+logger.add(sys.stdout, level=os.getenv("LOG_LEVEL", "INFO"), format=console_format)
+logger.add(BackgroundFileSink("logs/multi_agent_system.log", rotation_bytes=1_000_000, retention_days=10),
+           level=os.getenv("LOG_FILE_LEVEL", "DEBUG"), format="{time} {level} {message}", colorize=False)
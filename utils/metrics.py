@@ -0,0 +1,224 @@
+# utils/metrics.py
+
+import bisect
+import json
+import threading
+from collections import Counter
+
+# Seconds; LLM calls range from cache-speed to minutes for long completions
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus sense: cumulative counts per upper bound plus sum and count."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the q-quantile by linear interpolation inside the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "p50": _round(self.quantile(0.5)),
+            "p95": _round(self.quantile(0.95)),
+            "p99": _round(self.quantile(0.99)),
+        }
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+class AgentMetrics:
+    def __init__(self):
+        self.requests = Counter()  # outcome -> count ("ok", "error", "cached", "coalesced")
+        self.latency = Histogram()
+        self.ttft = Histogram()
+        self.retries = 0
+        self.errors = Counter()  # (category, exception type) -> count
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.models = Counter()  # model -> successful calls it served
+        self.escalations = 0
+        # Provider prompt-prefix caching, over the calls whose response reported it
+        self.prefix_cache_calls = 0
+        self.prefix_cache_hits = 0
+        self.prefix_cache_prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def prefix_cache(self):
+        calls, prompt_tokens = self.prefix_cache_calls, self.prefix_cache_prompt_tokens
+        return {
+            "calls": calls,
+            "hits": self.prefix_cache_hits,
+            "hit_rate": _round(self.prefix_cache_hits / calls) if calls else None,
+            "cached_tokens": self.cached_prompt_tokens,
+            "cached_token_share": _round(self.cached_prompt_tokens / prompt_tokens) if prompt_tokens else None,
+        }
+
+    def as_dict(self):
+        return {
+            "requests": dict(self.requests),
+            "latency_seconds": self.latency.summary(),
+            "ttft_seconds": self.ttft.summary(),
+            "retries": self.retries,
+            "errors": {f"{category}:{kind}": count for (category, kind), count in self.errors.items()},
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "models": dict(self.models),
+            "escalations": self.escalations,
+            "prefix_cache": self.prefix_cache(),
+        }
+
+class MetricsRegistry:
+    """
+    Per-agent call metrics fed by AgentBase: end-to-end latency (including retries and backoff),
+    time to first token for streamed calls, retry counts, error classes, token counts, which
+    models served the calls (with escalations to a larger model), and how much of each prompt the
+    provider served from its prefix cache.
+    Export with `snapshot()` (JSON-ready dict) or `to_prometheus()` (text exposition format).
+    """
+
+    def __init__(self):
+        self._agents = {}
+        self._lock = threading.Lock()
+
+    def _agent(self, agent_name):
+        metrics = self._agents.get(agent_name)
+        if metrics is None:
+            metrics = self._agents[agent_name] = AgentMetrics()
+        return metrics
+
+    def record_call(self, agent_name, latency, attempts, prompt_tokens, completion_tokens, ttft=None, model=None,
+                    cached_tokens=None):
+        with self._lock:
+            metrics = self._agent(agent_name)
+            metrics.requests["ok"] += 1
+            if model is not None:
+                metrics.models[model] += 1
+            metrics.latency.observe(latency)
+            if ttft is not None:
+                metrics.ttft.observe(ttft)
+            metrics.retries += attempts - 1
+            metrics.prompt_tokens += prompt_tokens
+            metrics.completion_tokens += completion_tokens
+            if cached_tokens is not None:
+                metrics.prefix_cache_calls += 1
+                metrics.prefix_cache_hits += 1 if cached_tokens else 0
+                metrics.prefix_cache_prompt_tokens += prompt_tokens
+                metrics.cached_prompt_tokens += cached_tokens
+
+    def record_cache_hit(self, agent_name):
+        with self._lock:
+            self._agent(agent_name).requests["cached"] += 1
+
+    def record_coalesced(self, agent_name):
+        with self._lock:
+            self._agent(agent_name).requests["coalesced"] += 1
+
+    def record_error(self, agent_name, category, error):
+        with self._lock:
+            self._agent(agent_name).errors[(category, type(error).__name__)] += 1
+
+    def record_escalation(self, agent_name):
+        with self._lock:
+            self._agent(agent_name).escalations += 1
+
+    def record_failure(self, agent_name, latency, attempts):
+        with self._lock:
+            metrics = self._agent(agent_name)
+            metrics.requests["error"] += 1
+            metrics.latency.observe(latency)
+            metrics.retries += attempts - 1
+
+    def snapshot(self):
+        with self._lock:
+            return {agent_name: metrics.as_dict() for agent_name, metrics in sorted(self._agents.items())}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix="agent"):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        with self._lock:
+            agents = sorted(self._agents.items())
+            header("requests_total", "counter", "Agent LLM calls by outcome.")
+            for agent_name, metrics in agents:
+                for outcome, count in sorted(metrics.requests.items()):
+                    lines.append(f'{prefix}_requests_total{{agent="{agent_name}",outcome="{outcome}"}} {count}')
+            for name, attribute, help_text in (
+                ("request_latency_seconds", "latency", "End-to-end LLM call latency including retries."),
+                ("time_to_first_token_seconds", "ttft", "Time to the first streamed token."),
+            ):
+                header(name, "histogram", help_text)
+                for agent_name, metrics in agents:
+                    histogram = getattr(metrics, attribute)
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f'{prefix}_{name}_bucket{{agent="{agent_name}",le="{le}"}} {total}')
+                    lines.append(f'{prefix}_{name}_sum{{agent="{agent_name}"}} {histogram.sum:.6f}')
+                    lines.append(f'{prefix}_{name}_count{{agent="{agent_name}"}} {histogram.count}')
+            header("retries_total", "counter", "Retried LLM call attempts.")
+            for agent_name, metrics in agents:
+                lines.append(f'{prefix}_retries_total{{agent="{agent_name}"}} {metrics.retries}')
+            header("errors_total", "counter", "Failed LLM call attempts by error class.")
+            for agent_name, metrics in agents:
+                for (category, kind), count in sorted(metrics.errors.items()):
+                    lines.append(f'{prefix}_errors_total{{agent="{agent_name}",category="{category}",type="{kind}"}} {count}')
+            header("tokens_total", "counter", "Prompt and completion tokens.")
+            for agent_name, metrics in agents:
+                lines.append(f'{prefix}_tokens_total{{agent="{agent_name}",kind="prompt"}} {metrics.prompt_tokens}')
+                lines.append(f'{prefix}_tokens_total{{agent="{agent_name}",kind="completion"}} {metrics.completion_tokens}')
+            header("model_requests_total", "counter", "Successful LLM calls by the model that served them.")
+            for agent_name, metrics in agents:
+                for model, count in sorted(metrics.models.items()):
+                    lines.append(f'{prefix}_model_requests_total{{agent="{agent_name}",model="{model}"}} {count}')
+            header("escalations_total", "counter", "Replies re-asked of a larger model after a low or missing score.")
+            for agent_name, metrics in agents:
+                lines.append(f'{prefix}_escalations_total{{agent="{agent_name}"}} {metrics.escalations}')
+            header("prefix_cache_requests_total", "counter", "Calls reporting provider prompt caching, by whether any prefix was cached.")
+            for agent_name, metrics in agents:
+                hits = metrics.prefix_cache_hits
+                lines.append(f'{prefix}_prefix_cache_requests_total{{agent="{agent_name}",result="hit"}} {hits}')
+                lines.append(f'{prefix}_prefix_cache_requests_total{{agent="{agent_name}",result="miss"}} {metrics.prefix_cache_calls - hits}')
+            header("cached_prompt_tokens_total", "counter", "Prompt tokens served from the provider's prefix cache.")
+            for agent_name, metrics in agents:
+                lines.append(f'{prefix}_cached_prompt_tokens_total{{agent="{agent_name}"}} {metrics.cached_prompt_tokens}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to `path`: Prometheus text for .prom/.txt files, JSON otherwise."""
+        content = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
@@ -0,0 +1,151 @@
+# utils/near_duplicate.py
+
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # optional; signatures are computed in pure Python without it
+    np = None
+
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+def shingles(text, size=3):
+    """Word `size`-grams of the lower-cased text; texts shorter than that shingle as their words."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[index:index + size]) for index in range(len(words) - size + 1)}
+
+def _hash32(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") % _PRIME
+
+class MinHashIndex:
+    """
+    MinHash signatures with LSH banding: `bands` x `rows` hash functions, and two documents
+    become candidates when all rows of any band agree. Candidates are confirmed by their
+    estimated Jaccard similarity, so a query costs one signature plus a few comparisons.
+    Holds at most `max_entries` documents, evicting the oldest.
+    """
+
+    def __init__(self, bands=16, rows=4, shingle_size=3, max_entries=2000, seed=1):
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        count = bands * rows
+        self._a = [rng.randrange(1, _PRIME) for _ in range(count)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(count)]
+        if np is not None:
+            self._a_array = np.array(self._a, dtype=np.uint64)[:, None]
+            self._b_array = np.array(self._b, dtype=np.uint64)[:, None]
+        self._entries = OrderedDict()  # doc_id -> (signature, payload)
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        hashes = [_hash32(shingle) for shingle in shingles(text, self.shingle_size)] or [0]
+        if np is not None:
+            values = (self._a_array * np.array(hashes, dtype=np.uint64)[None, :] + self._b_array) % _PRIME
+            return tuple(int(value) for value in values.min(axis=1))
+        return tuple(min((a * value + b) % _PRIME for value in hashes) for a, b in zip(self._a, self._b))
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(first, second):
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+    def add(self, doc_id, text, payload):
+        signature = self.signature(text)
+        with self._lock:
+            if doc_id in self._entries:
+                self._remove(doc_id)
+            self._entries[doc_id] = (signature, payload)
+            for buckets, key in zip(self._buckets, self._band_keys(signature)):
+                buckets[key].add(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, doc_id):
+        signature, _ = self._entries.pop(doc_id)
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets[key].discard(doc_id)
+            if not buckets[key]:
+                del buckets[key]
+
+    def query(self, text, threshold):
+        """Return (similarity, doc_id, payload) of the most similar document at or above `threshold`, or None."""
+        signature = self.signature(text)
+        with self._lock:
+            candidates = set()
+            for buckets, key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(buckets.get(key, ()))
+            best = None
+            for doc_id in candidates:
+                similarity = self.similarity(signature, self._entries[doc_id][0])
+                if similarity >= threshold and (best is None or similarity > best[0]):
+                    best = (similarity, doc_id, self._entries[doc_id][1])
+            return best
+
+    def __len__(self):
+        return len(self._entries)
+
+class NearDuplicateMatch:
+    """A previously processed document similar to the current one, with the result produced for it."""
+
+    def __init__(self, similarity, doc_id, text, result):
+        self.similarity = similarity
+        self.doc_id = doc_id
+        self.text = text
+        self.result = result
+
+class NearDuplicateCache:
+    """
+    Opt-in near-duplicate index per agent, in front of the tools whose inputs are often templated
+    or copy-forwarded notes. Documents whose estimated similarity to an earlier one is at least
+    `threshold` come back as a NearDuplicateMatch; the agent diffs the input against it and
+    either reuses the prior result (nothing changed) or sends only what changed. Outcomes are
+    counted per agent.
+    """
+
+    def __init__(self, threshold=0.8, max_entries=2000, bands=16, rows=4, shingle_size=3):
+        self.threshold = threshold
+        self._options = {"bands": bands, "rows": rows, "shingle_size": shingle_size, "max_entries": max_entries}
+        self._indexes = {}
+        self.stats = defaultdict(lambda: {"reused": 0, "diffed": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def _index(self, agent_name):
+        with self._lock:
+            if agent_name not in self._indexes:
+                self._indexes[agent_name] = MinHashIndex(**self._options)
+            return self._indexes[agent_name]
+
+    @staticmethod
+    def doc_id(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def lookup(self, agent_name, text):
+        found = self._index(agent_name).query(text, self.threshold)
+        if found is None:
+            return None
+        similarity, doc_id, (prior_text, result) = found
+        return NearDuplicateMatch(similarity, doc_id, prior_text, result)
+
+    def store(self, agent_name, text, result):
+        self._index(agent_name).add(self.doc_id(text), text, (text, result))
+
+    def count(self, agent_name, outcome):
+        with self._lock:
+            self.stats[agent_name][outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {agent_name: dict(counts) for agent_name, counts in self.stats.items()}
@@ -0,0 +1,172 @@
+# utils/retry.py
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import openai
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+class CircuitOpenError(Exception):
+    pass
+
+def classify_error(error):
+    """Sort an exception into RATE_LIMIT (429), TRANSIENT (worth retrying) or FATAL (retrying cannot help)."""
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+        return TRANSIENT
+    if isinstance(error, openai.APIStatusError):
+        return TRANSIENT if error.status_code in (408, 409) or error.status_code >= 500 else FATAL
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    # Bad requests, auth failures, budget/circuit errors and programming errors all fail the same way twice
+    return FATAL
+
+def upstream_answered(error):
+    """True when the API itself refused the request with a 4xx (429 included), so it is up."""
+    return isinstance(error, openai.APIStatusError) and 400 <= error.status_code < 500
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. A Retry-After header from the server takes precedence
+    over the computed delay; waits longer than `max_retry_after` are not worth blocking a worker on.
+    `max_retries` (total attempts) defaults to the agent's own max_retries when left as None.
+    """
+
+    def __init__(self, max_retries=None, base_delay=1.0, max_delay=20.0, max_retry_after=120.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, error=None):
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class RateLimiter:
+    """
+    Client-side token buckets for requests/min and tokens/min, shared by every agent that holds it.
+    Callers reserve capacity up front and sleep off any deficit, so bursts queue instead of drawing 429s.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        now = time.monotonic()
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = now
+        self._blocked_until = now
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            wait = max(0.0, self._blocked_until - now)
+            if self.requests_per_minute:
+                rate = self.requests_per_minute / 60.0
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * rate) - 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests / rate)
+            if self.tokens_per_minute:
+                rate = self.tokens_per_minute / 60.0
+                tokens = min(tokens, self.tokens_per_minute)
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * rate) - tokens
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / rate)
+            return wait
+
+    def acquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold back every caller for `seconds`, e.g. when the server answers 429 with Retry-After."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+class CircuitBreaker:
+    """
+    Fails calls fast once the upstream looks down: after `failure_threshold` consecutive transient
+    failures the circuit opens for `reset_timeout` seconds, then lets a single trial call through.
+    A trial that never reports back (a cancelled task, a stream closed early) expires after another
+    `reset_timeout`, and the next caller becomes the trial.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                # This caller becomes the trial; everyone else keeps failing fast until it reports back.
+                # In half_open, `_opened_at` is when the trial started, so an abandoned trial is replaced.
+                self.state = "half_open"
+                self._opened_at = now
+                return
+            waiting = "a trial call is in flight" if self.state == "half_open" else "retrying"
+            raise CircuitOpenError(
+                f"Circuit open after {self._failures} consecutive upstream failures; "
+                f"{waiting}, next attempt in {max(0.0, self.reset_timeout - (now - self._opened_at)):.1f}s."
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
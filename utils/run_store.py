@@ -0,0 +1,126 @@
+# utils/run_store.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.at_rest import AtRestPolicy
+
+def step_fingerprint(agent, call_kwargs):
+    """
+    Hash of everything that decides a step's output: the agent, the request it would build from
+    these inputs (prompt template and parameters included) and the model it would be routed to.
+    Editing a prompt, an input or the routing therefore changes the hash and re-runs the step.
+    """
+    messages, params = agent.build_request(**agent._bind((), call_kwargs))
+    payload = json.dumps(
+        {"agent": agent.name, "model": agent._choose_model(messages), "messages": messages, "params": params},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RunStore:
+    """
+    Local SQLite record of pipeline runs: one row per run (pipeline, inputs, status) and one per
+    step (inputs hash, output text, model, latency, tokens). A Workflow given a store looks each
+    step's fingerprint up before calling its agent and reuses the latest stored output for it, so
+    only steps whose inputs changed are re-executed, the way a build system rebuilds only stale
+    targets. Reused steps are recorded too, pointing at the run that produced their output.
+
+    Run inputs are stored through the `at_rest` policy (utils.at_rest): as hashes, or as scrubbed
+    text when it has a scrubber. Step outputs have to be read back for reuse, so they are encrypted
+    only when the policy has a cipher; without one the file holds PHI whenever the pipeline's
+    outputs do (summaries of patient notes, for instance).
+    """
+
+    def __init__(self, path, at_rest=None):
+        self.at_rest = at_rest or AtRestPolicy()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, pipeline TEXT, started_at REAL, "
+            "finished_at REAL, status TEXT, inputs TEXT, error TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS steps (run_id INTEGER, output TEXT, agent TEXT, inputs_hash TEXT, status TEXT, "
+            "text TEXT, model TEXT, started_at REAL, latency REAL, prompt_tokens INTEGER, completion_tokens INTEGER, "
+            "source_run INTEGER, PRIMARY KEY (run_id, output))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS steps_by_hash ON steps (agent, inputs_hash)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def start_run(self, pipeline, inputs):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (pipeline, started_at, status, inputs) VALUES (?, ?, 'running', ?)",
+                (pipeline, time.time(), json.dumps({name: self.at_rest.label(value) for name, value in inputs.items()},
+                                                  ensure_ascii=False)),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run_id, status, error=None):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ?, status = ?, error = ? WHERE id = ?",
+                               (time.time(), status, error, run_id))
+            self._conn.commit()
+
+    def find_step(self, agent_name, inputs_hash):
+        """The latest stored output of `agent_name` for these inputs, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, text, model, source_run FROM steps WHERE agent = ? AND inputs_hash = ? "
+                "AND status IN ('ran', 'reused') ORDER BY started_at DESC LIMIT 1",
+                (agent_name, inputs_hash),
+            ).fetchone()
+        if row is None:
+            return None
+        # A reused row points at the run that actually produced the output
+        return {"text": self.at_rest.unseal(row["text"]), "model": row["model"], "source_run": row["source_run"] or row["run_id"]}
+
+    def record_step(self, run_id, output, agent_name, inputs_hash, status, text=None, model=None, usage=None,
+                    started_at=None, latency=None, source_run=None):
+        """`status` is "ran", "reused" or "skipped"; `source_run` is the run a reused output came from."""
+        usage = usage or {}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO steps (run_id, output, agent, inputs_hash, status, text, model, started_at, "
+                "latency, prompt_tokens, completion_tokens, source_run) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, output, agent_name, inputs_hash, status, self.at_rest.seal(text), model,
+                 started_at or time.time(), latency, usage.get("prompt_tokens"), usage.get("completion_tokens"), source_run),
+            )
+            self._conn.commit()
+
+    def runs(self, limit=20, pipeline=None):
+        """The latest runs, newest first, with how many of their steps ran, were reused or skipped."""
+        query = (
+            "SELECT runs.*, SUM(steps.status = 'ran') AS ran, SUM(steps.status = 'reused') AS reused, "
+            "SUM(steps.status = 'skipped') AS skipped FROM runs LEFT JOIN steps ON steps.run_id = runs.id"
+        )
+        args = ()
+        if pipeline is not None:
+            query += " WHERE runs.pipeline = ?"
+            args = (pipeline,)
+        query += " GROUP BY runs.id ORDER BY runs.id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, args + (limit,)).fetchall()
+        return [dict(row, inputs=json.loads(row["inputs"]), ran=row["ran"] or 0, reused=row["reused"] or 0,
+                     skipped=row["skipped"] or 0) for row in rows]
+
+    def steps(self, run_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM steps WHERE run_id = ? ORDER BY started_at", (run_id,)).fetchall()
+        return [dict(row, text=self.at_rest.unseal(row["text"])) for row in rows]
+
+    def outputs(self, run_id):
+        """{step output: text} of one run, skipped steps included with their fallback value."""
+        return {step["output"]: step["text"] for step in self.steps(run_id)}
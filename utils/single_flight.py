@@ -0,0 +1,100 @@
+# utils/single_flight.py
+
+import asyncio
+import threading
+from collections import defaultdict
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _AsyncFlight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time: the first caller for a key
+    (the leader) runs the call, and callers arriving with the same key before it finishes wait for
+    it and share its result, or its exception, instead of sending their own request.
+
+    Threads coalesce through `do`, tasks on one event loop through `ado`. An async call keeps
+    running while any caller still waits for it, so cancelling one caller (the leader included)
+    never cancels the others; only when every caller has been cancelled is the call itself cancelled.
+    Leaders and coalesced followers are counted per agent.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.stats = defaultdict(lambda: {"leaders": 0, "coalesced": 0})
+
+    def _count(self, agent_name, leader):
+        with self._lock:
+            self.stats[agent_name]["leaders" if leader else "coalesced"] += 1
+
+    def do(self, agent_name, key, fn):
+        """Return (result, leader): `fn()`'s result, and whether this caller ran it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        self._count(agent_name, leader)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, False
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Later callers start a new flight; a finished one is never joined
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, True
+
+    async def ado(self, agent_name, key, fn):
+        """Async `do`: `fn()` returns the coroutine to run, started only by the leader."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            flight = self._tasks.get(flight_key)
+            leader = flight is None
+            if leader:
+                # A task of its own, in the leader's context, so the call outlives a cancelled leader
+                flight = self._tasks[flight_key] = _AsyncFlight(loop.create_task(fn()))
+                flight.task.add_done_callback(lambda task: self._forget(flight_key, task))
+        self._count(agent_name, leader)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), leader
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller was cancelled: stop the upstream call instead of finishing it for nobody
+                flight.task.cancel()
+
+    def _forget(self, flight_key, task):
+        with self._lock:
+            flight = self._tasks.get(flight_key)
+            if flight is not None and flight.task is task:
+                del self._tasks[flight_key]
+        if not task.cancelled():
+            task.exception()  # retrieved by the waiters; marks it handled if they were all cancelled
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights) + len(self._tasks)
+
+    def snapshot(self):
+        with self._lock:
+            return {agent_name: dict(counts) for agent_name, counts in self.stats.items()}
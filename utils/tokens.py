@@ -0,0 +1,151 @@
+# utils/tokens.py
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character-based estimate
+    tiktoken = None
+
+_encodings = {}
+
+def get_encoding(model="gpt-4"):
+    if model not in _encodings:
+        encoding = None
+        if tiktoken is not None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                # Unknown model name, or the encoding file cannot be fetched (e.g. offline)
+                try:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+def count_tokens(text, model="gpt-4"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English prose
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+# Prompt context sizes for the models the agents use; unknown models get the smallest
+CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+
+def context_window(model):
+    return CONTEXT_WINDOWS.get(model, 8192)
+
+def message_text(content):
+    # Message content is either a string or a list of {"type": "text", "text": ...} parts
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content or [])
+
+def count_message_tokens(messages, model="gpt-4"):
+    # Chat formatting adds about three tokens per message plus three to prime the reply
+    return sum(count_tokens(message_text(msg["content"]), model) + 3 for msg in messages) + 3
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4"):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max(0, max_tokens) * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max(0, max_tokens)])
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+class UsageStats:
+    """Running prompt/completion token totals, kept per agent and per pipeline run."""
+
+    def __init__(self, max_total_tokens=None):
+        self.max_total_tokens = max_total_tokens
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.by_agent = {}
+        # Tokens reserved by calls that passed check() but have not recorded their usage yet
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def check(self, agent_name, tokens):
+        """
+        Reserve `tokens` for a call, raising TokenBudgetExceeded if they would overrun the budget
+        together with what is spent and reserved already. Returns the reservation, which the call
+        settles with record(..., reserved=...) or gives back with release() if it never completes.
+        """
+        with self._lock:
+            committed = self.total_tokens + self.reserved
+            if self.max_total_tokens is not None and committed + tokens > self.max_total_tokens:
+                raise TokenBudgetExceeded(
+                    f"[{agent_name}] Call needs up to {tokens} tokens but only "
+                    f"{self.max_total_tokens - committed} of the {self.max_total_tokens} token budget remain."
+                )
+            self.reserved += tokens
+        return tokens
+
+    def release(self, reserved):
+        with self._lock:
+            self.reserved -= reserved
+
+    def record(self, agent_name, prompt_tokens, completion_tokens, cached=False, reserved=0):
+        with self._lock:
+            self.reserved -= reserved
+            agent = self.by_agent.setdefault(agent_name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            agent["calls"] += 1
+            self.calls += 1
+            if cached:
+                self.cached_calls += 1
+                return
+            agent["prompt_tokens"] += prompt_tokens
+            agent["completion_tokens"] += completion_tokens
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    @classmethod
+    def from_dict(cls, data, max_total_tokens=None):
+        """Rebuild totals saved with as_dict(), e.g. to keep counting across processes."""
+        usage = cls(max_total_tokens=max_total_tokens)
+        usage.calls = data.get("calls", 0)
+        usage.cached_calls = data.get("cached_calls", 0)
+        usage.prompt_tokens = data.get("prompt_tokens", 0)
+        usage.completion_tokens = data.get("completion_tokens", 0)
+        usage.by_agent = {name: dict(counts) for name, counts in data.get("by_agent", {}).items()}
+        return usage
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "cached_calls": self.cached_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "by_agent": {name: dict(counts) for name, counts in self.by_agent.items()},
+        }
+
+# Usage ledger of the pipeline run the current task or thread belongs to, if any
+current_usage = ContextVar("current_usage", default=None)
+
+@contextmanager
+def track_usage(max_total_tokens=None):
+    """Collect the token usage of every agent call made inside the block, optionally under a budget."""
+    usage = UsageStats(max_total_tokens=max_total_tokens)
+    token = current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        current_usage.reset(token)
@@ -0,0 +1,195 @@
+# utils/tracing.py
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The innermost open span of the running pipeline/agent call; new spans become its children
+current_span = ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error=None, **attributes):
+        if self.end_ns is not None:
+            return
+        self.attributes.update(attributes)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.end_ns = time.time_ns()
+        self.tracer.export(self)
+
+    def as_dict(self):
+        """The span in OTLP/JSON shape (one element of scopeSpans[].spans)."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class JSONLSpanSink:
+    """Appends one finished span per line to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, span):
+        line = json.dumps(span.as_dict(), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+class Tracer:
+    """
+    Lightweight tracer: `span()` opens a child of the current span (or a new trace) for the
+    duration of a `with` block, `start_span()` opens one that the caller ends explicitly.
+    Finished spans go to `sink.write(span)`, e.g. a JSONLSpanSink.
+    """
+
+    def __init__(self, sink, service_name="multi-agent-system"):
+        self.sink = sink
+        self.service_name = service_name
+
+    def start_span(self, name, **attributes):
+        parent = current_span.get()
+        if parent is None:
+            return Span(self, name, os.urandom(16).hex(), None, {"service.name": self.service_name, **attributes})
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start_span(name, **attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def export(self, span):
+        self.sink.write(span)
+
+@contextmanager
+def maybe_span(tracer, name, **attributes):
+    """`tracer.span(...)` when a tracer is configured, a no-op otherwise."""
+    if tracer is None:
+        yield None
+    else:
+        with tracer.span(name, **attributes) as span:
+            yield span
+
+def read_spans(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def flame_breakdown(spans):
+    """
+    Aggregate spans by their path of names from the root, returning rows of
+    (depth, name, count, total_seconds, self_seconds) in tree order.
+    """
+    by_id = {span["spanId"]: span for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in by_id.values():
+        parent_id = span.get("parentSpanId")
+        if parent_id in by_id:
+            children[parent_id].append(span)
+        else:
+            roots.append(span)
+
+    def duration(span):
+        return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0])  # path -> [count, total, self]
+    order = []
+
+    def visit(span, path):
+        path = path + (span["name"],)
+        if path not in totals:
+            order.append(path)
+        stats = totals[path]
+        child_time = sum(duration(child) for child in children[span["spanId"]])
+        stats[0] += 1
+        stats[1] += duration(span)
+        # Concurrent children can add up to more than the parent's wall time
+        stats[2] += max(0.0, duration(span) - child_time)
+        for child in sorted(children[span["spanId"]], key=lambda child: int(child["startTimeUnixNano"])):
+            visit(child, path)
+
+    for root in sorted(roots, key=lambda span: int(span["startTimeUnixNano"])):
+        visit(root, ())
+    rows = []
+
+    def emit(prefix):
+        for path in order:
+            if path[:-1] == prefix:
+                count, total, self_time = totals[path]
+                rows.append((len(path) - 1, path[-1], count, total, self_time))
+                emit(path)
+
+    emit(())
+    return rows
+
+def print_flame(rows, width=30):
+    root_total = sum(total for depth, _, _, total, _ in rows if depth == 0) or 1.0
+    print(f"{'span':<50} {'calls':>6} {'total s':>9} {'self s':>8} {'share':>6}")
+    for depth, name, count, total, self_time in rows:
+        label = ("  " * depth + name)[:50]
+        bar = "█" * max(1, round(width * total / root_total)) if total else ""
+        print(f"{label:<50} {count:>6} {total:>9.2f} {self_time:>8.2f} {total / root_total:>6.0%} {bar}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a flame-style breakdown of where traced pipeline time went")
+    parser.add_argument("path", help="JSONL trace file written by JSONLSpanSink")
+    parser.add_argument("--trace-id", help="Only show this trace (default: aggregate every trace in the file)")
+    parser.add_argument("--last", action="store_true", help="Only show the most recent trace")
+    args = parser.parse_args()
+    spans = list(read_spans(args.path))
+    if args.last and spans:
+        args.trace_id = max(spans, key=lambda span: int(span["startTimeUnixNano"]))["traceId"]
+    if args.trace_id:
+        spans = [span for span in spans if span["traceId"] == args.trace_id]
+    print_flame(flame_breakdown(spans))
+
+if __name__ == "__main__":
+    main()